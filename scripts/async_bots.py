@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Scripted bots on dungeon_game.aio_client.AsyncGameClient, all in one process.
+
+Bots are grouped into rooms of --room-size. Each room's leader creates the
+room and every bot joins it, awaiting its own "joined"; the leader then
+awaits start_level, and every bot sends random input at --input-rate (acking
+state snapshots when the server simulates) for --duration seconds, pings the
+server once a second and finally leaves. Each awaited request is timed, so the
+output is per-request latency (create_room, join, start_level, ping),
+errors / timeouts and what arrived -- with one thread in this process however
+many bots run.
+
+Run from the repo root:
+  PYTHONPATH=src python scripts/async_bots.py --impl asyncio --bots 300 --tick-rate 20
+  PYTHONPATH=src python scripts/async_bots.py --port 6000 --bots 30      # server already running
+"""
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import threading
+import time
+from collections import Counter, defaultdict
+
+from bench_server import start_server_process, raise_fd_limit
+from loadtest import percentiles
+from dungeon_game.aio_client import AsyncGameClient, RequestError
+from dungeon_game.protocol import JSON_CODEC, CODECS
+
+
+class Results:
+    def __init__(self):
+        self.latency_ms = defaultdict(list)
+        self.errors = Counter()
+        self.timeouts = Counter()
+        self.received = Counter()
+        self.bots_done = 0
+
+
+async def timed(results: Results, name: str, coro):
+    t0 = time.perf_counter()
+    try:
+        reply = await coro
+    except asyncio.TimeoutError:
+        results.timeouts[name] += 1
+        return None
+    except RequestError as e:
+        results.errors[f"{name}:{e}"] += 1
+        return None
+    except ConnectionError:
+        results.errors[f"{name}:closed"] += 1
+        return None
+    results.latency_ms[name].append((time.perf_counter() - t0) * 1000)
+    return reply
+
+
+async def bot(idx: int, args, results: Results, room_ready: asyncio.Event):
+    rng = random.Random(idx)
+    room = f"bots-{idx // args.room_size}"
+    leader = idx % args.room_size == 0
+
+    def on_message(msg):
+        mtype = msg.get("type")
+        results.received[mtype] += 1
+        if mtype in ("state", "delta") and args.tick_rate:
+            try:
+                client.send({"type": "ack", "tick": msg.get("tick")})
+            except ConnectionError:
+                pass
+
+    client = AsyncGameClient(args.host, args.port, on_message=on_message, codec=args.codec, timeout=args.timeout)
+    await asyncio.sleep(rng.uniform(0, args.ramp))
+    try:
+        await client.connect()
+    except (OSError, asyncio.TimeoutError):
+        results.errors["connect"] += 1
+        return
+    try:
+        if leader:
+            await timed(results, "create_room", client.create_room(room, max_players=args.room_size))
+            room_ready.set()
+        else:
+            await asyncio.wait_for(room_ready.wait(), args.timeout)
+        if await timed(results, "join", client.join(f"bot-{idx}", room)) is None:
+            return
+        if leader:
+            # give the others a moment to join so the level is sized for the whole room
+            await asyncio.sleep(0.2)
+            await timed(results, "start_level", client.start_level(rng.randint(1, args.max_level)))
+        end = time.monotonic() + args.duration
+        next_ping = time.monotonic() + 1.0
+        while time.monotonic() < end and client.writer is not None:
+            client.send({"type": "input", "dx": rng.choice((-1, 0, 1)), "dy": rng.choice((-1, 0, 1)),
+                         "fire": [rng.uniform(0, 900), rng.uniform(0, 700)] if rng.random() < 0.2 else None})
+            if time.monotonic() >= next_ping:
+                next_ping += 1.0
+                await timed(results, "ping", client.ping())
+            await asyncio.sleep(1.0 / args.input_rate)
+        await client.leave()
+        results.bots_done += 1
+    except (ConnectionError, asyncio.TimeoutError):
+        results.errors["dropped"] += 1
+    finally:
+        await client.close()
+
+
+async def run_bots(args) -> dict:
+    results = Results()
+    rooms = (args.bots + args.room_size - 1) // args.room_size
+    ready = [asyncio.Event() for _ in range(rooms)]
+    threads = 0
+
+    async def sample_threads():
+        nonlocal threads
+        while True:
+            threads = max(threads, threading.active_count())
+            await asyncio.sleep(0.5)
+
+    sampler = asyncio.ensure_future(sample_threads())
+    t0 = time.perf_counter()
+    await asyncio.gather(*(bot(i, args, results, ready[i // args.room_size]) for i in range(args.bots)))
+    elapsed = time.perf_counter() - t0
+    sampler.cancel()
+    return {
+        "bots": args.bots,
+        "rooms": rooms,
+        "codec": args.codec,
+        "elapsed_s": round(elapsed, 2),
+        "bots_completed": results.bots_done,
+        "client_threads": threads,
+        "latency_ms": {name: percentiles(s) for name, s in results.latency_ms.items()},
+        "received": dict(results.received),
+        "errors": dict(results.errors),
+        "timeouts": dict(results.timeouts),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--impl", choices=["threaded", "asyncio", "sharded"],
+                    help="start this server; without it, use the one on --host/--port")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=6000)
+    ap.add_argument("--tick-rate", type=int, default=0, help="with --impl: run the authoritative simulation")
+    ap.add_argument("--bots", type=int, default=60)
+    ap.add_argument("--room-size", type=int, default=3)
+    ap.add_argument("--duration", type=float, default=5.0)
+    ap.add_argument("--ramp", type=float, default=1.0, help="seconds over which bots connect")
+    ap.add_argument("--input-rate", type=float, default=10.0)
+    ap.add_argument("--max-level", type=int, default=10)
+    ap.add_argument("--codec", choices=CODECS, default=JSON_CODEC)
+    ap.add_argument("--timeout", type=float, default=5.0, help="seconds to wait for each reply")
+    ap.add_argument("--json", action="store_true", help="print results as JSON")
+    args = ap.parse_args()
+
+    raise_fd_limit(args.bots * 2 + 256)
+    proc = None
+    if args.impl:
+        extra = ["--no-rate-limits"]
+        if args.impl == "sharded":
+            extra += ["--workers", "2"]
+        if args.tick_rate:
+            extra += ["--tick-rate", str(args.tick_rate)]
+        proc = start_server_process(args.impl, args.port, extra)
+    try:
+        result = asyncio.run(run_bots(args))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+    result["server"] = args.impl or f"{args.host}:{args.port}"
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    for k, v in result.items():
+        if k == "latency_ms":
+            for name, p in v.items():
+                print(f"{name + ' ms':>22}: p50 {p.get('p50')}  p99 {p.get('p99')}  max {p.get('max')}  (n={p['count']})")
+        else:
+            print(f"{k:>22}: {v}")
+
+
+if __name__ == "__main__":
+    main()
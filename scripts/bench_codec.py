@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Codec benchmark: JSON lines vs the binary codec (binary_codec.py).
+
+For typical lobby and in-level messages -- lobby_update, level_started, input,
+ack, and state keyframes / deltas taken from a running ArenaSimulation --
+reports payload size and encode / decode throughput for each codec. Decode is
+measured through protocol.decode_frame, the path the servers use.
+
+Run from the repo root:
+  PYTHONPATH=src python scripts/bench_codec.py --level 10 --seconds 0.5
+"""
+import argparse
+import json
+import random
+import time
+
+from dungeon_game.protocol import encode_frame, decode_frame, JSON_CODEC, BINARY_CODEC
+from dungeon_game.server import level_started_frame
+from dungeon_game.simulation import ArenaSimulation
+from dungeon_game.snapshots import state_from_snapshot, diff_states
+
+
+def sample_messages(level: int):
+    rng = random.Random(3)
+    sim = ArenaSimulation(level, {"alice": "warrior", "bob": "archer", "carol": "sorcerer"}, seed=1)
+    prev = None
+    for _ in range(60):
+        for cid in sim.players:
+            sim.apply_input(cid, {"dx": rng.choice((-1, 0, 1)), "dy": rng.choice((-1, 0, 1)),
+                                  "fire": [rng.randint(0, 900), rng.randint(0, 700)]})
+        prev = sim.snapshot()
+        sim.step(0.05)
+    snap = sim.snapshot()
+    delta = diff_states(state_from_snapshot(prev), state_from_snapshot(snap))
+    level_started = decode_frame(level_started_frame(level, 3, 0))
+    return {
+        "lobby_update": {"type": "lobby_update", "room": "lobby", "clients": ["alice", "bob", "carol"]},
+        "level_started": level_started,
+        "input": {"type": "input", "dx": -1, "dy": 0.5, "fire": [412, 305], "seq": 1234},
+        "ack": {"type": "ack", "tick": snap["tick"]},
+        "state": dict(snap, keyframe=True),
+        "delta": delta,
+    }
+
+
+def rate(fn, seconds: float) -> float:
+    """Calls of fn per second, measured over roughly `seconds`."""
+    n = 0
+    batch = 100
+    t0 = time.perf_counter()
+    while True:
+        for _ in range(batch):
+            fn()
+        n += batch
+        elapsed = time.perf_counter() - t0
+        if elapsed >= seconds:
+            return n / elapsed
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--level", type=int, default=10)
+    ap.add_argument("--seconds", type=float, default=0.5, help="time per measurement")
+    ap.add_argument("--json", action="store_true", help="print results as JSON")
+    args = ap.parse_args()
+
+    results = {}
+    for name, msg in sample_messages(args.level).items():
+        row = {}
+        for codec in (JSON_CODEC, BINARY_CODEC):
+            frame = encode_frame(msg, codec)
+            if decode_frame(frame) != msg:
+                raise SystemExit(f"{codec} round trip changed {name}")
+            row[codec] = {
+                "bytes": len(frame),
+                "encode_per_s": int(rate(lambda: encode_frame(msg, codec), args.seconds)),
+                "decode_per_s": int(rate(lambda: decode_frame(frame), args.seconds)),
+            }
+        row["size_ratio"] = round(row[BINARY_CODEC]["bytes"] / row[JSON_CODEC]["bytes"], 3)
+        results[name] = row
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'message':>14} {'codec':>7} {'bytes':>7} {'encode/s':>10} {'decode/s':>10}")
+    for name, row in results.items():
+        for codec in (JSON_CODEC, BINARY_CODEC):
+            r = row[codec]
+            print(f"{name:>14} {codec:>7} {r['bytes']:>7} {r['encode_per_s']:>10} {r['decode_per_s']:>10}")
+        print(f"{'':>14} {'ratio':>7} {row['size_ratio']:>7}")
+
+
+if __name__ == "__main__":
+    main()
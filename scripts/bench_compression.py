@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Compression benchmark: per-connection zlib streams (compression.py) on the
+messages a client actually receives.
+
+Each stream is the sequence of frames one connection would be sent:
+  level_started  the broadcast for every level 1..--levels (grows with the spawn count)
+  snapshots      a delta per tick from an ArenaSimulation at --level, acked every tick,
+                 with a keyframe every KEYFRAME_INTERVAL ticks
+  room_list      list_rooms replies for --rooms rooms, one page of 100 after another
+  lobby_update   lobby updates as players come and go (small, repetitive)
+
+and each is run, with each --codec, through FrameCompressor in two modes:
+  stream     one compressor for the whole stream, as on a connection
+  per-frame  a fresh compressor per frame, i.e. without the shared window
+at each --compress-level, and decoded again through protocol.FrameDecoder.
+
+Reported per stream / codec / mode / level:
+  frames  compressed   frames sent, and how many were over --min-size
+  raw KB -> wire KB    bytes before / after, and the ratio
+  comp us / dec us     CPU time per compressed frame on the server / client
+
+Run from the repo root:
+  PYTHONPATH=src python scripts/bench_compression.py --codec json binary --compress-level 1 6 9
+"""
+import argparse
+import json
+import random
+
+from dungeon_game.compression import FrameCompressor, DEFAULT_MIN_SIZE, DEFAULT_LEVEL
+from dungeon_game.protocol import FrameDecoder, encode_frame, decode_frame, JSON_CODEC, CODECS
+from dungeon_game.rooms import RoomManager
+from dungeon_game.server import level_started_frame
+from dungeon_game.simulation import ArenaSimulation
+from dungeon_game.snapshots import state_from_snapshot, diff_states, snapshot_from_state, KEYFRAME_INTERVAL
+
+
+def level_started_stream(args, codec):
+    return [level_started_frame(level, 4, 0, codec) for level in range(1, args.levels + 1)]
+
+
+def snapshot_stream(args, codec):
+    rng = random.Random(args.seed)
+    players = {f"p{i}": "warrior" for i in range(4)}
+    sim = ArenaSimulation(args.level, players, seed=args.seed)
+    frames = []
+    prev = None
+    for tick in range(args.ticks):
+        for cid in sim.players:
+            sim.apply_input(cid, {"dx": rng.choice((-1, 0, 1)), "dy": rng.choice((-1, 0, 1)),
+                                  "fire": [rng.randint(0, 900), rng.randint(0, 700)] if rng.random() < 0.2 else None})
+        sim.step(0.05)
+        cur = state_from_snapshot(sim.snapshot())
+        if prev is None or tick % KEYFRAME_INTERVAL == 0:
+            frames.append(encode_frame(dict(snapshot_from_state(cur), keyframe=True), codec))
+        else:
+            frames.append(encode_frame(diff_states(prev, cur), codec))
+        prev = cur
+    return frames
+
+
+def room_list_stream(args, codec):
+    rng = random.Random(args.seed)
+    rooms = RoomManager()
+    for _ in range(args.rooms):
+        rooms.create(max_players=4)
+    pages = []
+    for offset in range(0, len(rooms), 100):
+        infos = rooms.list_rooms(offset, 100)
+        for info in infos:
+            # empty rooms would all look alike; these are in use
+            info["players"] = rng.randint(1, 4)
+        pages.append(encode_frame({"type": "room_list", "total": len(rooms), "offset": offset, "rooms": infos},
+                                  codec))
+    return pages
+
+
+def lobby_update_stream(args, codec):
+    rng = random.Random(args.seed)
+    names = [f"player{i:03d}" for i in range(40)]
+    present = []
+    frames = []
+    for _ in range(200):
+        if present and (len(present) >= 4 or rng.random() < 0.4):
+            present.remove(rng.choice(present))
+        else:
+            present.append(rng.choice([n for n in names if n not in present]))
+        frames.append(encode_frame({"type": "lobby_update", "room": "lobby", "clients": list(present)}, codec))
+    return frames
+
+
+STREAMS = {"level_started": level_started_stream, "snapshots": snapshot_stream,
+           "room_list": room_list_stream, "lobby_update": lobby_update_stream}
+
+
+def run(frames, mode, level, min_size):
+    comp = FrameCompressor(min_size, level)
+    wire = []
+    compressed = 0
+    seconds = 0.0
+    for frame in frames:
+        if mode == "per-frame":
+            comp = FrameCompressor(min_size, level)
+        wire.append(comp.compress(frame))
+        compressed += comp.compressed if mode == "per-frame" else 0
+        seconds += comp.seconds if mode == "per-frame" else 0.0
+    if mode == "stream":
+        compressed, seconds = comp.compressed, comp.seconds
+    raw_bytes = sum(len(f) for f in frames)
+    wire_bytes = sum(len(w) for w in wire)
+    dec_us = None
+    if mode == "stream":
+        # per-frame output can't go through one decoder: each frame is its own deflate stream
+        decoder = FrameDecoder()
+        got = decoder.feed(b"".join(wire))
+        assert got == [decode_frame(f) for f in frames], "round trip mismatch"
+        if decoder.decompressor is not None:
+            dec_us = decoder.decompressor.stats()["us_per_frame"]
+    return {"frames": len(frames), "compressed": compressed,
+            "raw_kb": round(raw_bytes / 1024, 1), "wire_kb": round(wire_bytes / 1024, 1),
+            "ratio": round(raw_bytes / wire_bytes, 2) if wire_bytes else None,
+            "comp_us": round(seconds / compressed * 1e6, 2) if compressed else None, "dec_us": dec_us}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--stream", choices=list(STREAMS), nargs="+", default=list(STREAMS))
+    ap.add_argument("--codec", choices=CODECS, nargs="+", default=[JSON_CODEC])
+    ap.add_argument("--compress-level", type=int, nargs="+", default=[DEFAULT_LEVEL])
+    ap.add_argument("--min-size", type=int, default=DEFAULT_MIN_SIZE, help="frames shorter than this go out as they are")
+    ap.add_argument("--levels", type=int, default=50, help="level_started: levels 1..N")
+    ap.add_argument("--level", type=int, default=10, help="snapshots: simulated level")
+    ap.add_argument("--ticks", type=int, default=400, help="snapshots: ticks")
+    ap.add_argument("--rooms", type=int, default=2000, help="room_list: rooms listed")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--json", action="store_true", help="print results as JSON")
+    args = ap.parse_args()
+
+    results = []
+    for name in args.stream:
+        for codec in args.codec:
+            frames = STREAMS[name](args, codec)
+            for level in args.compress_level:
+                for mode in ("stream", "per-frame"):
+                    results.append({"stream": name, "codec": codec, "level": level, "mode": mode,
+                                    **run(frames, mode, level, args.min_size)})
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'stream':<14} {'codec':<6} {'lvl':>3} {'mode':<9} {'frames':>6} {'compr':>6} {'raw_KB':>8} "
+          f"{'wire_KB':>8} {'ratio':>6} {'comp_us':>8} {'dec_us':>7}")
+    for r in results:
+        print(f"{r['stream']:<14} {r['codec']:<6} {r['level']:>3} {r['mode']:<9} {r['frames']:>6} {r['compressed']:>6} "
+              f"{r['raw_kb']:>8} {r['wire_kb']:>8} {r['ratio']!s:>6} {r['comp_us']!s:>8} {r['dec_us']!s:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Interpolation harness: how smoothly remote entities move at the client's frame rate.
+
+Runs an authoritative ArenaSimulation ("server", fixed --tick-rate) whose
+player wanders randomly so the mobs keep chasing it, and a client rendering
+at --fps against one virtual clock, no sockets. Snapshots reach the client
+after --latency plus up to --jitter ms (in order, as over TCP); --loss drops
+a share of them, as if lost or coalesced away by a slow frame. Every mob is
+drawn each frame either at its position in the newest snapshot ("raw") or
+through an InterpolationBuffer at each --delay.
+
+Reported per mode:
+  jerk px     mean change in per-frame displacement of a mob; raw snapshots
+              move every third frame at 60 FPS / 20 Hz, which is the stutter
+  error px    distance from where the server had the mob at the rendered
+              point in time (mean/p99), i.e. what interpolation gets wrong
+  behind ms   how far the rendered time trails the newest snapshot
+  interp/extrap/held %  how the samples were produced (see interpolation.py)
+  advance us  CPU time per InterpolationBuffer.advance() per entity
+
+Run from the repo root:
+  PYTHONPATH=src python scripts/bench_interpolation.py --delay 0 1 2 3 --jitter 30 --loss 0.05
+"""
+import argparse
+import json
+import math
+import random
+import time
+
+from bench_prediction import Link
+from loadtest import percentiles
+from dungeon_game.interpolation import InterpolationBuffer
+from dungeon_game.protocol import decode_frame, encode_frame, JSON_CODEC, CODECS
+from dungeon_game.simulation import ArenaSimulation
+from dungeon_game.snapshots import SnapshotReceiver
+
+CLIENT = "me"
+
+
+def run(delay, args) -> dict:
+    """One run; delay None draws the raw newest snapshot."""
+    rng = random.Random(args.seed)
+    sim = ArenaSimulation(args.level, {CLIENT: "warrior"}, seed=args.seed)
+    sim.players[CLIENT].player.hp = 10 ** 9
+    step = 1.0 / args.tick_rate
+    down = Link(rng, args.latency / 1000.0, args.jitter / 1000.0)
+    receiver = SnapshotReceiver()
+    buf = InterpolationBuffer(args.tick_rate, delay_ticks=delay) if delay is not None else None
+    # tick -> {mob id: (x, y)} as the server had it
+    truth = {}
+    latest = None
+
+    frame_dt = 1.0 / args.fps
+    next_frame = 0.0
+    next_tick = step
+    next_change = 0.0
+    last_pos = {}
+    last_disp = {}
+    jerks = []
+    errors = []
+    behind = []
+    advance_s = 0.0
+    advance_n = 0
+    now = 0.0
+    while now < args.seconds:
+        now = min(next_frame, next_tick)
+        if next_tick <= next_frame:
+            if now >= next_change:
+                sim.apply_input(CLIENT, {"type": "input", "dx": rng.choice((-1, 0, 1)), "dy": rng.choice((-1, 0, 1))})
+                next_change = now + rng.expovariate(1.0 / args.change_every)
+            sim.step(step)
+            truth[sim.tick] = {mid: (m.x, m.y) for mid, m in sim.mobs.items()}
+            if rng.random() >= args.loss:
+                down.send(now, encode_frame(sim.snapshot(), args.codec))
+            next_tick += step
+            continue
+        for frame in down.receive(now):
+            state = receiver.receive(decode_frame(frame))
+            if state is None:
+                continue
+            latest = state
+            if buf is not None:
+                buf.push(state, now)
+        next_frame += frame_dt
+        if latest is None:
+            continue
+        if buf is not None:
+            t0 = time.perf_counter()
+            rt = buf.advance(now)
+            advance_s += time.perf_counter() - t0
+            advance_n += len(buf.tracks["mobs"]) + len(buf.tracks["players"])
+            positions = {mid: (tr.x, tr.y) for mid, tr in buf.tracks["mobs"].items()}
+        else:
+            rt = latest["tick"]
+            positions = {mid: (rec["x"], rec["y"]) for mid, rec in latest["mobs"].items()}
+        behind.append((latest["tick"] - rt) * step * 1000)
+        # the server's position at render tick rt, between the two ticks around it
+        lo = math.floor(rt)
+        frac = rt - lo
+        a, b = truth.get(lo), truth.get(lo + 1)
+        for mid, (x, y) in positions.items():
+            if a is not None and b is not None and mid in a and mid in b:
+                tx = a[mid][0] + (b[mid][0] - a[mid][0]) * frac
+                ty = a[mid][1] + (b[mid][1] - a[mid][1]) * frac
+                errors.append(math.hypot(x - tx, y - ty))
+            prev = last_pos.get(mid)
+            if prev is not None:
+                disp = math.hypot(x - prev[0], y - prev[1])
+                if mid in last_disp:
+                    jerks.append(abs(disp - last_disp[mid]))
+                last_disp[mid] = disp
+            last_pos[mid] = (x, y)
+
+    err = percentiles(errors)
+    result = {
+        "mode": "raw" if delay is None else f"delay {delay:g}",
+        "latency_ms": args.latency,
+        "jitter_ms": args.jitter,
+        "loss": args.loss,
+        "jerk_px_mean": round(sum(jerks) / len(jerks), 3) if jerks else None,
+        "error_px_mean": err.get("mean"),
+        "error_px_p99": err.get("p99"),
+        "behind_ms_mean": round(sum(behind) / len(behind), 1) if behind else None,
+    }
+    if buf is not None:
+        stats = buf.stats()
+        result.update({"interpolated_pct": stats["interpolated_pct"], "extrapolated_pct": stats["extrapolated_pct"],
+                       "held_pct": stats["held_pct"],
+                       "advance_us_per_entity": round(advance_s / advance_n * 1e6, 3) if advance_n else None})
+    return result
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--delay", type=float, nargs="+", default=[1, 2, 3], help="interpolation delays in ticks")
+    ap.add_argument("--latency", type=float, default=40.0, help="one-way snapshot latency in ms")
+    ap.add_argument("--jitter", type=float, default=20.0, help="extra one-way delay, uniform 0..J ms")
+    ap.add_argument("--loss", type=float, default=0.0, help="share of snapshots dropped")
+    ap.add_argument("--tick-rate", type=int, default=20)
+    ap.add_argument("--fps", type=int, default=60)
+    ap.add_argument("--level", type=int, default=3)
+    ap.add_argument("--seconds", type=float, default=30.0, help="simulated seconds per run")
+    ap.add_argument("--change-every", type=float, default=0.5, help="mean seconds between player direction changes")
+    ap.add_argument("--codec", choices=CODECS, default=JSON_CODEC)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--json", action="store_true", help="print results as JSON")
+    args = ap.parse_args()
+
+    results = [run(None, args)] + [run(d, args) for d in args.delay]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'mode':<10} {'jerk_px':>8} {'err_mean':>8} {'err_p99':>8} {'behind_ms':>9} "
+          f"{'interp%':>7} {'extrap%':>7} {'held%':>6} {'adv_us':>7}")
+    for r in results:
+        print(f"{r['mode']:<10} {r['jerk_px_mean']!s:>8} {r['error_px_mean']!s:>8} {r['error_px_p99']!s:>8} "
+              f"{r['behind_ms_mean']!s:>9} {r.get('interpolated_pct', '-')!s:>7} {r.get('extrapolated_pct', '-')!s:>7} "
+              f"{r.get('held_pct', '-')!s:>6} {r.get('advance_us_per_entity', '-')!s:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Netcode under emulated links: game clients play through netem.NetemProxy.
+
+For each --profile (see netem.PROFILES) a fresh server is started with a
+simulation (--tick-rate), and a proxy with that link in both directions
+sits in front of it. --clients GameClients connect through the proxy
+(auto-reconnecting), join the lobby, and for --seconds send movement input
+every tick and ack every snapshot; the first one restarts the level when it
+ends. --disconnect-every cuts each proxied connection after that many
+seconds on average (then --blackout refuses reconnects for a while), to
+exercise reconnect / resume.
+
+Reported per profile, over all clients:
+  rtt ms         the clients' smoothed RTT (latency.LatencyEstimator) vs. the
+                 link's 2 x latency + mean jitter both ways; lost / reordered
+                 segments stall whatever is behind them and push it up
+  snap/s         snapshots received per second and client
+  gap ms         time between consecutive snapshots (p50 / p99 / max): jitter,
+                 loss and reordering show up here as head-of-line stalls
+  undecodable    deltas whose baseline the client didn't have
+  reconn/resume  reconnects, and mean ms from losing the link to "resumed"
+  down KB/s      server -> client bytes through the proxy per second
+  lost/reord     segments the proxy delayed as lost / reordered
+
+Run from the repo root:
+  PYTHONPATH=src:scripts python scripts/bench_netem.py --profile lan wifi mobile bad --seconds 10
+  PYTHONPATH=src:scripts python scripts/bench_netem.py --profile wifi --disconnect-every 3 --blackout 0.5
+"""
+import argparse
+import json
+import random
+import time
+
+from bench_server import start_server_process
+from loadtest import percentiles
+from dungeon_game.netem import LinkProfile, PROFILES, start_proxy
+from dungeon_game.network import GameClient
+from dungeon_game.protocol import JSON_CODEC, CODECS
+from dungeon_game.snapshots import SnapshotReceiver
+
+
+class BotClient:
+    """One GameClient that acks snapshots and records when they arrive."""
+    def __init__(self, name: str, port: int, args):
+        self.name = name
+        self.receiver = SnapshotReceiver()
+        self.arrivals = []
+        self.undecodable = 0
+        self.last_snapshot = time.perf_counter()
+        self.level_over = False
+        self.joined_at = None
+        self.lost_at = None
+        self.resume_times = []
+        self.client = GameClient("127.0.0.1", port, on_message=self.on_message, codec=args.codec,
+                                 reconnect=True, backoff_initial=0.1, backoff_max=1.0, max_attempts=100,
+                                 ping_interval=0.5, compress=args.compress)
+
+    def on_message(self, msg):
+        mtype = msg.get("type")
+        now = time.perf_counter()
+        if mtype in ("state", "delta"):
+            state = self.receiver.receive(msg)
+            if state is None:
+                self.undecodable += 1
+                return
+            self.arrivals.append(now)
+            self.last_snapshot = now
+            ack = self.receiver.ack_message()
+            if ack is not None:
+                self.client.send(ack)
+        elif mtype == "level_result":
+            self.level_over = True
+        elif mtype == "reconnecting":
+            if self.lost_at is None:
+                self.lost_at = now
+            # the new connection starts without a baseline; don't count its first gap as a stall
+            self.arrivals.append(None)
+        elif mtype in ("joined", "resumed"):
+            if self.joined_at is None:
+                self.joined_at = now
+            if self.lost_at is not None:
+                self.resume_times.append(now - self.lost_at)
+                self.lost_at = None
+
+    def gaps(self):
+        out = []
+        prev = None
+        for t in self.arrivals:
+            if t is not None and prev is not None:
+                out.append((t - prev) * 1000)
+            prev = t
+        return out
+
+
+def run(name: str, args, port: int) -> dict:
+    profile = LinkProfile.named(name)
+    extra = ["--tick-rate", str(args.tick_rate), "--ping-interval", "1"]
+    if args.impl == "sharded":
+        extra += ["--workers", "2"]
+    server = start_server_process("asyncio" if args.impl == "asyncio" else "threaded", port, extra)
+    proxy = start_proxy("127.0.0.1", port, profile, disconnect_every=args.disconnect_every,
+                        blackout=args.blackout, seed=args.seed)
+    rng = random.Random(args.seed)
+    bots = [BotClient(f"bot{i}", proxy.port, args) for i in range(args.clients)]
+    try:
+        for bot in bots:
+            bot.client.connect()
+            bot.client.send({"type": "join", "client_id": bot.name})
+        time.sleep(0.5 + 4 * profile.latency)
+        bots[0].client.send({"type": "start_level", "level": args.level})
+        step = 1.0 / args.tick_rate
+        # no snapshots for this long: the level ended or its start_level was lost in a cut
+        stalled = 1.0 + 4 * profile.latency + profile.rto()
+        start = time.perf_counter()
+        base = proxy.stats()["down"]["bytes_out"]
+        leader = bots[0]
+        leader.last_snapshot = start
+        while time.perf_counter() - start < args.seconds:
+            for bot in bots:
+                bot.client.send({"type": "input", "dx": rng.choice((-1, 0, 1)), "dy": rng.choice((-1, 0, 1))})
+            now = time.perf_counter()
+            if leader.level_over or (now - leader.last_snapshot > stalled and leader.lost_at is None):
+                leader.level_over = False
+                leader.last_snapshot = now
+                leader.client.send({"type": "start_level", "level": args.level})
+            time.sleep(step)
+        elapsed = time.perf_counter() - start
+        stats = proxy.stats()
+    finally:
+        for bot in bots:
+            bot.client.close()
+        proxy.close()
+        server.kill()
+        server.wait()
+
+    gaps = percentiles([g for bot in bots for g in bot.gaps()])
+    rtts = [bot.client.latency.srtt for bot in bots if bot.client.latency.srtt is not None]
+    resumes = [r for bot in bots for r in bot.resume_times]
+    return {
+        "profile": name,
+        "link": profile.describe(),
+        "expected_rtt_ms": round((2 * profile.latency + profile.jitter) * 1000, 1),
+        "rtt_ms": round(sum(rtts) / len(rtts) * 1000, 1) if rtts else None,
+        "snapshots_per_s": round(sum(len([t for t in b.arrivals if t]) for b in bots) / elapsed / len(bots), 1),
+        "gap_ms_p50": gaps.get("p50"),
+        "gap_ms_p99": gaps.get("p99"),
+        "gap_ms_max": gaps.get("max"),
+        "undecodable": sum(b.undecodable for b in bots),
+        "reconnects": sum(b.client.reconnects for b in bots),
+        "resume_ms_mean": round(sum(resumes) / len(resumes) * 1000, 1) if resumes else None,
+        "down_kb_per_s": round((stats["down"]["bytes_out"] - base) / elapsed / 1024, 1),
+        "lost": stats["down"]["lost"] + stats["up"]["lost"],
+        "reordered": stats["down"]["reordered"] + stats["up"]["reordered"],
+        "proxy": stats,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--profile", choices=list(PROFILES), nargs="+", default=["lan", "wifi", "mobile", "bad"])
+    ap.add_argument("--impl", choices=["threaded", "asyncio", "sharded"], default="asyncio")
+    ap.add_argument("--clients", type=int, default=2, help="clients in the lobby (at most 4)")
+    ap.add_argument("--seconds", type=float, default=10.0, help="play time per profile")
+    ap.add_argument("--tick-rate", type=int, default=20)
+    ap.add_argument("--level", type=int, default=3)
+    ap.add_argument("--codec", choices=CODECS, default=JSON_CODEC)
+    ap.add_argument("--compress", action="store_true", help="ask for zlib compression (compression.py)")
+    ap.add_argument("--disconnect-every", type=float, default=0.0, help="mean seconds before the proxy cuts a connection")
+    ap.add_argument("--blackout", type=float, default=0.0, help="seconds the proxy refuses connections after a cut")
+    ap.add_argument("--port", type=int, default=6870, help="first server port; one per profile")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--json", action="store_true", help="print results as JSON")
+    args = ap.parse_args()
+
+    results = [run(name, args, args.port + i) for i, name in enumerate(args.profile)]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'profile':<10} {'rtt_ms':>7} {'expect':>7} {'snap/s':>6} {'gap_p50':>7} {'gap_p99':>7} {'gap_max':>7} "
+          f"{'undec':>5} {'reconn':>6} {'resume':>7} {'down_KB/s':>9} {'lost':>5} {'reord':>5}")
+    for r in results:
+        print(f"{r['profile']:<10} {r['rtt_ms']!s:>7} {r['expected_rtt_ms']!s:>7} {r['snapshots_per_s']!s:>6} "
+              f"{r['gap_ms_p50']!s:>7} {r['gap_ms_p99']!s:>7} {r['gap_ms_max']!s:>7} {r['undecodable']:>5} "
+              f"{r['reconnects']:>6} {r['resume_ms_mean']!s:>7} {r['down_kb_per_s']!s:>9} {r['lost']:>5} "
+              f"{r['reordered']:>5}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Prediction harness: correction error of client-side prediction under simulated latency.
+
+Runs an authoritative ArenaSimulation ("server", fixed --tick-rate) and a
+client rendering at --fps with a MovementPredictor (dungeon_game/prediction.py)
+against one virtual clock. The client holds a random direction for
+~--change-every seconds at a time and sends one seq'd input per simulation
+step through a real GameClient (batch_frames, flushed once per frame, encoded
+with --codec) over a loopback socket, so queueing and collapsing in
+network.py apply; what comes out reaches the server after half the round trip
+plus up to --jitter (in order, as over TCP) and is applied at the next tick
+boundary, like RoomSimulation does. Every tick's snapshot goes back encoded with --codec the
+same way, and the client reconciles on each one.
+
+Reported per round-trip time:
+  correction px   how far reconcile() moved the predicted player (mean/p99/max),
+                  and the share of snapshots that moved it by more than 0.5 px
+  replayed        pending inputs replayed per snapshot
+  reconcile us    CPU time per reconcile()
+  lag px          how far the last server position the client knows trails the
+                  predicted one -- roughly what the player would see without prediction
+  sent / lost     inputs the client sent, and how many of them never reached the
+                  server as their own message (collapsed into a later one)
+
+Mobs are removed so the player can't die mid-run and only movement is measured.
+
+Run from the repo root:
+  PYTHONPATH=src python scripts/bench_prediction.py --rtt 0 50 100 200 --jitter 20
+"""
+import argparse
+import json
+import math
+import random
+import socket
+import time
+
+from loadtest import percentiles
+from dungeon_game.arena import ArenaPlayer
+from dungeon_game.game import Game
+from dungeon_game.network import GameClient
+from dungeon_game.prediction import MovementPredictor, CORRECTION_THRESHOLD
+from dungeon_game.protocol import FrameDecoder, decode_frame, encode_frame, JSON_CODEC, CODECS
+from dungeon_game.simulation import ArenaSimulation
+
+CLIENT = "me"
+
+
+class Link:
+    """One direction of an in-order connection with latency and jitter."""
+    def __init__(self, rng: random.Random, one_way: float, jitter: float):
+        self.rng = rng
+        self.one_way = one_way
+        self.jitter = jitter
+        self.queue = []
+        self.last = 0.0
+
+    def send(self, now: float, item):
+        at = max(self.last, now + self.one_way + self.rng.uniform(0, self.jitter))
+        self.last = at
+        self.queue.append((at, item))
+
+    def receive(self, now: float):
+        n = 0
+        while n < len(self.queue) and self.queue[n][0] <= now:
+            n += 1
+        items = [item for _, item in self.queue[:n]]
+        del self.queue[:n]
+        return items
+
+
+class InputPipe:
+    """The client's outbound path: a GameClient connected to a loopback socket the harness reads inputs from."""
+    def __init__(self, codec: str):
+        listener = socket.create_server(("127.0.0.1", 0))
+        self.client = GameClient("127.0.0.1", listener.getsockname()[1], batch_frames=True, ping_interval=0)
+        self.client.connect()
+        self.sock, _ = listener.accept()
+        listener.close()
+        # no join here, so set what "joined" would have switched to
+        self.client.codec = codec
+        self.decoder = FrameDecoder()
+        self.received = 0
+
+    def send(self, msgs: list) -> list:
+        """Queue msgs, flush like the game loop does once per frame, and return what came out the other end."""
+        for msg in msgs:
+            self.client.send(msg)
+        self.client.drain()
+        out = []
+        while self.received < self.client.send_stats()["frames_sent"]:
+            if not self.decoder.recv_into(self.sock):
+                raise ConnectionError("client closed the connection")
+            for msg in self.decoder.messages():
+                out.append(msg)
+                self.received += 1
+        return out
+
+    def close(self):
+        self.client.close()
+        self.sock.close()
+
+
+def run(rtt_ms: float, args) -> dict:
+    rng = random.Random(args.seed)
+    sim = ArenaSimulation(1, {CLIENT: "warrior"}, seed=args.seed)
+    sim.mobs.clear()
+    sim.next_wave_time = None
+    server_ap = sim.players[CLIENT]
+    step = 1.0 / args.tick_rate
+    client_ap = ArenaPlayer(Game.create_player_by_class("warrior", CLIENT), server_ap.x, server_ap.y)
+    predictor = MovementPredictor(client_ap, sim.bounds, step)
+    up = Link(rng, rtt_ms / 2000.0, args.jitter / 1000.0)
+    down = Link(rng, rtt_ms / 2000.0, args.jitter / 1000.0)
+
+    frame_dt = 1.0 / args.fps
+    next_frame = 0.0
+    next_tick = step
+    next_change = 0.0
+    direction = (0, 0)
+    known = (server_ap.x, server_ap.y)
+    errors = []
+    lags = []
+    reconcile_s = 0.0
+    now = 0.0
+    sent = 0
+    pipe = InputPipe(args.codec)
+    try:
+        while now < args.seconds:
+            now = min(next_frame, next_tick)
+            if next_tick <= next_frame:
+                for msg in up.receive(now):
+                    sim.apply_input(CLIENT, msg)
+                sim.step(step)
+                down.send(now, encode_frame(sim.snapshot(), args.codec))
+                next_tick += step
+                continue
+            # client frame: snapshots first, then this frame's input
+            for frame in down.receive(now):
+                snap = decode_frame(frame)
+                rec = next(p for p in snap["players"] if p["id"] == CLIENT)
+                known = (rec["x"], rec["y"])
+                t0 = time.perf_counter()
+                errors.append(predictor.reconcile(rec["x"], rec["y"], rec.get("seq")))
+                reconcile_s += time.perf_counter() - t0
+            if now >= next_change:
+                direction = (rng.choice((-1, 0, 1)), rng.choice((-1, 0, 1)))
+                next_change = now + rng.expovariate(1.0 / args.change_every)
+            msgs = predictor.advance(direction[0], direction[1], frame_dt)
+            sent += len(msgs)
+            for msg in pipe.send(msgs):
+                up.send(now, msg)
+            lags.append(math.hypot(client_ap.x - known[0], client_ap.y - known[1]))
+            next_frame += frame_dt
+    finally:
+        pipe.close()
+
+    err = percentiles(errors)
+    lag = percentiles(lags)
+    stats = predictor.stats()
+    return {
+        "rtt_ms": rtt_ms,
+        "jitter_ms": args.jitter,
+        "snapshots": len(errors),
+        "corrected_pct": round(100.0 * sum(e > CORRECTION_THRESHOLD for e in errors) / len(errors), 1) if errors else None,
+        "correction_px_mean": err.get("mean"),
+        "correction_px_p99": err.get("p99"),
+        "correction_px_max": err.get("max"),
+        "replayed_per_snapshot": stats["replayed_per_reconcile"],
+        "reconcile_us": round(reconcile_s / len(errors) * 1e6, 2) if errors else None,
+        "lag_px_mean": lag.get("mean"),
+        "lag_px_p99": lag.get("p99"),
+        "inputs_sent": sent,
+        "inputs_lost": sent - pipe.received,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rtt", type=float, nargs="+", default=[0, 50, 100, 200], help="round-trip times in ms")
+    ap.add_argument("--jitter", type=float, default=10.0, help="extra one-way delay, uniform 0..J ms")
+    ap.add_argument("--tick-rate", type=int, default=20)
+    ap.add_argument("--fps", type=int, default=60)
+    ap.add_argument("--seconds", type=float, default=30.0, help="simulated seconds per run")
+    ap.add_argument("--change-every", type=float, default=0.5, help="mean seconds between direction changes")
+    ap.add_argument("--codec", choices=CODECS, default=JSON_CODEC)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--json", action="store_true", help="print results as JSON")
+    args = ap.parse_args()
+
+    results = [run(rtt, args) for rtt in args.rtt]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'rtt_ms':>6} {'snaps':>6} {'corr%':>6} {'err_mean':>8} {'err_p99':>8} {'err_max':>8} "
+          f"{'replay':>6} {'rec_us':>7} {'lag_mean':>8} {'lag_p99':>8} {'sent':>6} {'lost':>5}")
+    for r in results:
+        print(f"{r['rtt_ms']:>6g} {r['snapshots']:>6} {r['corrected_pct']:>6} {r['correction_px_mean']:>8} "
+              f"{r['correction_px_p99']:>8} {r['correction_px_max']:>8} {r['replayed_per_snapshot']:>6} "
+              f"{r['reconcile_us']:>7} {r['lag_px_mean']:>8} {r['lag_px_p99']:>8} {r['inputs_sent']:>6} "
+              f"{r['inputs_lost']:>5}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Client receive-path benchmark: messages per second for small and large frames.
+
+Three ways of turning a byte stream into messages:
+
+  str_split -- the old GameClient loop: recv(4096), decode each chunk to str,
+               buff += chunk, then buff.split("\\n", 1) per line (JSON only;
+               a multi-byte character split across chunks is a decode error)
+  feed      -- recv() into a new bytes object, then FrameDecoder.feed()
+  recv_into -- FrameDecoder.recv_into(sock) + messages(): reads land in the
+               decoder's preallocated buffer and frames are parsed in place
+
+Frames are "small" (input / ack sized) or "large" (a full state keyframe of a
+crowded room). By default data comes from an in-memory source that hands out
+at most --chunk bytes per call, which isolates parsing cost; --socket streams
+it over a real socketpair from a sender thread instead.
+
+Run from the repo root:
+  PYTHONPATH=src python scripts/bench_recv.py --megabytes 20 --codec binary
+"""
+import argparse
+import json
+import socket
+import threading
+import time
+
+from dungeon_game.protocol import FrameDecoder, encode_frame, JSON_CODEC, CODECS
+
+METHODS = ("str_split", "feed", "recv_into")
+
+
+def sample_frames(kind: str):
+    if kind == "small":
+        return [{"type": "input", "dx": -1, "dy": 0.5, "fire": [412, 305], "seq": i} for i in range(64)]
+    mobs = [{"id": i, "x": 100.5 + i, "y": 220.25, "hp": 40} for i in range(300)]
+    projectiles = [{"id": 1000 + i, "x": 12.5 * i, "y": 33.5} for i in range(60)]
+    players = [{"id": name, "x": 450.0, "y": 350.0, "hp": 120} for name in ("ålice", "bøb", "çarol")]
+    return [{"type": "state", "tick": t, "wave": 3, "waves_total": 5, "coins": 17, "players": players,
+             "mobs": mobs, "projectiles": projectiles, "keyframe": True} for t in range(4)]
+
+
+class MemorySource:
+    """Socket stand-in that replays a byte stream, at most `chunk` bytes per call."""
+    def __init__(self, data: bytes, chunk: int, total: int):
+        self.data = memoryview(data)
+        self.chunk = chunk
+        self.remaining = total
+        self.pos = 0
+
+    def _take(self, n: int) -> memoryview:
+        n = min(n, self.chunk, self.remaining, len(self.data) - self.pos)
+        out = self.data[self.pos:self.pos + n]
+        self.pos += n
+        self.remaining -= n
+        if self.pos == len(self.data):
+            self.pos = 0
+        return out
+
+    def recv(self, n: int) -> bytes:
+        return bytes(self._take(n))
+
+    def recv_into(self, view) -> int:
+        piece = self._take(len(view))
+        view[:len(piece)] = piece
+        return len(piece)
+
+
+def receive(method: str, sock, expect: int) -> tuple:
+    """Read messages until `expect` arrived or EOF; returns (messages, decode_errors)."""
+    count = 0
+    errors = 0
+    if method == "str_split":
+        buff = ""
+        while count < expect:
+            data = sock.recv(4096)
+            if not data:
+                break
+            try:
+                buff += data.decode("utf-8")
+            except UnicodeDecodeError:
+                # a character split between chunks; the old client died here
+                errors += 1
+                buff += data.decode("utf-8", "replace")
+            while "\n" in buff:
+                line, buff = buff.split("\n", 1)
+                try:
+                    json.loads(line)
+                    count += 1
+                except ValueError:
+                    errors += 1
+        return count, errors
+    decoder = FrameDecoder()
+    while count < expect:
+        if method == "feed":
+            data = sock.recv(65536)
+            if not data:
+                break
+            count += len(decoder.feed(data))
+        else:
+            if not decoder.recv_into(sock):
+                break
+            count += len(decoder.messages())
+    return count, errors
+
+
+def run(method: str, kind: str, codec: str, args) -> dict:
+    frames = [encode_frame(m, codec) for m in sample_frames(kind)]
+    blob = b"".join(frames)
+    frame_bytes = len(blob) / len(frames)
+    # repeat the sample frames until the stream is about --megabytes long
+    reps = max(1, int(args.megabytes * 1024 * 1024 / len(blob)))
+    expect = reps * len(frames)
+    total = reps * len(blob)
+    if args.socket:
+        rx, tx = socket.socketpair()
+
+        def send():
+            try:
+                for _ in range(reps):
+                    tx.sendall(blob)
+            finally:
+                tx.close()
+        t = threading.Thread(target=send, daemon=True)
+        t0 = time.perf_counter()
+        t.start()
+        count, errors = receive(method, rx, expect)
+        elapsed = time.perf_counter() - t0
+        rx.close()
+    else:
+        src = MemorySource(blob, args.chunk, total)
+        t0 = time.perf_counter()
+        count, errors = receive(method, src, expect)
+        elapsed = time.perf_counter() - t0
+    return {
+        "method": method,
+        "frames": kind,
+        "codec": codec,
+        "frame_bytes": round(frame_bytes),
+        "messages": count,
+        "errors": errors,
+        "msgs_per_s": round(count / elapsed) if elapsed else None,
+        "mb_per_s": round(total / elapsed / 1e6, 1) if elapsed else None,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--codec", choices=CODECS, default=JSON_CODEC)
+    ap.add_argument("--megabytes", type=float, default=20.0, help="stream size per run")
+    ap.add_argument("--chunk", type=int, default=4096, help="bytes per read from the in-memory source")
+    ap.add_argument("--socket", action="store_true", help="stream over a socketpair instead of from memory")
+    ap.add_argument("--json", action="store_true", help="print results as JSON")
+    args = ap.parse_args()
+
+    results = []
+    for kind in ("small", "large"):
+        for method in METHODS:
+            if method == "str_split" and args.codec != JSON_CODEC:
+                continue
+            results.append(run(method, kind, args.codec, args))
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'frames':<6} {'method':<10} {'frame_B':>8} {'msgs/s':>10} {'MB/s':>7} {'errors':>7}")
+    for r in results:
+        print(f"{r['frames']:<6} {r['method']:<10} {r['frame_bytes']:>8} {r['msgs_per_s']:>10} "
+              f"{r['mb_per_s']:>7} {r['errors']:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Measure join/leave latency against the room manager as the room count grows.
+
+Runs the server's handle_message/handle_disconnect in-process with stub
+connections (no sockets), so it isolates room lookup, per-room locking and
+lobby_update fan-out. Latency should stay flat from 10 to 10k+ rooms.
+
+Run from the repo root:
+  PYTHONPATH=src python scripts/bench_rooms.py --rooms 10 100 1000 10000 50000
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+
+from dungeon_game.rooms import RoomManager
+from dungeon_game.server import handle_message, handle_disconnect
+
+
+class StubConn:
+    """Connection stand-in that discards outbound frames."""
+    def __init__(self):
+        self.client_id = None
+        self.room = None
+
+    def send_message(self, msg):
+        pass
+
+    def send_frame(self, frame):
+        pass
+
+
+def populate(rooms: RoomManager, count: int, players_per_room: int):
+    for i in range(count):
+        room_id = f"r{i}"
+        rooms.create(room_id)
+        for p in range(players_per_room):
+            handle_message(rooms, StubConn(), {"type": "join", "client_id": f"{room_id}-p{p}", "room": room_id})
+
+
+def bench(room_count: int, joins: int, players_per_room: int) -> dict:
+    rooms = RoomManager()
+    populate(rooms, room_count, players_per_room)
+    rng = random.Random(1)
+    samples = []
+    for i in range(joins):
+        room_id = f"r{rng.randrange(room_count)}"
+        conn = StubConn()
+        t0 = time.perf_counter()
+        handle_message(rooms, conn, {"type": "join", "client_id": f"bench{i}", "room": room_id})
+        handle_disconnect(rooms, conn)
+        samples.append(time.perf_counter() - t0)
+    samples.sort()
+    return {
+        "rooms": room_count,
+        "joins": joins,
+        "mean_us": round(statistics.fmean(samples) * 1e6, 2),
+        "p50_us": round(samples[len(samples) // 2] * 1e6, 2),
+        "p99_us": round(samples[int(len(samples) * 0.99) - 1] * 1e6, 2),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rooms", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    ap.add_argument("--joins", type=int, default=20000)
+    ap.add_argument("--players-per-room", type=int, default=2)
+    ap.add_argument("--json", action="store_true", help="print results as JSON")
+    args = ap.parse_args()
+
+    results = [bench(n, args.joins, args.players_per_room) for n in args.rooms]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'rooms':>8}{'mean_us':>10}{'p50_us':>10}{'p99_us':>10}")
+    for r in results:
+        print(f"{r['rooms']:>8}{r['mean_us']:>10}{r['p50_us']:>10}{r['p99_us']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Benchmark the threaded and asyncio multiplayer servers side by side.
+
+For each implementation this starts a server subprocess, opens N idle TCP
+connections to it, then drives one joined client with pipelined start_level
+requests and reports:
+  - idle connections actually held
+  - server thread count and RSS while holding them
+  - start_level round trips per second with the idle connections attached
+
+Run from the repo root:
+  PYTHONPATH=src python scripts/bench_server.py --connections 2000 --duration 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import dungeon_game
+
+
+def raise_fd_limit(wanted: int):
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        target = min(hard, max(soft, wanted))
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+    except Exception:
+        pass
+
+
+def proc_status(pid: int) -> dict:
+    out = {"threads": None, "rss_kb": None}
+    try:
+        with open(f"/proc/{pid}/status") as fh:
+            for line in fh:
+                if line.startswith("Threads:"):
+                    out["threads"] = int(line.split()[1])
+                elif line.startswith("VmRSS:"):
+                    out["rss_kb"] = int(line.split()[1])
+    except OSError:
+        pass
+    return out
+
+
+def start_server_process(impl: str, port: int, extra_args=()) -> subprocess.Popen:
+    env = dict(os.environ)
+    src = str(Path(dungeon_game.__file__).resolve().parent.parent)
+    env["PYTHONPATH"] = src + os.pathsep + env.get("PYTHONPATH", "")
+    cmd = [sys.executable, "-m", "dungeon_game.main", "server", str(port), *extra_args]
+    if impl == "asyncio":
+        cmd.append("--asyncio")
+    # the child inherits the raised RLIMIT_NOFILE from main()
+    proc = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return proc
+        except OSError:
+            time.sleep(0.05)
+    proc.kill()
+    raise RuntimeError(f"{impl} server did not start on port {port}")
+
+
+async def open_idle(port: int, count: int):
+    conns = []
+    for _ in range(count):
+        try:
+            conns.append(await asyncio.open_connection("127.0.0.1", port))
+        except OSError:
+            break
+    return conns
+
+
+async def drive_throughput(port: int, duration: float, window: int) -> int:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(b'{"type":"join","client_id":"bench"}\n')
+    await writer.drain()
+    req = json.dumps({"type": "start_level", "level": 3}).encode() + b"\n"
+    done = 0
+    outstanding = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        while outstanding < window:
+            writer.write(req)
+            outstanding += 1
+        await writer.drain()
+        line = await reader.readline()
+        if not line:
+            break
+        if b'"level_started"' in line:
+            done += 1
+            outstanding -= 1
+    writer.write(b'{"type":"leave"}\n')
+    writer.close()
+    return done
+
+
+async def bench_one(impl: str, port: int, connections: int, duration: float, window: int) -> dict:
+    # the pipelined start_level flood is the point here, so per-client rate limits are off
+    proc = start_server_process(impl, port, ("--no-rate-limits",))
+    try:
+        t0 = time.perf_counter()
+        idle = await open_idle(port, connections)
+        connect_s = time.perf_counter() - t0
+        await asyncio.sleep(0.5)
+        status = proc_status(proc.pid)
+        done = await drive_throughput(port, duration, window)
+        for _, w in idle:
+            w.close()
+        return {
+            "impl": impl,
+            "connections_held": len(idle),
+            "connect_seconds": round(connect_s, 3),
+            "server_threads": status["threads"],
+            "server_rss_kb": status["rss_kb"],
+            "msgs_per_sec": round(done / duration, 1),
+        }
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--impl", choices=["threaded", "asyncio", "both"], default="both")
+    ap.add_argument("--connections", type=int, default=2000)
+    ap.add_argument("--duration", type=float, default=5.0)
+    ap.add_argument("--window", type=int, default=16, help="pipelined start_level requests in flight")
+    ap.add_argument("--port", type=int, default=6100)
+    ap.add_argument("--json", action="store_true", help="print results as JSON")
+    args = ap.parse_args()
+
+    raise_fd_limit(args.connections + 256)
+    impls = ["threaded", "asyncio"] if args.impl == "both" else [args.impl]
+    results = []
+    for i, impl in enumerate(impls):
+        results.append(asyncio.run(bench_one(impl, args.port + i, args.connections, args.duration, args.window)))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'impl':<10}{'held':>8}{'threads':>9}{'rss_kb':>10}{'connect_s':>11}{'msgs/s':>10}")
+    for r in results:
+        print(f"{r['impl']:<10}{r['connections_held']:>8}{str(r['server_threads']):>9}{str(r['server_rss_kb']):>10}"
+              f"{r['connect_seconds']:>11}{r['msgs_per_sec']:>10}")
+
+
+if __name__ == "__main__":
+    main()
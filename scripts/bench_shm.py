@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+State handoff benchmark: shared-memory rings vs a pickling multiprocessing.Queue.
+
+A producer process steps N headless rooms (3 players, random inputs) and hands
+each room's state to the parent process after every tick, either
+
+  pickle -- queue.put(sim.snapshot()) on a multiprocessing.Queue, the usual way
+            of moving Python objects between processes, or
+  shm    -- StateRing.write(sim) into one shared-memory ring per room
+            (dungeon_game/state_ring.py), which the parent poll()s.
+
+The parent plays the network gateway: it takes every state off the channel
+and, with --encode, turns it into a JSON keyframe line (for shm straight from
+the ring, StateRing.poll(keyframes=True)). Reported per room
+tick: producer CPU spent on the handoff (process CPU minus the simulation
+step, so a Queue's feeder thread is included), gateway CPU to receive (and
+encode), and wall time for the whole run. The shm producer waits when a ring
+is nearly full, so both channels deliver every tick.
+
+Run from the repo root:
+  PYTHONPATH=src python scripts/bench_shm.py --rooms 20 --ticks 400 --level 10 --encode
+"""
+import argparse
+import json
+import multiprocessing
+import pickle
+import random
+import time
+
+from dungeon_game.protocol import encode_message
+from dungeon_game.simulation import ArenaSimulation
+from dungeon_game.state_ring import StateRing, SLOT_HEADER, PLAYER, MOB, PROJECTILE
+
+METHODS = ("pickle", "shm")
+
+
+def make_sims(rooms: int, level: int):
+    return [ArenaSimulation(level, {"p1": "warrior", "p2": "archer", "p3": "sorcerer"}, seed=i)
+            for i in range(rooms)]
+
+
+def step_all(sims, rng: random.Random, dt: float):
+    for sim in sims:
+        for cid in sim.players:
+            sim.apply_input(cid, {"dx": rng.choice((-1, 0, 1)), "dy": rng.choice((-1, 0, 1)),
+                                  "melee": rng.random() < 0.1,
+                                  "fire": [rng.uniform(0, 900), rng.uniform(0, 700)] if rng.random() < 0.2 else None})
+        sim.step(dt)
+
+
+def ring_bytes(sim) -> int:
+    return (SLOT_HEADER.size + sum(1 + len(cid.encode("utf-8")) for cid in sim.players)
+            + len(sim.players) * PLAYER.size + len(sim.mobs) * MOB.size + len(sim.projectiles) * PROJECTILE.size)
+
+
+def producer(method: str, rooms: int, ticks: int, level: int, dt: float, channel, results):
+    sims = make_sims(rooms, level)
+    rng = random.Random(7)
+    rings = [StateRing.attach(name) for name in channel] if method == "shm" else None
+    step_cpu = 0.0
+    payload = 0
+    cpu0 = time.process_time()
+    for _ in range(ticks):
+        s0 = time.thread_time()
+        step_all(sims, rng, dt)
+        step_cpu += time.thread_time() - s0
+        if method == "pickle":
+            for i, sim in enumerate(sims):
+                channel.put((i, sim.snapshot()))
+        else:
+            for ring, sim in zip(rings, sims):
+                while ring.backlog() >= ring.slots - 1:
+                    time.sleep(0.0002)
+                ring.write(sim)
+        # sample the payload size outside the timed work
+        s0 = time.thread_time()
+        sim = sims[0]
+        payload += len(pickle.dumps(sim.snapshot(), pickle.HIGHEST_PROTOCOL)) if method == "pickle" else ring_bytes(sim)
+        step_cpu += time.thread_time() - s0
+    if method == "pickle":
+        channel.close()
+        # the feeder thread pickles in the background; count it
+        channel.join_thread()
+    else:
+        for ring in rings:
+            ring.close()
+    results.put({"handoff_cpu": time.process_time() - cpu0 - step_cpu, "payload": payload / ticks})
+
+
+def run(method: str, args) -> dict:
+    dt = 1.0 / args.tick_rate
+    expected = args.rooms * args.ticks
+    results = multiprocessing.Queue()
+    rings = []
+    if method == "pickle":
+        channel = multiprocessing.Queue()
+    else:
+        rings = [StateRing.create(slots=args.slots) for _ in range(args.rooms)]
+        channel = [r.name for r in rings]
+    proc = multiprocessing.Process(target=producer, args=(method, args.rooms, args.ticks, args.level, dt,
+                                                          channel, results))
+    received = 0
+    encoded = 0
+    t0 = time.perf_counter()
+    cpu0 = time.process_time()
+    proc.start()
+    if method == "pickle":
+        while received < expected:
+            _, snap = channel.get(timeout=30)
+            received += 1
+            if args.encode:
+                encoded += len(encode_message(dict(snap, keyframe=True)))
+    else:
+        while any(r.next < args.ticks for r in rings):
+            got = False
+            for r in rings:
+                # with --encode the gateway formats keyframe lines straight from the ring
+                for item in r.poll(keyframes=args.encode):
+                    got = True
+                    received += 1
+                    if args.encode:
+                        encoded += len(item)
+            if not got:
+                if not proc.is_alive() and all(r.published() == r.next for r in rings):
+                    break
+                time.sleep(0.0002)
+    gateway_cpu = time.process_time() - cpu0
+    wall = time.perf_counter() - t0
+    stats = results.get()
+    proc.join()
+    skipped = sum(r.skipped for r in rings)
+    for r in rings:
+        r.close()
+    return {
+        "method": method,
+        "room_ticks": received,
+        "skipped": skipped,
+        "payload_bytes": round(stats["payload"]),
+        "handoff_us": round(stats["handoff_cpu"] / expected * 1e6, 2),
+        "gateway_us": round(gateway_cpu / expected * 1e6, 2),
+        "wall_s": round(wall, 3),
+        "encoded_bytes": round(encoded / received) if received and args.encode else None,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rooms", type=int, default=20)
+    ap.add_argument("--ticks", type=int, default=400)
+    ap.add_argument("--level", type=int, default=10)
+    ap.add_argument("--tick-rate", type=int, default=20)
+    ap.add_argument("--slots", type=int, default=64, help="ring slots per room")
+    ap.add_argument("--encode", action="store_true", help="gateway encodes every state as a JSON keyframe")
+    ap.add_argument("--method", choices=METHODS + ("both",), default="both")
+    ap.add_argument("--json", action="store_true", help="print results as JSON")
+    args = ap.parse_args()
+
+    methods = METHODS if args.method == "both" else (args.method,)
+    results = [run(m, args) for m in methods]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'method':<8} {'room_ticks':>10} {'skipped':>7} {'payload_B':>9} {'handoff_us':>10} "
+          f"{'gateway_us':>10} {'wall_s':>7}")
+    for r in results:
+        print(f"{r['method']:<8} {r['room_ticks']:>10} {r['skipped']:>7} {r['payload_bytes']:>9} "
+              f"{r['handoff_us']:>10} {r['gateway_us']:>10} {r['wall_s']:>7}")
+    if len(results) == 2 and results[1]["handoff_us"] and results[1]["gateway_us"]:
+        pk, shm = results
+        print(f"pickle/shm cost: producer handoff {pk['handoff_us'] / shm['handoff_us']:.2f}x, "
+              f"gateway {pk['gateway_us'] / shm['gateway_us']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Tick-budget benchmark for the authoritative arena simulation.
+
+Steps many headless rooms (3 players each, random inputs) back to back and
+reports the average cost of one room tick -- simulation step plus snapshot
+encoding -- and how many such rooms one core can run at the given tick rate.
+It also streams every room through snapshots.SnapshotStream with clients that
+ack each tick, and compares bytes per tick against sending full snapshots.
+
+Run from the repo root:
+  PYTHONPATH=src python scripts/bench_simulation.py --rooms 50 --ticks 400 --tick-rate 20
+"""
+import argparse
+import json
+import random
+import time
+
+from dungeon_game.protocol import encode_message
+from dungeon_game.simulation import ArenaSimulation
+from dungeon_game.snapshots import SnapshotStream
+
+
+class AckingClient:
+    """Stub recipient that acknowledges every tick as soon as it is sent."""
+    def __init__(self, cid: str, stream: SnapshotStream):
+        self.cid = cid
+        self.stream = stream
+        self.tick = None
+
+    def send_frame(self, frame: bytes):
+        if self.tick is not None:
+            self.stream.ack(self.cid, self.tick)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rooms", type=int, default=50)
+    ap.add_argument("--ticks", type=int, default=400)
+    ap.add_argument("--tick-rate", type=int, default=20)
+    ap.add_argument("--level", type=int, default=10)
+    ap.add_argument("--json", action="store_true", help="print results as JSON")
+    args = ap.parse_args()
+
+    rng = random.Random(7)
+    dt = 1.0 / args.tick_rate
+    sims = [ArenaSimulation(args.level, {"p1": "warrior", "p2": "archer", "p3": "sorcerer"}, seed=i)
+            for i in range(args.rooms)]
+    streams = [SnapshotStream() for _ in sims]
+    clients = [{cid: AckingClient(cid, st) for cid in ("p1", "p2", "p3")} for st in streams]
+    room_ticks = 0
+    snapshot_bytes = 0
+    full_encode = 0.0
+    t0 = time.perf_counter()
+    for _ in range(args.ticks):
+        for sim, stream, recipients in zip(sims, streams, clients):
+            if sim.result:
+                continue
+            for cid in sim.players:
+                sim.apply_input(cid, {"dx": rng.choice((-1, 0, 1)), "dy": rng.choice((-1, 0, 1)),
+                                      "melee": rng.random() < 0.1,
+                                      "fire": [rng.uniform(0, 900), rng.uniform(0, 700)] if rng.random() < 0.2 else None})
+            sim.step(dt)
+            snap = sim.snapshot()
+            te = time.perf_counter()
+            snapshot_bytes += len(encode_message(snap)) * len(recipients)
+            full_encode += time.perf_counter() - te
+            for c in recipients.values():
+                c.tick = snap["tick"]
+            stream.publish(snap, recipients)
+            room_ticks += 1
+    elapsed = time.perf_counter() - t0
+    delta_bytes = sum(st.bytes_sent for st in streams)
+    delta_encode = sum(st.encode_time for st in streams)
+    # the full-snapshot encode and the delta stream both ran inside the timed loop; count only one
+    elapsed -= full_encode
+
+    per_tick = elapsed / room_ticks if room_ticks else 0.0
+    result = {
+        "rooms": args.rooms,
+        "tick_rate": args.tick_rate,
+        "room_ticks": room_ticks,
+        "avg_room_tick_ms": round(per_tick * 1000, 4),
+        "budget_used_per_room": round(per_tick / dt, 5),
+        "rooms_per_core": int(dt / per_tick) if per_tick else None,
+        "full_bytes_per_tick": round(snapshot_bytes / room_ticks) if room_ticks else 0,
+        "delta_bytes_per_tick": round(delta_bytes / room_ticks) if room_ticks else 0,
+        "full_encode_ms_per_tick": round(full_encode / room_ticks * 1000, 4) if room_ticks else 0,
+        "delta_encode_ms_per_tick": round(delta_encode / room_ticks * 1000, 4) if room_ticks else 0,
+    }
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    for k, v in result.items():
+        print(f"{k:>22}: {v}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Snapshots over the UDP channel (udp_channel.py) vs. TCP only, under loss.
+
+For each --loss a fresh server (--udp, simulation at --tick-rate) is started
+with a netem proxy in front of it (--profile with that loss both ways, UDP
+relayed too). In the same room, at the same time:
+  ref    one client connected straight to the server: when each tick was sent
+  tcp    --clients clients through the proxy, snapshots over TCP
+  udp    --clients clients through the proxy that ask for the UDP channel
+All of them ack every snapshot; ref restarts the level when it ends.
+
+Reported per loss and mode, over that mode's clients:
+  state ms     for every tick ref received, how long after ref the client held
+               that state or a newer one (p50 / p90 / p99 / p99.9 / max). Over
+               TCP a lost segment stalls every snapshot behind it for a
+               retransmission timeout; over UDP the next tick replaces it.
+  got %        ticks the client received itself (UDP loses some for good)
+  udp %        of those, how many came as datagrams (keyframes over
+               udp_channel.MAX_PAYLOAD go over TCP)
+  stale        datagrams dropped on arrival, older than one already received
+  undec        deltas whose baseline the client didn't have
+
+Run from the repo root:
+  PYTHONPATH=src:scripts python scripts/bench_udp.py --loss 0 0.01 0.05 --seconds 20
+  PYTHONPATH=src:scripts python scripts/bench_udp.py --profile mobile --loss 0.02 --codec binary
+"""
+import argparse
+import bisect
+import json
+import random
+import time
+
+from bench_server import start_server_process
+from loadtest import percentiles
+from dungeon_game.netem import LinkProfile, PROFILES, start_proxy
+from dungeon_game.network import GameClient
+from dungeon_game.protocol import JSON_CODEC, CODECS
+from dungeon_game.rooms import MAX_PLAYERS
+from dungeon_game.snapshots import SnapshotReceiver
+
+MODES = ("tcp", "udp")
+# a tick this far below the newest one means a new level started (interpolation.RESYNC_TICKS does the same)
+RESTART_TICKS = 20
+# ticks ref received this close to the end aren't measured: the others may not have had the time
+TAIL_SECONDS = 2.0
+
+
+class BotClient:
+    """One GameClient that acks every snapshot and records (time, level, tick) as they arrive."""
+    def __init__(self, name: str, port: int, args, udp: bool = False):
+        self.name = name
+        self.receiver = SnapshotReceiver()
+        self.arrivals = []
+        self.newest = -1
+        self.level = 0
+        self.undecodable = 0
+        self.level_over = False
+        self.last_snapshot = time.perf_counter()
+        self.client = GameClient("127.0.0.1", port, on_message=self.on_message, codec=args.codec, udp=udp,
+                                 reconnect=True, backoff_initial=0.1, backoff_max=1.0, max_attempts=100)
+
+    def on_message(self, msg):
+        mtype = msg.get("type")
+        if mtype in ("state", "delta"):
+            now = time.perf_counter()
+            tick = msg.get("tick", 0)
+            if tick < self.newest - RESTART_TICKS:
+                self.level += 1
+                self.newest = -1
+                # a new simulation: the old ticks are no baselines
+                self.receiver = SnapshotReceiver()
+            state = self.receiver.receive(msg)
+            if state is None:
+                self.undecodable += 1
+                return
+            self.newest = max(self.newest, tick)
+            self.arrivals.append((now, self.level, tick))
+            self.last_snapshot = now
+            self.client.send({"type": "ack", "tick": tick})
+        elif mtype == "level_result":
+            self.level_over = True
+
+
+def state_delays(ref: BotClient, bot: BotClient, until: float):
+    """Per tick ref got before until: seconds until bot held that (level, tick) or newer; None if it never did."""
+    times, newest = [], []
+    best = (-1, -1)
+    for t, level, tick in bot.arrivals:
+        best = max(best, (level, tick))
+        times.append(t)
+        newest.append(best)
+    own = {(level, tick) for _, level, tick in bot.arrivals}
+    delays, got = [], 0
+    for t, level, tick in ref.arrivals:
+        if t > until:
+            break
+        key = (level, tick)
+        got += key in own
+        i = bisect.bisect_left(newest, key)
+        delays.append(max(0.0, times[i] - t) if i < len(times) else None)
+    return delays, got
+
+
+def run(loss: float, args, port: int) -> list:
+    profile = LinkProfile.named(args.profile, loss=loss)
+    extra = ["--tick-rate", str(args.tick_rate), "--udp"]
+    if args.impl == "sharded":
+        extra += ["--workers", "2"]
+    server = start_server_process("asyncio" if args.impl == "asyncio" else "threaded", port, extra)
+    proxy = start_proxy("127.0.0.1", port, profile, seed=args.seed, udp=True)
+    rng = random.Random(args.seed)
+    ref = BotClient("ref", port, args)
+    bots = {mode: [BotClient(f"{mode}{i}", proxy.port, args, udp=mode == "udp") for i in range(args.clients)]
+            for mode in MODES}
+    everyone = [ref] + [b for mode in MODES for b in bots[mode]]
+    try:
+        for bot in everyone:
+            bot.client.connect()
+            bot.client.send({"type": "join", "client_id": bot.name})
+        time.sleep(0.5 + 4 * profile.latency)
+        ref.client.send({"type": "start_level", "level": args.level})
+        step = 1.0 / args.tick_rate
+        start = time.perf_counter()
+        ref.last_snapshot = start
+        while time.perf_counter() - start < args.seconds:
+            for bot in everyone:
+                bot.client.send({"type": "input", "dx": rng.choice((-1, 0, 1)), "dy": rng.choice((-1, 0, 1))})
+            now = time.perf_counter()
+            if ref.level_over or now - ref.last_snapshot > 1.0:
+                ref.level_over = False
+                ref.last_snapshot = now
+                ref.client.send({"type": "start_level", "level": args.level})
+            time.sleep(step)
+        end = time.perf_counter()
+        # let what is still on the link arrive
+        time.sleep(TAIL_SECONDS)
+        proxy_stats = proxy.stats()
+        udp_stats = {bot.name: bot.client.udp_stats() for bot in everyone}
+    finally:
+        for bot in everyone:
+            bot.client.close()
+        proxy.close()
+        server.kill()
+        server.wait()
+
+    results = []
+    for mode in MODES:
+        delays, got, total, missing, arrived, via_udp, stale = [], 0, 0, 0, 0, 0, 0
+        for bot in bots[mode]:
+            d, g = state_delays(ref, bot, end - TAIL_SECONDS)
+            delays += [x * 1000 for x in d if x is not None]
+            missing += sum(1 for x in d if x is None)
+            got += g
+            total += len(d)
+            arrived += len(bot.arrivals)
+            udp = udp_stats[bot.name]
+            if udp is not None:
+                via_udp += udp["delivered"]
+                stale += udp["stale"]
+        pct = percentiles(delays)
+        results.append({
+            "loss": loss, "mode": mode, "link": profile.describe(),
+            "ticks": total, "state_ms_p50": pct.get("p50"), "state_ms_p90": pct.get("p90"),
+            "state_ms_p99": pct.get("p99"), "state_ms_p999": pct.get("p999"), "state_ms_max": pct.get("max"),
+            "never": missing,
+            "got_pct": round(got / total * 100, 1) if total else None,
+            "udp_pct": round(via_udp / arrived * 100, 1) if arrived and mode == "udp" else None,
+            "stale": stale, "undecodable": sum(b.undecodable for b in bots[mode]),
+            "proxy": proxy_stats,
+        })
+    return results
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--loss", type=float, nargs="+", default=[0.0, 0.01, 0.05], help="loss rate per direction")
+    ap.add_argument("--profile", choices=list(PROFILES), default="wifi", help="the rest of the link")
+    ap.add_argument("--impl", choices=["threaded", "asyncio", "sharded"], default="asyncio")
+    ap.add_argument("--clients", type=int, default=1, help="clients per mode (ref + 2 x N share one room)")
+    ap.add_argument("--seconds", type=float, default=20.0, help="play time per loss rate")
+    ap.add_argument("--tick-rate", type=int, default=20)
+    ap.add_argument("--level", type=int, default=3)
+    ap.add_argument("--codec", choices=CODECS, default=JSON_CODEC)
+    ap.add_argument("--port", type=int, default=6890, help="first server port; one per loss rate")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--json", action="store_true", help="print results as JSON")
+    args = ap.parse_args()
+    if 1 + 2 * args.clients > MAX_PLAYERS:
+        ap.error(f"--clients: a room holds {MAX_PLAYERS} players (ref + N tcp + N udp)")
+
+    results = [r for i, loss in enumerate(args.loss) for r in run(loss, args, args.port + i)]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'loss':>6} {'mode':<4} {'ticks':>5} {'p50_ms':>7} {'p90_ms':>7} {'p99_ms':>7} {'p999_ms':>7} "
+          f"{'max_ms':>7} {'got%':>6} {'udp%':>6} {'stale':>5} {'undec':>5}")
+    for r in results:
+        print(f"{r['loss']:>6} {r['mode']:<4} {r['ticks']:>5} {r['state_ms_p50']!s:>7} {r['state_ms_p90']!s:>7} "
+              f"{r['state_ms_p99']!s:>7} {r['state_ms_p999']!s:>7} {r['state_ms_max']!s:>7} {r['got_pct']!s:>6} "
+              f"{r['udp_pct']!s:>6} {r['stale']:>5} {r['undecodable']:>5}")
+
+
+if __name__ == "__main__":
+    main()
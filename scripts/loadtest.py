@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+Load generator: thousands of scripted bot clients from one asyncio process.
+
+Each bot repeats a session cycle against a local server until the run ends:
+connect, create_room + join a shared room (--room-size bots per room), the
+room leader sends start_level, every bot sends random input at --input-rate
+for --session seconds (acking snapshots when the server runs a simulation),
+then leave. Bots start spread over --ramp seconds so the accept backlog isn't
+the first thing measured.
+
+Recorded: connection setup time, request -> reply latency percentiles per
+message type (create_room, join, start_level), messages and bytes per second
+in each direction, errors / timeouts, and -- when this script started the
+server -- its CPU use, RSS and thread count. Results are printed and, with
+--out, written as JSON so runs against different server implementations can
+be compared.
+
+Run from the repo root:
+  PYTHONPATH=src python scripts/loadtest.py --impl threaded asyncio sharded --bots 1000 --duration 20
+  PYTHONPATH=src python scripts/loadtest.py --attach --port 6000 --bots 500   # server already running
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+from bench_server import start_server_process, raise_fd_limit, proc_status
+from dungeon_game.protocol import FrameDecoder, encode_frame, JSON_CODEC, CODECS
+
+# replies that complete each timed request
+REPLIES = {
+    "create_room": ("room_created",),
+    "join": ("joined",),
+    "start_level": ("level_started",),
+}
+
+
+def percentiles(samples: List[float]) -> Dict:
+    if not samples:
+        return {"count": 0}
+    s = sorted(samples)
+    n = len(s)
+
+    def pick(q: float) -> float:
+        return round(s[min(n - 1, int(q * n))], 3)
+    return {"count": n, "mean": round(sum(s) / n, 3), "p50": pick(0.50), "p90": pick(0.90),
+            "p99": pick(0.99), "p999": pick(0.999), "max": round(s[-1], 3)}
+
+
+def _tree_pids(pid: int) -> List[int]:
+    """pid and its descendants (room worker processes of the sharded server)."""
+    children = defaultdict(list)
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as fh:
+                ppid = int(fh.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children[ppid].append(int(entry))
+    out = [pid]
+    i = 0
+    while i < len(out):
+        out.extend(children.get(out[i], ()))
+        i += 1
+    return out
+
+
+def tree_cpu_seconds(pid: int) -> Optional[float]:
+    total = 0.0
+    try:
+        ticks = os.sysconf("SC_CLK_TCK")
+        for p in _tree_pids(pid):
+            try:
+                with open(f"/proc/{p}/stat") as fh:
+                    fields = fh.read().rsplit(")", 1)[1].split()
+                total += (int(fields[11]) + int(fields[12])) / ticks
+            except (OSError, IndexError, ValueError):
+                pass
+    except (OSError, ValueError):
+        return None
+    return total
+
+
+class LoadStats:
+    def __init__(self):
+        self.connect_ms: List[float] = []
+        self.latency_ms: Dict[str, List[float]] = defaultdict(list)
+        self.sent = 0
+        self.received = 0
+        self.bytes_out = 0
+        self.bytes_in = 0
+        self.received_types: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.timeouts: Counter = Counter()
+        self.connect_failures = 0
+        self.cycles = 0
+        self.retries = 0
+
+
+class Bot:
+    def __init__(self, idx: int, args, stats: LoadStats, deadline: float):
+        self.idx = idx
+        self.args = args
+        self.stats = stats
+        self.deadline = deadline
+        self.rng = random.Random(idx)
+        self.room = f"load-{idx // args.room_size}"
+        self.leader = idx % args.room_size == 0
+        self.client_id = f"bot-{idx}"
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.codec = JSON_CODEC
+        self.waiting = None  # (reply types, future)
+        self.seq = 0
+        self.last_ack = -1
+
+    def send(self, msg: Dict):
+        if self.writer.is_closing():
+            return
+        frame = encode_frame(msg, self.codec)
+        self.writer.write(frame)
+        self.stats.sent += 1
+        self.stats.bytes_out += len(frame)
+
+    async def request(self, msg: Dict) -> Optional[Dict]:
+        mtype = msg["type"]
+        fut = asyncio.get_running_loop().create_future()
+        self.waiting = (REPLIES[mtype], fut)
+        t0 = time.perf_counter()
+        self.send(msg)
+        try:
+            reply = await asyncio.wait_for(fut, self.args.timeout)
+        except asyncio.TimeoutError:
+            self.stats.timeouts[mtype] += 1
+            return None
+        finally:
+            self.waiting = None
+        if reply.get("type") == "error":
+            if reply.get("message") not in ("room_exists", "no_such_room"):
+                self.stats.errors[f"{mtype}:{reply.get('message')}"] += 1
+        else:
+            self.stats.latency_ms[mtype].append((time.perf_counter() - t0) * 1000)
+        return reply
+
+    async def read_loop(self, reader: asyncio.StreamReader):
+        decoder = FrameDecoder()
+        stats = self.stats
+        while True:
+            try:
+                data = await reader.read(65536)
+            except ConnectionError:
+                break
+            if not data:
+                break
+            stats.bytes_in += len(data)
+            for msg in decoder.feed(data):
+                mtype = msg.get("type")
+                stats.received += 1
+                stats.received_types[mtype] += 1
+                if mtype == "joined" and msg.get("codec") in CODECS:
+                    self.codec = msg["codec"]
+                if self.waiting is not None and (mtype in self.waiting[0] or mtype == "error"):
+                    if not self.waiting[1].done():
+                        self.waiting[1].set_result(msg)
+                elif mtype == "ping":
+                    self.send({"type": "pong", "t": msg.get("t")})
+                elif mtype in ("state", "delta") and self.args.ack:
+                    tick = msg.get("tick", -1)
+                    if tick > self.last_ack:
+                        self.last_ack = tick
+                        self.send({"type": "ack", "tick": tick})
+
+    async def cycle(self):
+        t0 = time.perf_counter()
+        try:
+            reader, self.writer = await asyncio.wait_for(
+                asyncio.open_connection(self.args.host, self.args.port), self.args.timeout)
+        except (OSError, asyncio.TimeoutError):
+            self.stats.connect_failures += 1
+            await asyncio.sleep(0.5)
+            return
+        self.stats.connect_ms.append((time.perf_counter() - t0) * 1000)
+        self.codec = JSON_CODEC
+        self.last_ack = -1
+        read_task = asyncio.ensure_future(self.read_loop(reader))
+        try:
+            join = {"type": "join", "client_id": self.client_id, "room": self.room}
+            if self.args.codec != JSON_CODEC:
+                join["codec"] = self.args.codec
+            for attempt in range(3):
+                await self.request({"type": "create_room", "room": self.room})
+                reply = await self.request(join)
+                # the room can be retired between room_exists and our join; create it again
+                if reply is None or reply.get("message") != "no_such_room":
+                    break
+                self.stats.retries += 1
+            if reply is None or reply.get("type") != "joined":
+                return
+            if self.leader:
+                await self.request({"type": "start_level", "level": self.rng.randint(1, self.args.max_level),
+                                    "seed": self.rng.randrange(1 << 30)})
+            end = min(self.deadline, time.perf_counter() + self.args.session)
+            interval = 1.0 / self.args.input_rate if self.args.input_rate > 0 else None
+            while interval is not None and time.perf_counter() < end and not read_task.done():
+                self.seq += 1
+                msg = {"type": "input", "dx": self.rng.choice((-1, 0, 1)), "dy": self.rng.choice((-1, 0, 1)),
+                       "seq": self.seq}
+                if self.rng.random() < 0.2:
+                    msg["fire"] = [self.rng.randint(0, 900), self.rng.randint(0, 700)]
+                self.send(msg)
+                await asyncio.sleep(interval * self.rng.uniform(0.5, 1.5))
+            if interval is None:
+                await asyncio.sleep(max(0.0, end - time.perf_counter()))
+            self.send({"type": "leave"})
+            self.stats.cycles += 1
+            # the server closes the connection after leave
+            await asyncio.wait_for(read_task, self.args.timeout)
+        except (ConnectionError, asyncio.TimeoutError):
+            pass
+        finally:
+            read_task.cancel()
+            self.writer.close()
+
+    async def run(self, start_delay: float):
+        await asyncio.sleep(start_delay)
+        while time.perf_counter() < self.deadline:
+            await self.cycle()
+
+
+async def run_load(args) -> Dict:
+    stats = LoadStats()
+    t0 = time.perf_counter()
+    deadline = t0 + args.duration
+    bots = [Bot(i, args, stats, deadline) for i in range(args.bots)]
+    await asyncio.gather(*(b.run(args.ramp * i / max(1, args.bots)) for i, b in enumerate(bots)))
+    elapsed = time.perf_counter() - t0
+    return {
+        "bots": args.bots,
+        "room_size": args.room_size,
+        "codec": args.codec,
+        "elapsed_s": round(elapsed, 3),
+        "cycles": stats.cycles,
+        "connect_ms": percentiles(stats.connect_ms),
+        "connect_failures": stats.connect_failures,
+        "latency_ms": {k: percentiles(v) for k, v in sorted(stats.latency_ms.items())},
+        "sent_per_s": round(stats.sent / elapsed, 1),
+        "received_per_s": round(stats.received / elapsed, 1),
+        "bytes_out_per_s": round(stats.bytes_out / elapsed, 1),
+        "bytes_in_per_s": round(stats.bytes_in / elapsed, 1),
+        "received_types": dict(stats.received_types),
+        "errors": dict(stats.errors),
+        "join_retries": stats.retries,
+        "timeouts": dict(stats.timeouts),
+    }
+
+
+def bench(impl: str, args, port: int) -> Dict:
+    args.port = port
+    proc = None
+    if not args.attach:
+        extra = []
+        if impl == "sharded":
+            extra += ["--workers", str(args.workers)]
+        if args.tick_rate:
+            extra += ["--tick-rate", str(args.tick_rate)]
+        proc = start_server_process(impl, port, extra)
+    try:
+        cpu0 = tree_cpu_seconds(proc.pid) if proc else None
+        result = asyncio.run(run_load(args))
+        result = {"impl": impl, "tick_rate": args.tick_rate, **result}
+        if proc is not None:
+            cpu1 = tree_cpu_seconds(proc.pid)
+            status = proc_status(proc.pid)
+            result["server"] = {
+                "cpu_percent": round((cpu1 - cpu0) / result["elapsed_s"] * 100, 1) if cpu0 is not None else None,
+                "rss_kb": status["rss_kb"],
+                "threads": status["threads"],
+            }
+        return result
+    finally:
+        if proc is not None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+
+def print_summary(r: Dict):
+    print(f"== {r['impl']}: {r['bots']} bots, {r['cycles']} sessions in {r['elapsed_s']}s "
+          f"(codec {r['codec']}, tick rate {r['tick_rate']})")
+    c = r["connect_ms"]
+    print(f"  connect ms        p50 {c.get('p50')}  p99 {c.get('p99')}  max {c.get('max')}  "
+          f"failures {r['connect_failures']}")
+    for mtype, p in r["latency_ms"].items():
+        print(f"  {mtype:<17} p50 {p['p50']}  p90 {p['p90']}  p99 {p['p99']}  max {p['max']}  (n={p['count']})")
+    print(f"  msgs/s            out {r['sent_per_s']}  in {r['received_per_s']}")
+    print(f"  bytes/s           out {r['bytes_out_per_s']}  in {r['bytes_in_per_s']}")
+    if "server" in r:
+        s = r["server"]
+        print(f"  server            cpu {s['cpu_percent']}%  rss_kb {s['rss_kb']}  threads {s['threads']}")
+    if r["errors"] or r["timeouts"]:
+        print(f"  errors {r['errors']}  timeouts {r['timeouts']}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--impl", nargs="+", choices=["threaded", "asyncio", "sharded"], default=["asyncio"])
+    ap.add_argument("--attach", action="store_true", help="use the server already listening on --host/--port")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=6400)
+    ap.add_argument("--workers", type=int, default=2, help="room workers for --impl sharded")
+    ap.add_argument("--tick-rate", type=int, default=0, help="run the server with an authoritative simulation")
+    ap.add_argument("--bots", type=int, default=500)
+    ap.add_argument("--room-size", type=int, default=3)
+    ap.add_argument("--duration", type=float, default=10.0)
+    ap.add_argument("--ramp", type=float, default=2.0, help="seconds over which bots start")
+    ap.add_argument("--session", type=float, default=3.0, help="seconds per join -> leave cycle")
+    ap.add_argument("--input-rate", type=float, default=10.0, help="input messages per bot per second")
+    ap.add_argument("--max-level", type=int, default=10)
+    ap.add_argument("--codec", choices=CODECS, default=JSON_CODEC)
+    ap.add_argument("--no-ack", dest="ack", action="store_false", help="don't ack state snapshots")
+    ap.add_argument("--timeout", type=float, default=10.0)
+    ap.add_argument("--out", help="write results as JSON to this file")
+    ap.add_argument("--json", action="store_true", help="print results as JSON")
+    args = ap.parse_args()
+
+    raise_fd_limit(args.bots * 2 + 256)
+    impls = ["external"] if args.attach else args.impl
+    base_port = args.port
+    results = [bench(impl, args, base_port if args.attach else base_port + i) for i, impl in enumerate(impls)]
+    if args.out:
+        with open(args.out, "w") as fh:
+            json.dump(results, fh, indent=2)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for r in results:
+        print_summary(r)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Load test for the process-sharded server: throughput vs worker count.
+
+For each worker count this starts `main server --workers N`, then several load
+processes each open many clients. Every client joins its own room and keeps
+one start_level in flight with a fresh seed per request, so each request costs
+the worker a real Level.spawn_mobs + serialization (cache misses on purpose).
+Reported throughput is level_started replies per second across all clients;
+it should scale close to linearly with workers until cores run out.
+
+Run from the repo root:
+  PYTHONPATH=src python scripts/loadtest_sharded.py --workers 1 2 4 --clients 200
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+
+from bench_server import start_server_process, raise_fd_limit
+
+
+async def run_clients(port: int, proc_idx: int, clients: int, duration: float, level: int) -> int:
+    async def one(i: int) -> int:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        room = f"lt-{proc_idx}-{i}"
+        writer.write(json.dumps({"type": "create_room", "room": room}).encode() + b"\n")
+        writer.write(json.dumps({"type": "join", "client_id": f"c{i}", "room": room}).encode() + b"\n")
+        seed = (proc_idx << 32) | (i << 16)
+        done = 0
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            seed += 1
+            writer.write(json.dumps({"type": "start_level", "level": level, "seed": seed}).encode() + b"\n")
+            while True:
+                line = await reader.readline()
+                if not line or b'"error"' in line:
+                    return done
+                if b'"level_started"' in line:
+                    done += 1
+                    break
+        writer.close()
+        return done
+    return sum(await asyncio.gather(*(one(i) for i in range(clients))))
+
+
+def load_process(port: int, proc_idx: int, clients: int, duration: float, level: int, out):
+    out.put(asyncio.run(run_clients(port, proc_idx, clients, duration, level)))
+
+
+def bench(workers: int, port: int, procs: int, clients: int, duration: float, level: int) -> dict:
+    # clients keep start_level in flight back to back on purpose; don't rate-limit them
+    server = start_server_process("sharded", port, ("--workers", str(workers), "--no-rate-limits"))
+    try:
+        out = multiprocessing.Queue()
+        per_proc = max(1, clients // procs)
+        loaders = [multiprocessing.Process(target=load_process, args=(port, p, per_proc, duration, level, out))
+                   for p in range(procs)]
+        for p in loaders:
+            p.start()
+        total = sum(out.get() for _ in loaders)
+        for p in loaders:
+            p.join()
+        return {"workers": workers, "clients": per_proc * procs, "msgs_per_sec": round(total / duration, 1)}
+    finally:
+        server.terminate()
+        server.wait(timeout=5)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    ap.add_argument("--clients", type=int, default=200)
+    ap.add_argument("--load-procs", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    ap.add_argument("--duration", type=float, default=5.0)
+    ap.add_argument("--level", type=int, default=30, help="higher levels spawn more mobs per request")
+    ap.add_argument("--port", type=int, default=6300)
+    ap.add_argument("--json", action="store_true", help="print results as JSON")
+    args = ap.parse_args()
+
+    raise_fd_limit(args.clients + 256)
+    results = [bench(w, args.port + i, args.load_procs, args.clients, args.duration, args.level)
+               for i, w in enumerate(args.workers)]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    base = results[0]["msgs_per_sec"] / results[0]["workers"] if results[0]["msgs_per_sec"] else 0
+    print(f"{'workers':>8}{'clients':>9}{'msgs/s':>11}{'scaling':>9}")
+    for r in results:
+        scaling = r["msgs_per_sec"] / (base * r["workers"]) if base else 0
+        print(f"{r['workers']:>8}{r['clients']:>9}{r['msgs_per_sec']:>11}{scaling:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,11 +9,12 @@ from dungeon_game.network import GameClient
 
 def main():
     if len(sys.argv) < 2:
-        print("Usage: python scripts/multiplayer_client.py <client_name> [host] [port]")
+        print("Usage: python scripts/multiplayer_client.py <client_name> [host] [port] [room]")
         return
     name = sys.argv[1]
     host = sys.argv[2] if len(sys.argv) >= 3 else "localhost"
     port = int(sys.argv[3]) if len(sys.argv) >= 4 else 6000
+    room = sys.argv[4] if len(sys.argv) >= 5 else None
 
     def on_message(msg):
         print("[server]", msg)
@@ -27,18 +28,31 @@ def main():
         return
 
     # join lobby
-    client.send({"type": "join", "client_id": name})
+    join = {"type": "join", "client_id": name}
+    if room:
+        join["room"] = room
+    client.send(join)
     print("Sent join message, waiting for lobby updates...")
 
     try:
         while True:
-            cmd = input("Enter command (start <level> / leave / quit): ").strip()
+            cmd = input("Enter command (start <level> / rooms / create [room] / join <room> / leave / quit): ").strip()
             if cmd == "quit":
                 break
             if cmd.startswith("start"):
                 parts = cmd.split()
                 level = int(parts[1]) if len(parts) > 1 else 1
                 client.send({"type": "start_level", "level": level})
+            elif cmd == "rooms":
+                client.send({"type": "list_rooms"})
+            elif cmd.startswith("create"):
+                parts = cmd.split()
+                msg = {"type": "create_room"}
+                if len(parts) > 1:
+                    msg["room"] = parts[1]
+                client.send(msg)
+            elif cmd.startswith("join") and len(cmd.split()) > 1:
+                client.send({"type": "join", "client_id": name, "room": cmd.split()[1]})
             elif cmd == "leave":
                 client.send({"type": "leave"})
                 break
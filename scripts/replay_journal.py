@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Replay journaled level runs headlessly and check they come out the same.
+
+A server started with --journal DIR (and --tick-rate) writes one journal per
+simulated level run (see dungeon_game/journal.py). This re-runs each one from
+its seed and recorded inputs as fast as the CPU allows, compares the state
+digest at every checkpoint and the final result, and reports replay speed.
+--snapshots also drives the delta snapshot stream with the recorded acks, so
+the workload matches what the server did per tick; --repeat N replays each
+journal N times and keeps the fastest run, for benchmarking.
+
+Exits non-zero if any journal diverges from its recording.
+
+Run from the repo root:
+  PYTHONPATH=src python scripts/replay_journal.py journals/*.journal --snapshots --repeat 5
+"""
+import argparse
+import json
+import sys
+
+from dungeon_game.journal import replay
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("journals", nargs="+")
+    ap.add_argument("--snapshots", action="store_true", help="also encode the per-client snapshot stream")
+    ap.add_argument("--repeat", type=int, default=1, help="replays per journal; the fastest is reported")
+    ap.add_argument("--json", action="store_true", help="print results as JSON")
+    args = ap.parse_args()
+
+    results = []
+    for path in args.journals:
+        runs = [replay(path, snapshots=args.snapshots) for _ in range(max(1, args.repeat))]
+        best = min(runs, key=lambda r: r["elapsed_s"])
+        # a replay is deterministic, so every run must agree with the recording
+        best["match"] = all(r["match"] for r in runs)
+        results.append(best)
+    ok = all(r["match"] for r in results)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for r in results:
+            for k, v in r.items():
+                print(f"{k:>24}: {v}")
+            print()
+        total_ticks = sum(r["ticks"] for r in results)
+        total_time = sum(r["elapsed_s"] for r in results)
+        print(f"{'journals':>24}: {len(results)}")
+        print(f"{'all_match':>24}: {ok}")
+        if total_time > 0:
+            print(f"{'ticks_per_s':>24}: {round(total_ticks / total_time)}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+"""
+asyncio counterpart of network.GameClient.
+
+One AsyncGameClient is a connection plus a reader task on the running event
+loop, so a bot or load test can hold hundreds of them in one process without
+a thread apiece. Requests carry a per-connection request id ("rid") that the
+server echoes in its direct reply or error (server.reply_fields), which lets
+callers await the answer to each one:
+
+    client = AsyncGameClient("localhost", 6000)
+    await client.connect()
+    await client.join("alice", room="r1")          # -> the "joined" message
+    started = await client.start_level(2)          # -> the "level_started" broadcast
+    rtt = await client.ping()
+
+A request fails with RequestError when the server answers with an error (or
+rate limits that message type) and with asyncio.TimeoutError when nothing
+comes back in time. start_level has no direct reply -- the room hears about a
+level through the level_started broadcast -- so it resolves on the next one of
+those instead. Everything else the server sends (lobby updates, snapshots,
+...) goes to on_message and to wait_for(); heartbeat pings are answered here.
+ping() samples go into self.latency (see latency.py).
+"""
+import asyncio
+import itertools
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .protocol import FrameDecoder, encode_frame, JSON_CODEC, CODECS
+from .latency import LatencyEstimator, pong_for
+from .compression import ZLIB
+from .level import MAX_LEVEL
+
+DEFAULT_REQUEST_TIMEOUT = 5.0
+READ_SIZE = 64 * 1024
+
+
+class RequestError(Exception):
+    """The server answered a request with an error message (kept in .reply)."""
+    def __init__(self, reply: Dict):
+        super().__init__(reply.get("message", "error"))
+        self.reply = reply
+
+
+class AsyncGameClient:
+    def __init__(self, host: str = "localhost", port: int = 6000, on_message: Optional[Callable] = None,
+                 codec: str = JSON_CODEC, timeout: float = DEFAULT_REQUEST_TIMEOUT, compress: bool = False):
+        if codec not in CODECS:
+            raise ValueError(f"unknown codec {codec!r}")
+        self.host = host
+        self.port = port
+        self.on_message = on_message
+        self.timeout = timeout
+        self.requested_codec = codec
+        # what we send with; switched by "joined" like GameClient
+        self.codec = JSON_CODEC
+        # ask for zlib-compressed large frames at join (compression.py)
+        self.compress = compress
+        self._decoder: Optional[FrameDecoder] = None
+        self.client_id: Optional[str] = None
+        self.room: Optional[str] = None
+        self.resume_token: Optional[str] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._rids = itertools.count(1)
+        # rid -> (request type, future)
+        self._pending: Dict[int, Tuple[str, asyncio.Future]] = {}
+        # (message type, predicate, future) for wait_for and broadcast-answered requests
+        self._waiters: List[Tuple[str, Optional[Callable], asyncio.Future]] = []
+        self.closed = asyncio.Event()
+        self.latency = LatencyEstimator()
+
+    async def connect(self, timeout: float = 5.0):
+        reader, self.writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), timeout)
+        self.closed.clear()
+        self._reader_task = asyncio.ensure_future(self._read_loop(reader))
+
+    async def close(self):
+        writer, self.writer = self.writer, None
+        if writer is not None:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+        if self._reader_task is not None:
+            try:
+                await asyncio.wait_for(self._reader_task, 2.0)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                self._reader_task.cancel()
+            except Exception:
+                pass
+
+    # ------------------------------------------------------------------ sending
+
+    def send(self, payload: Dict):
+        """Fire and forget (inputs, acks); the frame is buffered on the transport."""
+        if payload.get("type") == "join":
+            if self.requested_codec != JSON_CODEC:
+                payload = dict(payload, codec=self.requested_codec)
+            if self.compress:
+                payload = dict(payload, compress=ZLIB)
+        if self.writer is None:
+            raise ConnectionError("not connected")
+        self.writer.write(encode_frame(payload, self.codec))
+
+    async def drain(self):
+        if self.writer is not None:
+            await self.writer.drain()
+
+    async def request(self, payload: Dict, timeout: Optional[float] = None,
+                      answered_by: Optional[str] = None, match: Optional[Callable] = None) -> Dict:
+        """
+        Send payload with a fresh request id and return the reply carrying it.
+        With answered_by, the next message of that type (passing match, if given)
+        counts as the reply too, for requests the server answers by broadcast.
+        """
+        rid = next(self._rids)
+        fut = asyncio.get_running_loop().create_future()
+        self._pending[rid] = (payload.get("type"), fut)
+        waiter = None
+        if answered_by is not None:
+            waiter = (answered_by, match, fut)
+            self._waiters.append(waiter)
+        try:
+            self.send(dict(payload, rid=rid))
+            return await asyncio.wait_for(fut, self.timeout if timeout is None else timeout)
+        finally:
+            self._pending.pop(rid, None)
+            if waiter is not None and waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    async def wait_for(self, mtype: str, match: Optional[Callable] = None, timeout: Optional[float] = None) -> Dict:
+        """The next message of type mtype (for which match(msg) is true, if given)."""
+        fut = asyncio.get_running_loop().create_future()
+        waiter = (mtype, match, fut)
+        self._waiters.append(waiter)
+        try:
+            return await asyncio.wait_for(fut, self.timeout if timeout is None else timeout)
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    # ------------------------------------------------------------------ requests
+
+    async def join(self, client_id: str, room: Optional[str] = None, player_class: str = "warrior",
+                   timeout: Optional[float] = None) -> Dict:
+        msg = {"type": "join", "client_id": client_id, "class": player_class}
+        if room is not None:
+            msg["room"] = room
+        return await self.request(msg, timeout)
+
+    async def create_room(self, room: Optional[str] = None, max_players: Optional[int] = None,
+                          timeout: Optional[float] = None) -> Dict:
+        msg = {"type": "create_room"}
+        if room is not None:
+            msg["room"] = room
+        if max_players is not None:
+            msg["max_players"] = max_players
+        return await self.request(msg, timeout)
+
+    async def list_rooms(self, offset: int = 0, limit: int = 100, timeout: Optional[float] = None) -> Dict:
+        return await self.request({"type": "list_rooms", "offset": offset, "limit": limit}, timeout)
+
+    async def start_level(self, level: int, seed: Optional[int] = None, timeout: Optional[float] = None) -> Dict:
+        msg = {"type": "start_level", "level": level}
+        if seed is not None:
+            msg["seed"] = seed
+        # the broadcast carries no rid, so match it on the level the server will actually start
+        expected = min(max(level, 1), MAX_LEVEL) if isinstance(level, int) else level
+        return await self.request(msg, timeout, answered_by="level_started",
+                                  match=lambda m: m.get("level") == expected)
+
+    async def stats(self, timeout: Optional[float] = None) -> Dict:
+        return await self.request({"type": "stats"}, timeout)
+
+    async def ping(self, timeout: Optional[float] = None) -> float:
+        """Round trip to the server in seconds; also a sample for self.latency."""
+        t0 = time.perf_counter()
+        reply = await self.request(self.latency.ping(), timeout)
+        rtt = time.perf_counter() - t0
+        self.latency.observe_pong(reply)
+        return rtt
+
+    async def leave(self):
+        """Leave the room; the server closes the connection afterwards."""
+        self.resume_token = None
+        self.send({"type": "leave"})
+        await self.drain()
+
+    def compression_stats(self) -> Optional[Dict]:
+        """Ratio and decompression CPU time so far; None before the first compressed frame."""
+        decoder = self._decoder
+        if decoder is None or decoder.decompressor is None:
+            return None
+        return decoder.decompressor.stats()
+
+    # ------------------------------------------------------------------ receiving
+
+    async def _read_loop(self, reader: asyncio.StreamReader):
+        decoder = self._decoder = FrameDecoder()
+        try:
+            while True:
+                data = await reader.read(READ_SIZE)
+                if not data:
+                    break
+                for msg in decoder.feed(data):
+                    self._dispatch(msg)
+        except Exception:
+            pass
+        finally:
+            self.writer = None
+            self._fail_all(ConnectionError("connection closed"))
+            self.closed.set()
+
+    def _dispatch(self, msg: Dict):
+        mtype = msg.get("type")
+        if mtype == "ping":
+            try:
+                self.send(pong_for(msg))
+            except ConnectionError:
+                pass
+            return
+        if mtype in ("joined", "resumed"):
+            if msg.get("codec") in CODECS:
+                self.codec = msg["codec"]
+            self.client_id = msg.get("client_id")
+            self.room = msg.get("room")
+            self.resume_token = msg.get("resume")
+        rid = msg.get("rid")
+        if rid is not None:
+            pending = self._pending.get(rid)
+            if pending is not None:
+                _resolve(pending[1], msg)
+        elif mtype == "error" and msg.get("message") == "rate_limited":
+            # rejected before the server read the rid; fail the oldest request of that type
+            for req_type, fut in self._pending.values():
+                if req_type == msg.get("for") and not fut.done():
+                    fut.set_exception(RequestError(msg))
+                    break
+        for waiter in list(self._waiters):
+            wtype, match, fut = waiter
+            if wtype == mtype and not fut.done():
+                try:
+                    ok = match is None or match(msg)
+                except Exception:
+                    ok = False
+                if ok:
+                    fut.set_result(msg)
+        if self.on_message:
+            try:
+                self.on_message(msg)
+            except Exception:
+                pass
+
+    def _fail_all(self, exc: Exception):
+        for _, fut in self._pending.values():
+            if not fut.done():
+                fut.set_exception(exc)
+        for _, _, fut in self._waiters:
+            if not fut.done():
+                fut.set_exception(exc)
+
+
+def _resolve(fut: asyncio.Future, reply: Dict):
+    if fut.done():
+        return
+    if reply.get("type") == "error":
+        fut.set_exception(RequestError(reply))
+    else:
+        fut.set_result(reply)
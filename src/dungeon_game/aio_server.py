@@ -0,0 +1,185 @@
+"""
+asyncio variant of the multiplayer server.
+
+Speaks the same newline-delimited JSON protocol as server.py and reuses its
+rooms / handle_message rules, but every client is a coroutine on a single
+event loop instead of an OS thread, so thousands of idle connections cost a few
+KB each rather than a thread stack apiece.
+"""
+import asyncio
+import time
+from typing import Dict, Optional
+
+from .server import handle_message, handle_connection_lost, handle_datagram, reject_oversize
+from .rooms import LobbyState, RoomManager, MAX_PLAYERS
+from .protocol import encode_frame, decode_frame, read_frame_async, FrameTooLarge, JSON_CODEC, MAX_CLIENT_FRAME
+from .outbound import AsyncOutboundQueue, DEFAULT_QUEUE_SIZE, DROP_OLDEST, OVERFLOW_POLICIES
+from .metrics import ServerMetrics, serve_stats_http
+from .heartbeat import Reaper, DEFAULT_PING_INTERVAL, DEFAULT_IDLE_TIMEOUT, DEFAULT_READ_TIMEOUT
+from .sessions import DEFAULT_RESUME_GRACE
+from .ratelimit import RateLimiter, DEFAULT_RATE_LIMITS
+from .latency import LatencyEstimator
+from .udp_channel import UdpChannel
+
+# StreamReader limit for internal pipes that only read length-prefixed records;
+# client readers are created with limit=max_frame so an endless line is refused there
+MAX_LINE = 64 * 1024
+
+
+class AsyncConnection:
+    """Per-client state; duck-types the parts of RequestHandler that handle_message uses."""
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                 queue_size: int = DEFAULT_QUEUE_SIZE, overflow_policy: str = DROP_OLDEST,
+                 metrics: Optional[ServerMetrics] = None, rate_limits: Optional[Dict] = None):
+        self.reader = reader
+        self.writer = writer
+        self.metrics = metrics
+        self.client_id: Optional[str] = None
+        self.room: Optional[LobbyState] = None
+        self.outbound = AsyncOutboundQueue(queue_size, overflow_policy)
+        self.codec = JSON_CODEC
+        # heartbeat state, see heartbeat.Reaper
+        self.last_seen = time.monotonic()
+        self.frame_started = 0.0
+        self.ping_sent = 0.0
+        self.latency = LatencyEstimator()
+        # set by a join asking for compression; used by write_loop only
+        self.compressor = None
+        # udp_channel.UdpPeer once a join asked for the UDP channel
+        self.udp = None
+        self.reaped = None
+        self.session = None
+        self.limiter = RateLimiter(rate_limits) if rate_limits else None
+
+    def frame_started_now(self):
+        self.frame_started = time.monotonic()
+
+    def frame_done(self):
+        self.last_seen = self.frame_started
+        self.frame_started = 0.0
+
+    def send_message(self, msg: Dict):
+        self.send_frame(encode_frame(msg, self.codec))
+
+    def send_frame(self, frame: bytes):
+        if not self.outbound.put(frame) and self.outbound.overflowed:
+            self.drop_connection()
+
+    def send_state_frame(self, frame: bytes):
+        """A snapshot: over the UDP channel if this client has one up, else like any other frame."""
+        udp = self.udp
+        if udp is None or not udp.send_state(frame):
+            self.send_frame(frame)
+
+    async def write_loop(self):
+        try:
+            while True:
+                batch = await self.outbound.wait_batch()
+                if batch is None:
+                    break
+                if self.compressor is not None:
+                    batch = [self.compressor.compress(frame) for frame in batch]
+                data = b"".join(batch)
+                self.writer.write(data)
+                if self.metrics is not None:
+                    self.metrics.frames_sent(len(batch), len(data))
+                # only this task waits on a slow peer; broadcasters never do
+                await self.writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            self.outbound.close()
+
+    def drop_connection(self):
+        # discard buffered data and fail the pending readline in handle_client
+        self.writer.transport.abort()
+
+
+async def handle_client(rooms: RoomManager, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                        queue_size: int = DEFAULT_QUEUE_SIZE, overflow_policy: str = DROP_OLDEST,
+                        max_frame: int = MAX_CLIENT_FRAME, rate_limits: Optional[Dict] = DEFAULT_RATE_LIMITS):
+    metrics = rooms.metrics
+    conn = AsyncConnection(reader, writer, queue_size, overflow_policy, metrics, rate_limits)
+    metrics.connection_opened(conn)
+    writer_task = asyncio.ensure_future(conn.write_loop())
+    try:
+        while True:
+            try:
+                raw = await read_frame_async(reader, conn.frame_started_now, max_frame)
+            except FrameTooLarge:
+                reject_oversize(conn, max_frame)
+                break
+            except (ValueError, asyncio.LimitOverrunError, ConnectionError):
+                break
+            if not raw:
+                break
+            conn.frame_done()
+            msg = None
+            if conn.limiter is not None:
+                admitted, msg = conn.limiter.admit_frame(conn, raw, conn.last_seen)
+                if not admitted:
+                    metrics.frame_in(len(raw))
+                    continue
+            if msg is None:
+                msg = decode_frame(raw)
+            metrics.frame_in(len(raw), msg is not None)
+            if msg is None:
+                continue
+            if not handle_message(rooms, conn, msg):
+                break
+    finally:
+        handle_connection_lost(rooms, conn)
+        metrics.connection_closed(conn)
+        conn.outbound.close()
+        try:
+            await asyncio.wait_for(writer_task, timeout=2.0)
+        except (asyncio.TimeoutError, Exception):
+            writer_task.cancel()
+        try:
+            writer.close()
+            await writer.wait_closed()
+        except Exception:
+            pass
+
+
+async def serve(host: str = "0.0.0.0", port: int = 6000, rooms: Optional[RoomManager] = None, backlog: int = 1024,
+                queue_size: int = DEFAULT_QUEUE_SIZE, overflow_policy: str = DROP_OLDEST,
+                tick_rate: int = 0, ping_interval: float = DEFAULT_PING_INTERVAL,
+                idle_timeout: float = DEFAULT_IDLE_TIMEOUT,
+                read_timeout: float = DEFAULT_READ_TIMEOUT, max_frame: int = MAX_CLIENT_FRAME,
+                rate_limits: Optional[Dict] = DEFAULT_RATE_LIMITS, udp: bool = False) -> asyncio.AbstractServer:
+    if overflow_policy not in OVERFLOW_POLICIES:
+        raise ValueError(f"unknown overflow policy {overflow_policy!r}")
+    rooms = rooms if rooms is not None else RoomManager(tick_rate=tick_rate)
+    rooms.metrics.loop = asyncio.get_running_loop()
+    server = await asyncio.start_server(
+        lambda r, w: handle_client(rooms, r, w, queue_size, overflow_policy, max_frame, rate_limits),
+        host, port, limit=max_frame, backlog=backlog)
+    reaper = Reaper(rooms.metrics, ping_interval, idle_timeout, read_timeout)
+    # the task lives as long as the loop; keep a reference so it isn't garbage collected
+    server.reaper_task = asyncio.ensure_future(reaper.run())
+    if udp:
+        rooms.udp = UdpChannel(host, server.sockets[0].getsockname()[1],
+                               lambda conn, frame: handle_datagram(rooms, conn, frame))
+        rooms.udp.attach(asyncio.get_running_loop())
+    return server
+
+
+def run_async_server(host: str = "0.0.0.0", port: int = 6000, tick_rate: int = 0, stats_port: int = 0,
+                     ping_interval: float = DEFAULT_PING_INTERVAL, idle_timeout: float = DEFAULT_IDLE_TIMEOUT,
+                     read_timeout: float = DEFAULT_READ_TIMEOUT, resume_grace: float = DEFAULT_RESUME_GRACE,
+                     max_frame: int = MAX_CLIENT_FRAME, rate_limits: Optional[Dict] = DEFAULT_RATE_LIMITS,
+                     journal_dir: Optional[str] = None, udp: bool = False):
+    """Blocking entry point used by `python -m dungeon_game.main server --asyncio`."""
+    rooms = RoomManager(tick_rate=tick_rate, resume_grace=resume_grace, journal_dir=journal_dir)
+
+    async def _main():
+        server = await serve(host, port, rooms=rooms, ping_interval=ping_interval, idle_timeout=idle_timeout,
+                             read_timeout=read_timeout, max_frame=max_frame, rate_limits=rate_limits, udp=udp)
+        if stats_port:
+            serve_stats_http(lambda: rooms.metrics.snapshot(rooms), stats_port)
+        print(f"Async multiplayer server started on {host}:{port} (max players per room {MAX_PLAYERS})")
+        async with server:
+            await server.serve_forever()
+    try:
+        asyncio.run(_main())
+    except KeyboardInterrupt:
+        print("Server exiting.")
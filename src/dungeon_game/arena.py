@@ -3,7 +3,10 @@ import math
 import random
 import time
 from typing import List, Tuple, Optional
-import pygame
+try:
+    import pygame
+except ImportError:  # headless use, e.g. the server-side simulation
+    pygame = None
 from pathlib import Path
 
 from .level import Level
@@ -14,13 +17,13 @@ Vec2 = Tuple[float, float]
 
 ASSET_DIR = Path(__file__).resolve().parent / "assets" / "images"
 
-def load_image(name: str, size: Tuple[int,int]=None) -> Optional[pygame.Surface]:
+def load_image(name: str, size: Tuple[int,int]=None) -> Optional["pygame.Surface"]:
     """
     Load an image from the package assets/images folder. Returns a pygame.Surface or None.
     This is a small helper so other modules (gui.py) can import a single loader.
     """
     p = ASSET_DIR / name
-    if not p.exists():
+    if pygame is None or not p.exists():
         return None
     try:
         img = pygame.image.load(str(p))
@@ -42,14 +45,15 @@ def vec_norm(v: Vec2) -> Vec2:
 
 
 class Projectile:
-    def __init__(self, x: float, y: float, vx: float, vy: float, damage: int, life: float = 2.0, image: Optional[pygame.Surface] = None):
+    def __init__(self, x: float, y: float, vx: float, vy: float, damage: int, life: float = 2.0, image: Optional["pygame.Surface"] = None, spawn: Optional[float] = None):
         self.x = x
         self.y = y
         self.vx = vx
         self.vy = vy
         self.damage = damage
         self.life = life  # seconds
-        self.spawn = time.time()
+        # spawn/now default to wall-clock time; the server simulation passes its own tick clock
+        self.spawn = time.time() if spawn is None else spawn
         # if an image is supplied, keep it and set radius from image size; otherwise use default small radius
         self.image = image
         if self.image:
@@ -62,12 +66,13 @@ class Projectile:
         self.x += self.vx * dt
         self.y += self.vy * dt
 
-    def is_expired(self) -> bool:
-        return (time.time() - self.spawn) > self.life
+    def is_expired(self, now: Optional[float] = None) -> bool:
+        now = time.time() if now is None else now
+        return (now - self.spawn) > self.life
 
 
 class ArenaMob:
-    def __init__(self, mob: Mob, x: float, y: float, image: Optional[pygame.Surface] = None):
+    def __init__(self, mob: Mob, x: float, y: float, image: Optional["pygame.Surface"] = None):
         self.mob = mob
         self.x = x
         self.y = y
@@ -136,8 +141,8 @@ class ArenaPlayer:
         self.x = max(self.radius, min(bounds[0] - self.radius, self.x + nd[0] * self.speed * dt))
         self.y = max(self.radius, min(bounds[1] - self.radius, self.y + nd[1] * self.speed * dt))
 
-    def melee_attack(self, mobs: List[ArenaMob]) -> List[Tuple[ArenaMob, int]]:
-        now = time.time()
+    def melee_attack(self, mobs: List[ArenaMob], now: Optional[float] = None) -> List[Tuple[ArenaMob, int]]:
+        now = time.time() if now is None else now
         if now < self.melee_cooldown_until:
             return []
         self.melee_cooldown_until = now + self.melee_cooldown
@@ -156,11 +161,11 @@ class ArenaPlayer:
                 hits.append((m, damage))
         return hits
 
-    def ranged_attack(self, target_pos: Tuple[int, int], image: Optional[pygame.Surface] = None) -> Optional[Projectile]:
+    def ranged_attack(self, target_pos: Tuple[int, int], image: Optional["pygame.Surface"] = None, now: Optional[float] = None) -> Optional[Projectile]:
         """
         Fire a projectile toward target_pos. If image is provided it will be attached to the Projectile.
         """
-        now = time.time()
+        now = time.time() if now is None else now
         if now - self.last_ranged < self.ranged_cooldown:
             return None
         self.last_ranged = now
@@ -171,7 +176,7 @@ class ArenaPlayer:
         vx = nd[0] * speed
         vy = nd[1] * speed
         dmg = max(1, self.player.attack // 2)
-        return Projectile(self.x + nd[0] * (self.radius + 4), self.y + nd[1] * (self.radius + 4), vx, vy, dmg, life=2.0, image=image)
+        return Projectile(self.x + nd[0] * (self.radius + 4), self.y + nd[1] * (self.radius + 4), vx, vy, dmg, life=2.0, image=image, spawn=now)
 
     def take_damage(self, amount: int):
         """
@@ -0,0 +1,493 @@
+"""
+Compact binary codec, negotiated per connection at join
+({"type":"join",...,"codec":"binary"}; see protocol.encode_frame).
+
+A frame is MAGIC, the body length as a varint, then the body. The body starts
+with a one-byte message type. The hot messages have fixed layouts:
+
+  state         varint tick/wave/waves_total/coins, flags, then per entity kind
+                a varint count and entity records
+  delta         varint tick/base, presence masks for scalars, kinds and
+                spawn/update/despawn sections, counts and entity records
+  input         presence flags, dx/dy in hundredths (int8), fire x/y in
+                tenths (int16), varint seq
+  ack           varint tick
+  lobby_update  room and client ids as length-prefixed UTF-8
+
+An entity list is a count, a mask byte (string or numeric ids, and which of
+x/y/hp/seq are present), the ids -- numeric ones as one uint16 (or uint32) block
+-- then all fields as one little-endian int16 block: x/y in tenths, hp and a
+player's last input seq as is. Lists whose records carry different fields
+(delta updates) add one field mask byte per record.
+
+Every other message -- or a hot message holding a key or value its layout
+can't represent exactly -- goes out as T_JSON, the compact JSON text in a
+binary frame, so encoding never loses information.
+
+MAGIC is not valid as the first byte of a JSON line, so a reader can tell the
+two framings apart one frame at a time.
+"""
+import itertools
+import json
+import struct
+from typing import Dict, Optional, Tuple
+
+MAGIC = 0xB5
+MAGIC_BYTE = bytes((MAGIC,))
+
+# message types
+T_JSON = 0
+T_STATE = 1
+T_DELTA = 2
+T_INPUT = 3
+T_ACK = 4
+T_LOBBY_UPDATE = 5
+
+# entity field mask
+F_X = 0x01
+F_Y = 0x02
+F_HP = 0x04
+F_SEQ = 0x08
+FIELD_BITS = F_X | F_Y | F_HP | F_SEQ
+# entity list mask: ids are strings / every record carries its own field mask / numeric ids are uint32
+L_STR_ID = 0x80
+L_MIXED = 0x40
+L_WIDE_ID = 0x20
+# (key, mask bit, scale) in wire order
+_ENTITY_FIELDS = (("x", F_X, 10), ("y", F_Y, 10), ("hp", F_HP, 1), ("seq", F_SEQ, 1))
+# field mask -> ((key, scale), ...) in wire order
+_MASK_FIELDS = {m: tuple((k, scale) for k, bit, scale in _ENTITY_FIELDS if m & bit) for m in range(FIELD_BITS + 1)}
+
+
+def _key_orders():
+    """Every key order an entity record can have -> its field mask (one dict lookup validates and masks)."""
+    orders = {}
+    for m, fields in _MASK_FIELDS.items():
+        keys = ("id",) + tuple(k for k, _ in fields)
+        for perm in itertools.permutations(keys):
+            orders[perm] = m
+    return orders
+
+
+_KEY_MASKS = _key_orders()
+# counts come off the wire too, so only blocks up to this many values are cached
+_BLOCK_CACHE_MAX = 256
+_BLOCKS: Dict[Tuple[int, str], struct.Struct] = {}
+
+
+def _block(n: int, code: str) -> struct.Struct:
+    """Struct for n little-endian values of one format code; cached for the usual (small) n."""
+    st = _BLOCKS.get((n, code))
+    if st is None:
+        st = struct.Struct("<%d%s" % (n, code))
+        if n <= _BLOCK_CACHE_MAX:
+            _BLOCKS[(n, code)] = st
+    return st
+
+
+# same order as snapshots.ENTITY_KINDS / SCALAR_FIELDS
+_KINDS = ("players", "mobs", "projectiles")
+_SCALARS = ("wave", "waves_total", "coins")
+_SECTIONS = ("spawn", "update", "despawn")
+
+_STATE_KEYS = frozenset(("type", "tick", "wave", "waves_total", "coins", "keyframe") + _KINDS)
+_DELTA_KEYS = frozenset(("type", "tick", "base") + _SCALARS + _KINDS)
+_INPUT_KEYS = frozenset(("type", "dx", "dy", "melee", "fire", "seq"))
+_LOBBY_KEYS = frozenset(("type", "room", "clients"))
+
+_INPUT_DX = 0x01
+_INPUT_DY = 0x02
+_INPUT_MELEE = 0x04
+_INPUT_MELEE_ON = 0x08
+_INPUT_FIRE = 0x10
+_INPUT_SEQ = 0x20
+_INT8 = struct.Struct("<b")
+_FIRE = struct.Struct("<hh")
+
+# longest varint accepted for a frame length (2**35)
+MAX_HEADER = 6
+
+
+class Unencodable(ValueError):
+    """Raised by a fixed-layout encoder for a message it can't represent exactly."""
+
+
+# ---------------------------------------------------------------- primitives
+
+def _put_varint(out: bytearray, n: int):
+    if type(n) is not int or n < 0:
+        raise Unencodable(f"not a varint: {n!r}")
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _get_varint(buf, pos: int) -> Tuple[int, int]:
+    result = 0
+    shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        result |= (b & 0x7F) << shift
+        if b < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _put_str(out: bytearray, s: str):
+    if type(s) is not str:
+        raise Unencodable(f"not a string: {s!r}")
+    data = s.encode("utf-8")
+    _put_varint(out, len(data))
+    out += data
+
+
+def _get_str(buf, pos: int) -> Tuple[str, int]:
+    n, pos = _get_varint(buf, pos)
+    end = pos + n
+    if end > len(buf):
+        raise ValueError("truncated string")
+    return bytes(buf[pos:end]).decode("utf-8"), end
+
+
+def _fixed(v, scale: int) -> int:
+    """v as an integer count of 1/scale units; raises unless that round-trips exactly."""
+    if scale == 1:
+        if type(v) is not int:
+            raise Unencodable(f"not an int: {v!r}")
+        return v
+    q = round(v * scale)
+    if q / scale != v:
+        raise Unencodable(f"{v!r} has more precision than 1/{scale}")
+    return q
+
+
+def _put_entities(out: bytearray, recs):
+    """
+    varint count, list mask, ids (uint16/uint32 block, or strings), per-record
+    field masks (only if they differ), then all fields as one int16 block.
+    """
+    n = len(recs)
+    _put_varint(out, n)
+    if not n:
+        return
+    try:
+        masks = [_KEY_MASKS[tuple(rec)] for rec in recs]
+    except KeyError:
+        raise Unencodable("entity has fields outside the record layout")
+    first = masks[0]
+    mixed = any(m != first for m in masks)
+    ids = [rec["id"] for rec in recs]
+    lmask = L_MIXED if mixed else first
+    if type(ids[0]) is str:
+        out.append(lmask | L_STR_ID)
+        for eid in ids:
+            _put_str(out, eid)
+    else:
+        if any(type(eid) is not int for eid in ids):
+            raise Unencodable("entity ids must all be ints or all be strings")
+        wide = max(ids) > 0xFFFF
+        out.append(lmask | (L_WIDE_ID if wide else 0))
+        out += _block(n, "I" if wide else "H").pack(*ids)
+    if mixed:
+        out += bytes(masks)
+    vals = []
+    for rec, m in zip(recs, masks):
+        for key, scale in _MASK_FIELDS[m]:
+            vals.append(_fixed(rec[key], scale))
+    if vals:
+        try:
+            out += _block(len(vals), "h").pack(*vals)
+        except struct.error:
+            # e.g. a seq past 32767; the message goes out as JSON instead
+            raise Unencodable("entity field outside the int16 range")
+
+
+def _get_entities(buf, pos: int) -> Tuple[list, int]:
+    n, pos = _get_varint(buf, pos)
+    if not n:
+        return [], pos
+    lmask = buf[pos]
+    pos += 1
+    if lmask & L_STR_ID:
+        ids = []
+        for _ in range(n):
+            eid, pos = _get_str(buf, pos)
+            ids.append(eid)
+    else:
+        st = _block(n, "I" if lmask & L_WIDE_ID else "H")
+        ids = st.unpack_from(buf, pos)
+        pos += st.size
+    if not lmask & L_MIXED:
+        # every record has the same fields: rebuild them column by column
+        fields = _MASK_FIELDS[lmask & FIELD_BITS]
+        k = len(fields)
+        vals = _block(n * k, "h").unpack_from(buf, pos) if k else ()
+        pos += 2 * n * k
+        keys = ("id",) + tuple(key for key, _ in fields)
+        cols = [[v / scale for v in vals[j::k]] if scale != 1 else vals[j::k]
+                for j, (_, scale) in enumerate(fields)]
+        return [dict(zip(keys, row)) for row in zip(ids, *cols)], pos
+    masks = bytes(buf[pos:pos + n])
+    pos += n
+    if masks and max(masks) > FIELD_BITS:
+        raise ValueError("unknown entity field in mask")
+    count = sum(len(_MASK_FIELDS[m]) for m in masks)
+    vals = _block(count, "h").unpack_from(buf, pos) if count else ()
+    pos += 2 * count
+    recs = []
+    i = 0
+    for eid, m in zip(ids, masks):
+        rec = {"id": eid}
+        for key, scale in _MASK_FIELDS[m]:
+            v = vals[i]
+            rec[key] = v / scale if scale != 1 else v
+            i += 1
+        recs.append(rec)
+    return recs, pos
+
+
+def _check_keys(msg: Dict, allowed: frozenset):
+    if not allowed.issuperset(msg):
+        raise Unencodable("message has keys outside the layout")
+
+
+# ------------------------------------------------------------------ messages
+
+def _encode_state(out: bytearray, msg: Dict):
+    _check_keys(msg, _STATE_KEYS)
+    _put_varint(out, msg["tick"])
+    for key in _SCALARS:
+        _put_varint(out, msg[key])
+    keyframe = msg.get("keyframe")
+    if keyframe not in (None, True):
+        raise Unencodable("keyframe flag must be true when present")
+    out.append(1 if keyframe else 0)
+    for kind in _KINDS:
+        _put_entities(out, msg[kind])
+
+
+def _decode_state(buf, pos: int) -> Dict:
+    msg = {"type": "state"}
+    msg["tick"], pos = _get_varint(buf, pos)
+    for key in _SCALARS:
+        msg[key], pos = _get_varint(buf, pos)
+    flags = buf[pos]
+    pos += 1
+    for kind in _KINDS:
+        msg[kind], pos = _get_entities(buf, pos)
+    if flags & 1:
+        msg["keyframe"] = True
+    return msg
+
+
+def _encode_delta(out: bytearray, msg: Dict):
+    _check_keys(msg, _DELTA_KEYS)
+    _put_varint(out, msg["tick"])
+    _put_varint(out, msg["base"])
+    scalars = [key for key in _SCALARS if key in msg]
+    kinds = [kind for kind in _KINDS if kind in msg]
+    out.append(sum(1 << i for i, key in enumerate(_SCALARS) if key in msg))
+    for key in scalars:
+        _put_varint(out, msg[key])
+    out.append(sum(1 << i for i, kind in enumerate(_KINDS) if kind in msg))
+    for kind in kinds:
+        section = msg[kind]
+        if not set(_SECTIONS).issuperset(section):
+            raise Unencodable("unknown delta section")
+        out.append(sum(1 << i for i, name in enumerate(_SECTIONS) if name in section))
+        if "spawn" in section:
+            _put_entities(out, section["spawn"])
+        if "update" in section:
+            _put_entities(out, section["update"])
+        if "despawn" in section:
+            # bare id records
+            _put_entities(out, [{"id": eid} for eid in section["despawn"]])
+
+
+def _decode_delta(buf, pos: int) -> Dict:
+    msg = {"type": "delta"}
+    msg["tick"], pos = _get_varint(buf, pos)
+    msg["base"], pos = _get_varint(buf, pos)
+    mask = buf[pos]
+    pos += 1
+    for i, key in enumerate(_SCALARS):
+        if mask & (1 << i):
+            msg[key], pos = _get_varint(buf, pos)
+    kinds = buf[pos]
+    pos += 1
+    for i, kind in enumerate(_KINDS):
+        if not kinds & (1 << i):
+            continue
+        present = buf[pos]
+        pos += 1
+        section = {}
+        for j, name in enumerate(_SECTIONS):
+            if present & (1 << j):
+                recs, pos = _get_entities(buf, pos)
+                section[name] = [r["id"] for r in recs] if name == "despawn" else recs
+        msg[kind] = section
+    return msg
+
+
+def _encode_input(out: bytearray, msg: Dict):
+    _check_keys(msg, _INPUT_KEYS)
+    flags = 0
+    tail = bytearray()
+    if "dx" in msg:
+        flags |= _INPUT_DX
+        tail += _INT8.pack(_fixed(msg["dx"], 100))
+    if "dy" in msg:
+        flags |= _INPUT_DY
+        tail += _INT8.pack(_fixed(msg["dy"], 100))
+    if "melee" in msg:
+        melee = msg["melee"]
+        if type(melee) is not bool:
+            raise Unencodable("melee must be a bool")
+        flags |= _INPUT_MELEE | (_INPUT_MELEE_ON if melee else 0)
+    if "fire" in msg:
+        fx, fy = msg["fire"]
+        flags |= _INPUT_FIRE
+        tail += _FIRE.pack(_fixed(fx, 10), _fixed(fy, 10))
+    if "seq" in msg:
+        flags |= _INPUT_SEQ
+        _put_varint(tail, msg["seq"])
+    out.append(flags)
+    out += tail
+
+
+def _decode_input(buf, pos: int) -> Dict:
+    msg = {"type": "input"}
+    flags = buf[pos]
+    pos += 1
+    if flags & _INPUT_DX:
+        msg["dx"] = _INT8.unpack_from(buf, pos)[0] / 100
+        pos += 1
+    if flags & _INPUT_DY:
+        msg["dy"] = _INT8.unpack_from(buf, pos)[0] / 100
+        pos += 1
+    if flags & _INPUT_MELEE:
+        msg["melee"] = bool(flags & _INPUT_MELEE_ON)
+    if flags & _INPUT_FIRE:
+        fx, fy = _FIRE.unpack_from(buf, pos)
+        msg["fire"] = [fx / 10, fy / 10]
+        pos += _FIRE.size
+    if flags & _INPUT_SEQ:
+        msg["seq"], pos = _get_varint(buf, pos)
+    return msg
+
+
+def _encode_ack(out: bytearray, msg: Dict):
+    _check_keys(msg, frozenset(("type", "tick")))
+    _put_varint(out, msg["tick"])
+
+
+def _decode_ack(buf, pos: int) -> Dict:
+    tick, pos = _get_varint(buf, pos)
+    return {"type": "ack", "tick": tick}
+
+
+def _encode_lobby_update(out: bytearray, msg: Dict):
+    _check_keys(msg, _LOBBY_KEYS)
+    _put_str(out, msg["room"])
+    clients = msg["clients"]
+    _put_varint(out, len(clients))
+    for cid in clients:
+        _put_str(out, cid)
+
+
+def _decode_lobby_update(buf, pos: int) -> Dict:
+    room, pos = _get_str(buf, pos)
+    n, pos = _get_varint(buf, pos)
+    clients = []
+    for _ in range(n):
+        cid, pos = _get_str(buf, pos)
+        clients.append(cid)
+    return {"type": "lobby_update", "room": room, "clients": clients}
+
+
+_ENCODERS = {
+    "state": (T_STATE, _encode_state),
+    "delta": (T_DELTA, _encode_delta),
+    "input": (T_INPUT, _encode_input),
+    "ack": (T_ACK, _encode_ack),
+    "lobby_update": (T_LOBBY_UPDATE, _encode_lobby_update),
+}
+_DECODERS = {
+    T_STATE: _decode_state,
+    T_DELTA: _decode_delta,
+    T_INPUT: _decode_input,
+    T_ACK: _decode_ack,
+    T_LOBBY_UPDATE: _decode_lobby_update,
+}
+
+
+# --------------------------------------------------------------------- frames
+
+def encode_binary(msg: Dict) -> bytes:
+    """Serialize msg into a complete binary frame."""
+    body = None
+    enc = _ENCODERS.get(msg.get("type"))
+    if enc is not None:
+        body = bytearray((enc[0],))
+        try:
+            enc[1](body, msg)
+        except (Unencodable, KeyError, TypeError, struct.error):
+            body = None
+    if body is None:
+        body = bytearray((T_JSON,))
+        body += json.dumps(msg, separators=(",", ":")).encode("utf-8")
+    frame = bytearray((MAGIC,))
+    _put_varint(frame, len(body))
+    frame += body
+    return bytes(frame)
+
+
+def parse_header(buf, pos: int = 0) -> Optional[Tuple[int, int]]:
+    """
+    Read the frame header at buf[pos] (which must be MAGIC).
+    Returns (body_start, body_length), or None if the header is still incomplete.
+    """
+    length = 0
+    shift = 0
+    i = pos + 1
+    while True:
+        if i >= len(buf):
+            return None
+        if i - pos >= MAX_HEADER:
+            raise ValueError("frame length varint too long")
+        b = buf[i]
+        i += 1
+        length |= (b & 0x7F) << shift
+        if b < 0x80:
+            return i, length
+        shift += 7
+
+
+def decode_body(body) -> Optional[Dict]:
+    """Decode a frame body (type byte onward); returns None if it is malformed."""
+    try:
+        mtype = body[0]
+        if mtype == T_JSON:
+            msg = json.loads(bytes(body[1:]).decode("utf-8"))
+            return msg if isinstance(msg, dict) else None
+        dec = _DECODERS.get(mtype)
+        return dec(body, 1) if dec is not None else None
+    except (IndexError, ValueError, struct.error):
+        # ValueError covers UnicodeDecodeError and json.JSONDecodeError
+        return None
+
+
+def decode_binary(frame: bytes) -> Optional[Dict]:
+    """Decode one complete binary frame; returns None if it is truncated or malformed."""
+    try:
+        header = parse_header(frame)
+    except ValueError:
+        return None
+    if header is None:
+        return None
+    start, length = header
+    if start + length > len(frame):
+        return None
+    return decode_body(memoryview(frame)[start:start + length])
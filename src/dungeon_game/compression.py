@@ -0,0 +1,147 @@
+"""
+Per-connection zlib compression of large server -> client frames.
+
+A client asks for it in its join (or resume) with "compress": "zlib" and may
+set "compress_min"; the server confirms both in "joined". From then on the
+connection's writer passes every frame it sends through FrameCompressor:
+frames shorter than min_size go out as they are, longer ones are wrapped as
+
+    ZMAGIC | varint length | deflate data
+
+ZMAGIC, like the binary codec's MAGIC, can't begin a JSON line, so a reader
+tells the three framings apart by the first byte, and the wrapped data is
+itself one complete JSON or binary frame. The deflate stream is one per
+connection and each frame ends with a sync flush, so a frame decompresses as
+soon as it arrives while the window still remembers earlier frames: the
+second lobby update or snapshot delta mostly refers back to the first. As in
+WebSocket's permessage-deflate, the flush's constant 00 00 ff ff trailer is
+not sent and the reader appends it again.
+
+Compression happens in the connection's writer, after broadcasts were encoded
+once for everyone, because the stream state is per connection. Clients don't
+compress what they send (inputs and acks are a few bytes); the decompressor
+lives in protocol.FrameDecoder, which handles ZMAGIC frames whenever they
+come. A deflate context is only allocated once a frame crosses min_size.
+"""
+import time
+import zlib
+from typing import Dict, Optional
+
+from .binary_codec import _put_varint
+
+ZMAGIC = 0xB6
+ZLIB = "zlib"
+COMPRESSIONS = (ZLIB,)
+# frames shorter than this aren't worth a deflate call
+DEFAULT_MIN_SIZE = 256
+# bounds for a client's "compress_min"
+MIN_SIZE_FLOOR = 32
+MIN_SIZE_CEIL = 64 * 1024
+# level 1..9; the sizes are small, so higher levels buy little (scripts/bench_compression.py)
+DEFAULT_LEVEL = 6
+# 8 KB window and memLevel 6: ~64 KB per compressing connection instead of zlib's default ~256 KB
+WINDOW_BITS = 13
+MEM_LEVEL = 6
+SYNC_TRAILER = b"\x00\x00\xff\xff"
+
+
+def negotiate(msg: Dict, metrics=None) -> Optional["FrameCompressor"]:
+    """The compressor a join / resume message asks for, or None."""
+    if msg.get("compress") not in COMPRESSIONS:
+        return None
+    try:
+        min_size = int(msg.get("compress_min", DEFAULT_MIN_SIZE))
+    except (TypeError, ValueError):
+        min_size = DEFAULT_MIN_SIZE
+    return FrameCompressor(max(MIN_SIZE_FLOOR, min(MIN_SIZE_CEIL, min_size)), metrics=metrics)
+
+
+class FrameCompressor:
+    """Server side: one deflate stream per connection, used by that connection's writer only."""
+    def __init__(self, min_size: int = DEFAULT_MIN_SIZE, level: int = DEFAULT_LEVEL,
+                 window_bits: int = WINDOW_BITS, mem_level: int = MEM_LEVEL, metrics=None):
+        self.min_size = min_size
+        self.level = level
+        self.window_bits = window_bits
+        self.mem_level = mem_level
+        self.metrics = metrics
+        self._z = None
+        # counters
+        self.frames = 0
+        self.compressed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.seconds = 0.0
+
+    def join_fields(self) -> Dict:
+        """What "joined" / "resumed" confirm."""
+        return {"compress": ZLIB, "compress_min": self.min_size}
+
+    def compress(self, frame: bytes) -> bytes:
+        """frame as it should go on the wire."""
+        self.frames += 1
+        if len(frame) < self.min_size:
+            return frame
+        t0 = time.perf_counter()
+        z = self._z
+        if z is None:
+            # negative wbits: raw deflate, no zlib header per stream
+            z = self._z = zlib.compressobj(self.level, zlib.DEFLATED, -self.window_bits, self.mem_level)
+        data = z.compress(frame) + z.flush(zlib.Z_SYNC_FLUSH)
+        if data.endswith(SYNC_TRAILER):
+            data = data[:-4]
+        out = bytearray((ZMAGIC,))
+        _put_varint(out, len(data))
+        out += data
+        elapsed = time.perf_counter() - t0
+        self.compressed += 1
+        self.bytes_in += len(frame)
+        self.bytes_out += len(out)
+        self.seconds += elapsed
+        if self.metrics is not None:
+            self.metrics.observe_compression(len(frame), len(out), elapsed)
+        return bytes(out)
+
+    def stats(self) -> Dict:
+        return _stats(self.frames, self.compressed, self.bytes_in, self.bytes_out, self.seconds)
+
+
+class FrameDecompressor:
+    """Client side counterpart; FrameDecoder creates one on the first ZMAGIC frame."""
+    def __init__(self):
+        # the reader's window must be at least the writer's; the largest takes any
+        self._z = zlib.decompressobj(-15)
+        self.compressed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.seconds = 0.0
+
+    def decompress(self, data, max_size: int, wire_size: Optional[int] = None) -> bytes:
+        """
+        One ZMAGIC frame's body back to the frame it wrapped; ValueError if that
+        would exceed max_size (wire_size: the whole wrapped frame, for the stats).
+        """
+        t0 = time.perf_counter()
+        z = self._z
+        frame = z.decompress(bytes(data) + SYNC_TRAILER, max_size)
+        if z.unconsumed_tail:
+            raise ValueError(f"compressed frame inflates past {max_size} bytes")
+        self.seconds += time.perf_counter() - t0
+        self.compressed += 1
+        self.bytes_in += len(data) if wire_size is None else wire_size
+        self.bytes_out += len(frame)
+        return frame
+
+    def stats(self) -> Dict:
+        return _stats(None, self.compressed, self.bytes_out, self.bytes_in, self.seconds)
+
+
+def _stats(frames: Optional[int], compressed: int, raw: int, wire: int, seconds: float) -> Dict:
+    """raw: bytes before compression, wire: after; same shape on both sides."""
+    out = {"compressed_frames": compressed, "raw_bytes": raw, "wire_bytes": wire,
+           "ratio": round(raw / wire, 3) if wire else None,
+           "cpu_ms": round(seconds * 1000, 3),
+           "us_per_frame": round(seconds / compressed * 1e6, 2) if compressed else None}
+    if frames is not None:
+        out["frames"] = frames
+    return out
@@ -8,10 +8,14 @@ from pathlib import Path
 from typing import List, Optional, Dict, Tuple
 
 from .game import Game
-from .entities import create_warrior, create_archer, create_sorcerer, create_rogue, create_paladin, create_necromancer, Player, Item
+from .entities import create_warrior, create_archer, create_sorcerer, create_rogue, create_paladin, create_necromancer, Player, Item, Mob
 from .arena import ArenaPlayer, ArenaMob, Projectile, load_image, ASSET_DIR
 from .level import Level
 from .shop import Shop
+from .inbound import InboundQueue
+from .snapshots import SnapshotReceiver
+from .prediction import MovementPredictor
+from .interpolation import InterpolationBuffer, RESYNC_TICKS
 try:
     from .persistence import LocalProgress
 except Exception:
@@ -145,6 +149,96 @@ class ArenaScene:
             "poison": try_load("mob_poison.png", size=(48,48)),
         }
 
+        # multiplayer: GameClient's receive thread only queues messages; pump_network() handles them each frame
+        self.net_client = None
+        self.inbox = InboundQueue()
+        self.snapshots = SnapshotReceiver()
+        self.remote_state: Optional[Dict] = None
+        self.net_clients: List[str] = []
+        self.net_status = ""
+        # own movement is predicted once the server says it simulates (tick_rate in "joined")
+        self.predictor: Optional[MovementPredictor] = None
+        # server-driven mobs and other players are drawn from this, a couple of ticks behind the newest snapshot
+        self.interp: Optional[InterpolationBuffer] = None
+        self.remote_mobs: Dict[int, ArenaMob] = {}
+        # RTT / jitter / clock offset line under the net status; F3 toggles it
+        self.show_net_hud = True
+
+    def connect_network(self, client):
+        """Route a GameClient's messages through the inbox; call before client.connect()."""
+        self.net_client = client
+        client.on_message = self.inbox.put
+
+    def pump_network(self):
+        """Handle queued server messages within the per-frame budget; called once per frame, before update()."""
+        if self.net_client is not None:
+            self.inbox.process(self._on_network_message)
+            if self.interp is not None:
+                self.interp.advance()
+
+    def _on_network_message(self, msg: Dict):
+        mtype = msg.get("type")
+        if mtype in ("state", "delta"):
+            state = self.snapshots.receive(msg)
+            if state is not None and self.remote_state is not None \
+                    and 0 < self.remote_state["tick"] - state["tick"] < RESYNC_TICKS:
+                # overtaken by a newer one: a keyframe that went over TCP while deltas came by UDP
+                state = None
+            if state is not None:
+                self.remote_state = state
+                if self.interp is not None:
+                    self.interp.push(state)
+                    self._sync_remote_mobs(state)
+                own = state["players"].get(self.username)
+                if self.predictor is not None and own is not None and own.get("x") is not None:
+                    self.predictor.reconcile(own["x"], own["y"], own.get("seq"))
+            ack = self.snapshots.ack_message()
+            if ack:
+                try:
+                    self.net_client.send(ack)
+                except Exception:
+                    pass
+        elif mtype == "lobby_update":
+            self.net_clients = list(msg.get("clients", []))
+        elif mtype in ("joined", "resumed"):
+            self.net_status = f"Online: room {msg.get('room')}"
+            if msg.get("tick_rate") and self.predictor is None:
+                self.predictor = MovementPredictor(self.arena_player, (WIDTH, HEIGHT), 1.0 / msg["tick_rate"])
+            if msg.get("tick_rate") and self.interp is None:
+                self.interp = InterpolationBuffer(msg["tick_rate"])
+        elif mtype == "level_started":
+            # the new simulation counts ticks from the start again: nothing of the old one is a baseline
+            # or "newer" than its snapshots, and the server expects no ack until we have one of them
+            self.snapshots = SnapshotReceiver()
+            self.remote_state = None
+            self.remote_mobs.clear()
+            if self.predictor is not None:
+                # a fresh simulation has seen none of our inputs; the next snapshot places us
+                self.predictor.reset(self.arena_player.x, self.arena_player.y)
+            if self.interp is not None:
+                self.interp.reset()
+        elif mtype == "reconnecting":
+            self.net_status = f"Reconnecting (attempt {msg.get('attempt')})..."
+        elif mtype == "error":
+            self.net_status = f"Server: {msg.get('message')}"
+
+    def _sync_remote_mobs(self, state: Dict):
+        """One ArenaMob per server mob, bound to its interpolation track (which moves it every frame)."""
+        mobs = state["mobs"]
+        for mid, rec in mobs.items():
+            am = self.remote_mobs.get(mid)
+            if am is None:
+                am = self.remote_mobs[mid] = ArenaMob(Mob("mob", rec.get("hp", 1), 0, 0), rec.get("x", 0.0), rec.get("y", 0.0))
+            elif rec.get("hp") is not None:
+                am.mob.hp = rec["hp"]
+            track = self.interp.track("mobs", mid)
+            if track is not None and track.target is not am:
+                self.interp.bind("mobs", mid, am)
+        if len(self.remote_mobs) > len(mobs):
+            # despawned ones stay drawn (via their track) until the render clock reaches them
+            for mid in [m for m in self.remote_mobs if m not in mobs]:
+                del self.remote_mobs[mid]
+
     def save_state(self):
         data = {
             "class": self.player_class,
@@ -225,7 +319,15 @@ class ArenaScene:
         keys = pygame.key.get_pressed()
         dx = (keys[pygame.K_d] or keys[pygame.K_RIGHT]) - (keys[pygame.K_a] or keys[pygame.K_LEFT])
         dy = (keys[pygame.K_s] or keys[pygame.K_DOWN]) - (keys[pygame.K_w] or keys[pygame.K_UP])
-        self.arena_player.move(dx, dy, dt, (WIDTH, HEIGHT))
+        if self.predictor is not None:
+            # networked: move now, send the seq'd inputs, and let snapshots correct us
+            for inp in self.predictor.advance(dx, dy, dt):
+                try:
+                    self.net_client.send(inp)
+                except Exception:
+                    pass
+        else:
+            self.arena_player.move(dx, dy, dt, (WIDTH, HEIGHT))
 
         # update animations list (remove finished)
         for anim, ax, ay in list(self.active_animations):
@@ -353,6 +455,30 @@ class ArenaScene:
                 else:
                     pygame.draw.circle(self.screen, (80, 80, 80), (int(m.x), int(m.y)), max(6, m.radius//2))
 
+        # server-driven mobs, interpolated
+        if self.interp is not None:
+            for track in self.interp.tracks["mobs"].values():
+                m = track.target
+                if m is not None:
+                    pygame.draw.circle(self.screen, m.color if m.is_alive() else (80, 80, 80),
+                                       (int(m.x), int(m.y)), m.radius if m.is_alive() else max(6, m.radius // 2))
+
+        # other players in a networked room: interpolated when the server simulates, else the latest snapshot
+        if self.interp is not None:
+            for pid, track in self.interp.tracks["players"].items():
+                if pid == self.username:
+                    continue
+                pos = (int(track.x), int(track.y))
+                pygame.draw.circle(self.screen, (110, 150, 220), pos, 16, 2)
+                self._draw_text(str(pid), pos[0] - 16, pos[1] - 34, color=(150, 180, 230))
+        elif self.remote_state is not None:
+            for pid, rp in self.remote_state["players"].items():
+                if pid == self.username or rp.get("x") is None:
+                    continue
+                pos = (int(rp["x"]), int(rp.get("y", 0)))
+                pygame.draw.circle(self.screen, (110, 150, 220), pos, 16, 2)
+                self._draw_text(str(pid), pos[0] - 16, pos[1] - 34, color=(150, 180, 230))
+
         # draw projectiles
         for p in self.projectiles:
             if p.image:
@@ -405,10 +531,27 @@ class ArenaScene:
 
         if self.shop_message:
             self._draw_text(self.shop_message, 10, HEIGHT - 68, color=(200, 200, 120))
+        if self.net_status:
+            self._draw_text(f"{self.net_status}  Players: {len(self.net_clients)}", 10, 30, color=(150, 180, 230))
+        if self.net_client is not None and self.show_net_hud:
+            self._draw_text(self._net_hud_line(), 10, 50, color=(130, 160, 200))
 
         if self.show_shop_overlay and self.current_shop:
             self._draw_shop_overlay()
 
+    def _net_hud_line(self) -> str:
+        lat = self.net_client.latency.stats()
+
+        def ms(v, fmt="{:.0f}"):
+            return "--" if v is None else fmt.format(v)
+        parts = [f"RTT {ms(lat['rtt_ms'])} ms", f"jitter {ms(lat['jitter_ms'], '{:.1f}')} ms",
+                 f"clock {ms(lat['clock_offset_ms'], '{:+.0f}')} ms"]
+        if self.interp is not None:
+            parts.append(f"interp {self.interp.delay_ticks / self.interp.tick_rate * 1000:.0f} ms")
+        if self.predictor is not None:
+            parts.append(f"corrections {self.predictor.corrections}")
+        return "  ".join(parts)
+
     def _draw_text(self, txt: str, x: int, y: int, color=(220, 220, 220)):
         surf = self.font.render(txt, True, color)
         self.screen.blit(surf, (x, y))
@@ -480,6 +623,8 @@ class ArenaScene:
                     self.shop_message = f"Equipped from slot {slot_idx+1}"
                 else:
                     self.shop_message = "Cannot equip that slot (empty or no space to swap)."
+            elif ev.key == pygame.K_F3:
+                self.show_net_hud = not self.show_net_hud
             elif ev.key == pygame.K_SPACE and not self.show_shop_overlay:
                 # melee attack: perform damage and spawn a melee anim depending on equipped melee item
                 hits = self.arena_player.melee_attack(self.mobs)
@@ -546,7 +691,8 @@ class ArenaScene:
 
 # simplified launcher that uses ArenaScene
 if 'launch_gui' not in globals():
-    def launch_gui():
+    def launch_gui(connect: Optional[str] = None, room: Optional[str] = None):
+        """connect="host:port" joins that server's room (default lobby) and shows the other players."""
         pygame.init()
         # Use RESIZABLE so maximize button is available; keep SCALED for DPI scaling if supported
         flags = pygame.RESIZABLE | getattr(pygame, "SCALED", 0)
@@ -582,6 +728,23 @@ if 'launch_gui' not in globals():
                         choice = "necromancer"
                     elif ev.key == pygame.K_RETURN:
                         scene = ArenaScene(screen, choice, username)
+                        client = None
+                        if connect:
+                            from .network import GameClient
+                            host, _, port = connect.rpartition(":")
+                            # inputs and acks queue up during the frame and go out in one send at its end;
+                            # snapshots come by UDP if the server offers it (server --udp)
+                            client = GameClient(host or "localhost", int(port or 6000), reconnect=True,
+                                                batch_frames=True, udp=True)
+                            scene.connect_network(client)
+                            try:
+                                client.connect()
+                                join = {"type": "join", "client_id": username, "class": choice}
+                                if room:
+                                    join["room"] = room
+                                client.send(join)
+                            except Exception as e:
+                                scene.net_status = f"Offline: {e}"
                         # simple scene loop:
                         running_inner = True
                         clock_inner = pygame.time.Clock()
@@ -593,11 +756,17 @@ if 'launch_gui' not in globals():
                                     running = False
                                 else:
                                     scene.handle_event(ev2)
+                            # server messages are applied here, on this thread, once per frame
+                            scene.pump_network()
                             if not scene.show_shop_overlay:
                                 scene.update()
                             scene.draw()
                             pygame.display.flip()
+                            if client is not None:
+                                client.flush()
                         scene.save_state()
+                        if client is not None:
+                            client.close()
                     elif ev.key == pygame.K_ESCAPE:
                         running = False
             clock.tick(30)
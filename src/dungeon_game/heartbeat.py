@@ -0,0 +1,117 @@
+"""
+Heartbeats and dead-connection reaping for the multiplayer servers.
+
+A half-open TCP peer (crashed client, dropped Wi-Fi, NAT entry expired) never
+sends a FIN, so a blocking read on it waits forever and the client keeps its
+room slot. Servers record on each connection when it last delivered a frame
+(last_seen) and when the frame currently arriving started (frame_started, 0
+between frames). A Reaper sweeps the live connections (ServerMetrics.connections)
+a few times per timeout and
+
+- sends every connection a timestamped ping every ping_interval; clients
+  answer with a pong (GameClient does so automatically), which keeps a quiet
+  connection alive and gives the connection's LatencyEstimator an RTT and
+  clock-offset sample (latency.py),
+- drops a connection silent for idle_timeout, or one that started a frame and
+  hasn't finished it within read_timeout (a peer dribbling bytes).
+
+Dropping goes through the connection's normal close path, so handle_disconnect
+frees the room slot as for any other disconnect. A live client answers pings,
+so only dead or stuck peers are reaped, within idle_timeout plus one sweep.
+A timeout of 0 disables that check.
+"""
+import asyncio
+import threading
+import time
+from typing import Optional
+
+from .metrics import ServerMetrics
+from .latency import wall_clock
+
+DEFAULT_PING_INTERVAL = 5.0
+DEFAULT_IDLE_TIMEOUT = 15.0
+DEFAULT_READ_TIMEOUT = 10.0
+# reaped connections overrun a deadline by at most a quarter of the shortest timeout
+SWEEPS_PER_TIMEOUT = 4
+
+
+class Reaper:
+    """
+    Pings connections and drops dead ones. Connections duck-type
+    last_seen / frame_started / ping_sent (time.monotonic() values),
+    send_message() and drop_connection(), and optionally a latency estimator.
+    """
+    def __init__(self, metrics: ServerMetrics, ping_interval: float = DEFAULT_PING_INTERVAL,
+                 idle_timeout: float = DEFAULT_IDLE_TIMEOUT, read_timeout: float = DEFAULT_READ_TIMEOUT):
+        self.metrics = metrics
+        self.ping_interval = max(0.0, float(ping_interval))
+        self.idle_timeout = max(0.0, float(idle_timeout))
+        self.read_timeout = max(0.0, float(read_timeout))
+        timeouts = [t for t in (self.ping_interval, self.idle_timeout, self.read_timeout) if t > 0]
+        self.sweep_interval = min(timeouts) / SWEEPS_PER_TIMEOUT if timeouts else 0.0
+        self._stop = threading.Event()
+
+    @property
+    def enabled(self) -> bool:
+        return self.sweep_interval > 0
+
+    def check(self, conn, now: float) -> Optional[str]:
+        """Ping conn if it is due one; returns the reason to reap it, if any."""
+        started = conn.frame_started
+        if self.read_timeout and started and now - started > self.read_timeout:
+            return "read_timeout"
+        silent = now - conn.last_seen
+        if self.idle_timeout and silent > self.idle_timeout:
+            return "idle"
+        if self.ping_interval and now - conn.ping_sent > self.ping_interval:
+            conn.ping_sent = now
+            latency = getattr(conn, "latency", None)
+            conn.send_message(latency.ping() if latency is not None else {"type": "ping", "t": wall_clock()})
+            self.metrics.pings_sent += 1
+        return None
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Check every live connection once; returns how many were reaped."""
+        if now is None:
+            now = time.monotonic()
+        reaped = 0
+        for conn in self.metrics.live_connections():
+            if getattr(conn, "reaped", None):
+                # already dropped, still closing
+                continue
+            reason = self.check(conn, now)
+            if reason is not None:
+                conn.reaped = reason
+                self.metrics.connection_reaped(reason)
+                conn.drop_connection()
+                reaped += 1
+        return reaped
+
+    def start_thread(self) -> Optional[threading.Thread]:
+        """Sweep from a daemon thread (threaded server)."""
+        if not self.enabled:
+            return None
+
+        def loop():
+            while not self._stop.wait(self.sweep_interval):
+                try:
+                    self.sweep()
+                except Exception:
+                    pass
+        t = threading.Thread(target=loop, daemon=True, name="reaper")
+        t.start()
+        return t
+
+    async def run(self):
+        """Sweep from the event loop (asyncio servers); run as a task."""
+        if not self.enabled:
+            return
+        while not self._stop.is_set():
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+            except Exception:
+                pass
+
+    def stop(self):
+        self._stop.set()
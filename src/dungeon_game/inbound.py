@@ -0,0 +1,118 @@
+"""
+Frame-synchronized inbound message queue for game clients.
+
+GameClient calls on_message on its receive thread (and, with the UDP channel,
+on that channel's thread). A render loop must not mutate scene state from
+there, so the GUI passes InboundQueue.put as on_message and drains the queue
+at one fixed point in each frame with process(handler, max_messages,
+max_seconds); the handler runs on the render thread and needs no locks.
+
+put() is a single deque.append, which is atomic under the GIL, so any number
+of network threads may call it and none of them waits on the render thread;
+everything else (including the counters) belongs to the consumer. Before handling, process() coalesces
+what is waiting: of several snapshots ("state" / "delta") only the newest is
+kept, since the server builds deltas against acknowledged ticks and a skipped
+snapshot was never acknowledged; likewise only the newest lobby_update per
+room. Whatever does not fit the budget is carried over, in order, to the
+next frame, so a burst after a stall costs at most one budget per frame.
+"""
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional
+
+# per-frame budget: ~2 ms of a 16.7 ms (60 FPS) frame
+DEFAULT_MAX_MESSAGES = 64
+DEFAULT_MAX_SECONDS = 0.002
+
+SNAPSHOT_TYPES = ("state", "delta")
+
+
+def coalesce_key(msg: Dict) -> Optional[tuple]:
+    """Messages with the same key supersede each other (newest wins); None never coalesces."""
+    mtype = msg.get("type")
+    if mtype in SNAPSHOT_TYPES:
+        return ("snapshot",)
+    if mtype == "lobby_update":
+        return ("lobby_update", msg.get("room"))
+    return None
+
+
+class InboundQueue:
+    """Network threads put, one consumer (the render thread) processes."""
+    def __init__(self, coalesce: Callable[[Dict], Optional[tuple]] = coalesce_key):
+        self.coalesce = coalesce
+        self.incoming: Deque[Dict] = deque()
+        # consumer side only: messages carried over from an exhausted budget
+        self.backlog: List[Dict] = []
+        # counters, consumer side only (received is derived from them, so put() needs no lock)
+        self.processed = 0
+        self.coalesced = 0
+        self.deferred_frames = 0
+        self.max_pending = 0
+        self.last_process_s = 0.0
+
+    def put(self, msg: Dict):
+        """Called from a network thread (usable directly as GameClient's on_message)."""
+        self.incoming.append(msg)
+
+    @property
+    def received(self) -> int:
+        return self.processed + self.coalesced + self.pending()
+
+    def pending(self) -> int:
+        return len(self.backlog) + len(self.incoming)
+
+    def _collect(self) -> List[Dict]:
+        """Backlog plus everything that arrived since, with superseded messages dropped."""
+        items = self.backlog
+        popleft = self.incoming.popleft
+        # only what is there now; the producer may keep appending meanwhile
+        for _ in range(len(self.incoming)):
+            items.append(popleft())
+        self.max_pending = max(self.max_pending, len(items))
+        if len(items) < 2:
+            return items
+        newest: Dict[tuple, int] = {}
+        keys = []
+        for i, msg in enumerate(items):
+            key = self.coalesce(msg)
+            keys.append(key)
+            if key is not None:
+                newest[key] = i
+        if len(newest) == sum(k is not None for k in keys):
+            return items
+        out = [msg for i, msg in enumerate(items) if keys[i] is None or newest[keys[i]] == i]
+        self.coalesced += len(items) - len(out)
+        return out
+
+    def process(self, handler: Callable[[Dict], None], max_messages: int = DEFAULT_MAX_MESSAGES,
+                max_seconds: Optional[float] = DEFAULT_MAX_SECONDS) -> int:
+        """
+        Hand waiting messages to handler, oldest first, until max_messages were
+        handled or max_seconds passed (at least one is always handled); returns
+        how many. Call once per frame from the thread that owns the scene.
+        """
+        t0 = time.perf_counter()
+        items = self._collect()
+        deadline = t0 + max_seconds if max_seconds is not None else None
+        done = 0
+        try:
+            while done < len(items) and done < max_messages:
+                msg = items[done]
+                done += 1
+                handler(msg)
+                if deadline is not None and time.perf_counter() >= deadline:
+                    break
+        finally:
+            self.backlog = items[done:]
+            self.processed += done
+            if self.backlog:
+                self.deferred_frames += 1
+            self.last_process_s = time.perf_counter() - t0
+        return done
+
+    def stats(self) -> Dict:
+        return {"received": self.received, "processed": self.processed, "coalesced": self.coalesced,
+                "pending": self.pending(), "max_pending": self.max_pending,
+                "deferred_frames": self.deferred_frames,
+                "last_process_ms": round(self.last_process_s * 1000, 3)}
@@ -0,0 +1,251 @@
+"""
+Snapshot interpolation for remote entities (mobs and other players).
+
+Snapshots arrive at the server's tick rate (20 Hz by default) and a little
+unevenly, so drawing each entity where the newest one puts it makes it jump
+every third frame at 60 FPS and stall whenever a snapshot is late.
+InterpolationBuffer instead keeps a short history of positions per entity,
+keyed by server tick, and draws everything `delay_ticks` behind the newest
+snapshot, between the two samples around that point in time:
+
+  - push(state) once per received snapshot (a SnapshotReceiver state);
+  - advance() once per frame, which moves the render clock and writes each
+    entity's position into its EntityTrack (and into a bound object, such as
+    the ArenaMob the GUI draws, see bind());
+  - when the render clock overtakes an entity's newest sample (snapshots lost
+    or late), its last velocity is extrapolated for at most
+    `max_extrapolation_ticks`, after which it holds still.
+
+The render clock follows the server's: each snapshot gives an estimate of
+"server tick minus local time", which is smoothed, and the render tick never
+runs backwards. A clock jump of more than RESYNC_TICKS (a long stall)
+resets the clock; the tick count going back that far, or reset() (the GUI
+calls it on level_started), also drops the histories.
+
+Each EntityTrack is a preallocated ring of `capacity` samples in flat arrays,
+so steady-state pushes and per-frame sampling allocate nothing.
+"""
+import time
+from array import array
+from typing import Dict, Optional
+
+# render 2 ticks (100 ms at 20 Hz) behind the newest snapshot: one late snapshot is absorbed
+DEFAULT_DELAY_TICKS = 2.0
+# keep moving along the last velocity for at most this long when snapshots stop
+DEFAULT_MAX_EXTRAPOLATION_TICKS = 2.0
+# samples kept per entity; must cover delay + a few lost snapshots
+DEFAULT_CAPACITY = 16
+# weight of each new clock observation
+CLOCK_SMOOTHING = 0.1
+# clock observations this far from the smoothed one are taken as-is
+RESYNC_TICKS = 10.0
+
+INTERPOLATED = 0
+EXTRAPOLATED = 1
+HELD = 2
+
+ENTITY_KINDS = ("players", "mobs")
+
+
+class EntityTrack:
+    """Ring of (tick, x, y) samples for one entity, plus its position as of the last advance()."""
+    __slots__ = ("ticks", "xs", "ys", "capacity", "head", "count", "x", "y", "mode", "ended", "target")
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        self.ticks = array("d", [0.0]) * capacity
+        self.xs = array("d", [0.0]) * capacity
+        self.ys = array("d", [0.0]) * capacity
+        self.capacity = capacity
+        # index of the newest sample
+        self.head = -1
+        self.count = 0
+        self.x = 0.0
+        self.y = 0.0
+        self.mode = HELD
+        # despawned: no more samples will come; dropped once rendered up to the last one
+        self.ended = False
+        # optional object whose x / y are kept in sync (e.g. an ArenaMob)
+        self.target = None
+
+    def push(self, tick: float, x: float, y: float):
+        if self.count:
+            newest = self.ticks[self.head]
+            if tick < newest:
+                return
+            if tick == newest:
+                self.xs[self.head] = x
+                self.ys[self.head] = y
+                return
+        else:
+            self.x, self.y = x, y
+        head = (self.head + 1) % self.capacity
+        self.ticks[head] = tick
+        self.xs[head] = x
+        self.ys[head] = y
+        self.head = head
+        if self.count < self.capacity:
+            self.count += 1
+
+    def newest_tick(self) -> float:
+        return self.ticks[self.head] if self.count else -1.0
+
+    def clear(self):
+        self.head = -1
+        self.count = 0
+
+    def sample(self, t: float, max_extrapolation: float) -> int:
+        """Set x / y to the position at render tick t; returns INTERPOLATED, EXTRAPOLATED or HELD."""
+        count = self.count
+        if not count:
+            return self.mode
+        ticks, xs, ys, cap = self.ticks, self.xs, self.ys, self.capacity
+        i = self.head
+        t1 = ticks[i]
+        if t >= t1:
+            mode = HELD
+            x, y = xs[i], ys[i]
+            if t > t1 and count > 1 and not self.ended:
+                j = (i - 1) % cap
+                span = t1 - ticks[j]
+                ahead = min(t - t1, max_extrapolation)
+                if span > 0 and ahead > 0:
+                    x += (x - xs[j]) / span * ahead
+                    y += (y - ys[j]) / span * ahead
+                    mode = EXTRAPOLATED
+        else:
+            # walk back to the newest sample at or before t
+            mode = HELD
+            x, y = xs[i], ys[i]
+            for _ in range(count - 1):
+                j = (i - 1) % cap
+                t0 = ticks[j]
+                if t0 <= t:
+                    f = (t - t0) / (t1 - t0)
+                    x = xs[j] + (xs[i] - xs[j]) * f
+                    y = ys[j] + (ys[i] - ys[j]) * f
+                    mode = INTERPOLATED
+                    break
+                i, t1 = j, t0
+            else:
+                # older than anything kept: the oldest sample
+                x, y = xs[i], ys[i]
+        self.x, self.y, self.mode = x, y, mode
+        target = self.target
+        if target is not None:
+            target.x = x
+            target.y = y
+        return mode
+
+
+class InterpolationBuffer:
+    """Per-entity interpolation of remote positions, rendered a fixed delay behind the server."""
+    def __init__(self, tick_rate: float, delay_ticks: float = DEFAULT_DELAY_TICKS,
+                 max_extrapolation_ticks: float = DEFAULT_MAX_EXTRAPOLATION_TICKS,
+                 capacity: int = DEFAULT_CAPACITY):
+        self.tick_rate = float(tick_rate)
+        self.delay_ticks = delay_ticks
+        self.max_extrapolation_ticks = max_extrapolation_ticks
+        self.capacity = capacity
+        self.tracks: Dict[str, Dict] = {kind: {} for kind in ENTITY_KINDS}
+        # smoothed (server tick - local seconds * tick_rate)
+        self.offset: Optional[float] = None
+        self.render_tick = 0.0
+        self.latest_tick = -1
+        # counters
+        self.snapshots = 0
+        self.resyncs = 0
+        self.frames = 0
+        self.samples = [0, 0, 0]
+
+    def track(self, kind: str, eid) -> Optional[EntityTrack]:
+        return self.tracks[kind].get(eid)
+
+    def bind(self, kind: str, eid, target) -> bool:
+        """Have advance() write this entity's position into target.x / target.y."""
+        track = self.tracks[kind].get(eid)
+        if track is None:
+            return False
+        track.target = target
+        target.x, target.y = track.x, track.y
+        return True
+
+    def push(self, state: Dict, now: Optional[float] = None):
+        """Add a snapshot state (as returned by SnapshotReceiver.receive)."""
+        tick = state["tick"]
+        if tick <= self.latest_tick - RESYNC_TICKS:
+            # the tick count restarted (new level): old histories mean nothing now
+            self.reset()
+        elif tick <= self.latest_tick:
+            return
+        self.latest_tick = tick
+        self.snapshots += 1
+        self._sync_clock(tick, time.perf_counter() if now is None else now)
+        for kind in ENTITY_KINDS:
+            entities = state.get(kind) or {}
+            tracks = self.tracks[kind]
+            for eid, rec in entities.items():
+                x = rec.get("x")
+                if x is None:
+                    continue
+                track = tracks.get(eid)
+                if track is None:
+                    track = tracks[eid] = EntityTrack(self.capacity)
+                track.push(tick, x, rec.get("y", 0.0))
+            if len(tracks) > len(entities) or any(t.ended for t in tracks.values()):
+                for eid, track in tracks.items():
+                    track.ended = eid not in entities
+
+    def reset(self):
+        """Forget all entities and the clock, e.g. when a new level restarts the server's tick count."""
+        for tracks in self.tracks.values():
+            tracks.clear()
+        self.offset = None
+        self.latest_tick = -1
+
+    def _sync_clock(self, tick: float, now: float):
+        observed = tick - now * self.tick_rate
+        if self.offset is None or abs(observed - self.offset) > RESYNC_TICKS:
+            self.offset = observed
+            self.render_tick = tick - self.delay_ticks
+            self.resyncs += 1
+        else:
+            self.offset += (observed - self.offset) * CLOCK_SMOOTHING
+
+    def advance(self, now: Optional[float] = None) -> float:
+        """Move the render clock to now and update every entity's position; returns the render tick."""
+        if self.offset is None:
+            return self.render_tick
+        if now is None:
+            now = time.perf_counter()
+        t = now * self.tick_rate + self.offset - self.delay_ticks
+        if t > self.render_tick:
+            self.render_tick = t
+        t = self.render_tick
+        max_ext = self.max_extrapolation_ticks
+        samples = self.samples
+        gone = None
+        for tracks in self.tracks.values():
+            for eid, track in tracks.items():
+                samples[track.sample(t, max_ext)] += 1
+                if track.ended and t >= track.newest_tick():
+                    if gone is None:
+                        gone = []
+                    gone.append((tracks, eid))
+        if gone:
+            for tracks, eid in gone:
+                del tracks[eid]
+        self.frames += 1
+        return t
+
+    def behind_ticks(self) -> float:
+        """How far the render clock trails the newest snapshot."""
+        return self.latest_tick - self.render_tick if self.latest_tick >= 0 else 0.0
+
+    def stats(self) -> Dict:
+        total = sum(self.samples) or 1
+        return {"entities": sum(len(t) for t in self.tracks.values()), "snapshots": self.snapshots,
+                "frames": self.frames, "resyncs": self.resyncs,
+                "delay_ticks": self.delay_ticks, "behind_ticks": round(self.behind_ticks(), 2),
+                "interpolated_pct": round(100.0 * self.samples[INTERPOLATED] / total, 1),
+                "extrapolated_pct": round(100.0 * self.samples[EXTRAPOLATED] / total, 1),
+                "held_pct": round(100.0 * self.samples[HELD] / total, 1)}
@@ -0,0 +1,213 @@
+"""
+Room journals: record a level run as it happens, replay it offline.
+
+With a journal directory configured (--journal DIR), every level a room runs as
+an authoritative simulation is written to its own append-only file: a header
+with everything ArenaSimulation needs to start the same way (level, seed --
+which fixes the Level.spawn_mobs shuffle and the wave placement rng -- tick
+rate, arena bounds, wave schedule and the starting roster), then one compact
+JSON array per line:
+
+    [tick, "msg", client_id, message]   inbound message from a room member
+    [tick, "add", client_id, class]     player added to the simulation
+    [tick, "remove", client_id]         player removed
+    [tick, "check", digest]             ArenaSimulation.digest() every CHECKPOINT_INTERVAL ticks
+    [tick, "end", result, coins, digest]
+
+Events carry the tick they were applied before (RoomSimulation applies inputs
+at tick boundaries, in arrival order), checks and the end record the tick just
+simulated. replay() feeds the events back into a fresh ArenaSimulation as fast
+as the CPU allows and compares every checkpoint and the outcome, so a journal
+from a real session is both a repeatable benchmark workload and a desync /
+performance bug report. The file is flushed at each checkpoint; a journal cut
+short by a crash still replays up to its last complete line.
+"""
+import json
+import os
+import re
+import time
+from itertools import count
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .simulation import ArenaSimulation
+from .snapshots import SnapshotStream
+
+# 2: seq'd inputs are queued one per tick (ArenaSimulation.apply_input), so version 1 runs replay differently
+JOURNAL_VERSION = 2
+
+_seq = count(1)
+
+
+def journal_path(directory: str, room_id: str) -> str:
+    """A fresh file name in directory for one level run of room_id."""
+    safe = re.sub(r"[^A-Za-z0-9_.-]", "_", room_id)[:64] or "room"
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    return os.path.join(directory, f"{safe}-{stamp}-{os.getpid()}-{next(_seq)}.journal")
+
+
+class RoomJournal:
+    """Writer for one level run; only the room's tick loop calls it, so there is no locking."""
+    def __init__(self, path: str, header: Dict):
+        self.path = path
+        self.file = open(path, "ab")
+        self.records = 0
+        self._write({"journal": JOURNAL_VERSION, **header})
+
+    @classmethod
+    def open(cls, directory: str, room_id: str, sim: ArenaSimulation, players: Dict[str, str],
+             tick_rate: int) -> "RoomJournal":
+        """Start a journal for sim, just created for room_id with players (client_id -> class)."""
+        os.makedirs(directory, exist_ok=True)
+        header = {"room": room_id, "level": sim.level_no, "seed": sim.seed, "tick_rate": tick_rate,
+                  "bounds": list(sim.bounds), "waves_total": sim.waves_total,
+                  "inter_wave_delay": sim.inter_wave_delay, "started": round(time.time(), 3),
+                  # a list, not an object: the order players were added in decides where they stand
+                  "players": [[cid, cls] for cid, cls in players.items()]}
+        return cls(journal_path(directory, room_id), header)
+
+    def _write(self, record):
+        if self.file is None:
+            return
+        try:
+            self.file.write(json.dumps(record, separators=(",", ":")).encode("utf-8") + b"\n")
+            self.records += 1
+        except (OSError, TypeError, ValueError):
+            # a full disk or an unserializable message must not take the room down with it
+            self.close_file()
+
+    def message(self, tick: int, client_id: str, msg: Dict):
+        self._write([tick, "msg", client_id, msg])
+
+    def player_added(self, tick: int, client_id: str, player_class: str):
+        self._write([tick, "add", client_id, player_class])
+
+    def player_removed(self, tick: int, client_id: str):
+        self._write([tick, "remove", client_id])
+
+    def checkpoint(self, sim: ArenaSimulation):
+        self._write([sim.tick, "check", sim.digest()])
+        if self.file is not None:
+            try:
+                self.file.flush()
+            except OSError:
+                self.close_file()
+
+    def end(self, sim: ArenaSimulation):
+        """Record the outcome (result is None for a level stopped early) and close the file."""
+        self._write([sim.tick, "end", sim.result, sim.coins, sim.digest()])
+        self.close_file()
+
+    def close_file(self):
+        f, self.file = self.file, None
+        if f is not None:
+            try:
+                f.close()
+            except OSError:
+                pass
+
+
+def read_journal(path: str) -> Tuple[Dict, Iterator[List]]:
+    """(header, records) for a journal file; a truncated last line is ignored."""
+    f = open(path, "rb")
+    header = json.loads(f.readline())
+    if header.get("journal") != JOURNAL_VERSION:
+        f.close()
+        raise ValueError(f"{path}: not a version {JOURNAL_VERSION} room journal")
+
+    def records():
+        with f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    return
+    return header, records()
+
+
+class _Recipient:
+    """Stand-in connection for replaying the snapshot stream; the stream counts the bytes, frames go nowhere."""
+    codec = "json"
+
+    def send_frame(self, frame: bytes):
+        pass
+
+
+def replay(path: str, snapshots: bool = False) -> Dict:
+    """
+    Re-run a journaled level headlessly and compare it with the recording.
+    With snapshots=True every tick is also published through a SnapshotStream
+    driven by the recorded acks, to include delta encoding in the workload.
+    """
+    header, records = read_journal(path)
+    sim = ArenaSimulation(header["level"], dict(header["players"]), seed=header["seed"],
+                          bounds=tuple(header["bounds"]), waves_total=header["waves_total"],
+                          inter_wave_delay=header["inter_wave_delay"])
+    dt = 1.0 / header["tick_rate"]
+    stream = SnapshotStream() if snapshots else None
+    recipients = {cid: _Recipient() for cid in sim.players}
+    messages = 0
+    checkpoints = 0
+    mismatches: List[int] = []
+    expected: Optional[Dict] = None
+    t0 = time.perf_counter()
+
+    def step_to(tick: int):
+        while sim.tick < tick:
+            sim.step(dt)
+            if stream is not None:
+                stream.publish(sim.snapshot(), recipients)
+
+    for rec in records:
+        tick, kind = rec[0], rec[1]
+        step_to(tick)
+        if kind == "msg":
+            messages += 1
+            cid, msg = rec[2], rec[3]
+            mtype = msg.get("type") if isinstance(msg, dict) else None
+            if mtype == "input":
+                sim.apply_input(cid, msg)
+            elif mtype == "ack" and stream is not None:
+                try:
+                    stream.ack(cid, int(msg.get("tick", 0)))
+                except (TypeError, ValueError):
+                    pass
+        elif kind == "add":
+            sim.add_player(rec[2], rec[3])
+            recipients[rec[2]] = _Recipient()
+        elif kind == "remove":
+            sim.remove_player(rec[2])
+            recipients.pop(rec[2], None)
+            if stream is not None:
+                stream.forget(rec[2])
+        elif kind == "check":
+            checkpoints += 1
+            if sim.digest() != rec[2]:
+                mismatches.append(tick)
+        elif kind == "end":
+            expected = {"result": rec[2], "coins": rec[3]}
+            if sim.digest() != rec[4]:
+                mismatches.append(tick)
+    sim_time = time.perf_counter() - t0
+
+    outcome_ok = expected is None or (sim.result == expected["result"] and sim.coins == expected["coins"])
+    out = {
+        "journal": path,
+        "room": header.get("room"),
+        "level": header["level"],
+        "seed": header["seed"],
+        "ticks": sim.tick,
+        "messages": messages,
+        "checkpoints": checkpoints,
+        "result": sim.result,
+        "expected_result": expected["result"] if expected else None,
+        "complete": expected is not None,
+        "match": outcome_ok and not mismatches,
+        "first_mismatch_tick": mismatches[0] if mismatches else None,
+        "elapsed_s": round(sim_time, 4),
+        "ticks_per_s": round(sim.tick / sim_time) if sim_time > 0 else None,
+        # how much faster than the recorded tick rate the replay ran
+        "speedup": round(sim.tick * dt / sim_time, 1) if sim_time > 0 else None,
+    }
+    if stream is not None:
+        out["snapshot_bytes_per_tick"] = stream.stats()["bytes_per_tick"]
+    return out
@@ -0,0 +1,118 @@
+"""
+Round-trip time, jitter and clock-offset estimates from timestamped ping/pong.
+
+Both ends of a connection ping each other periodically: GameClient every
+ping_interval seconds, servers through the heartbeat Reaper (heartbeat.py).
+A ping carries the sender's wall clock and the answer adds the answerer's:
+
+    {"type": "ping", "t": T0}  ->  {"type": "pong", "t": T0, "at": T1}
+
+When the pong comes back at T2 (sender's clock again):
+
+    rtt    = T2 - T0
+    offset = T1 - (T0 + T2) / 2     the peer's clock minus ours; exact when
+                                    both legs take equally long
+
+LatencyEstimator smooths the samples the way TCP and RTP do:
+  - srtt / rttvar as TCP's retransmission timer (RFC 6298): gains 1/8 and
+    1/4, so srtt + 4 * rttvar is a sensible timeout;
+  - jitter as RTP's interarrival jitter (RFC 3550): the mean change between
+    consecutive samples, gain 1/16;
+  - offset from the lowest-RTT sample of the last OFFSET_WINDOW, as NTP's
+    clock filter does: the least-queued exchange has the most symmetric legs.
+Peers that answer without "at" (older clients) still give RTT samples.
+"""
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+# RFC 6298 gains
+SRTT_GAIN = 1.0 / 8
+RTTVAR_GAIN = 1.0 / 4
+# RFC 3550 jitter gain
+JITTER_GAIN = 1.0 / 16
+# recent (rtt, offset) samples the offset is picked from
+OFFSET_WINDOW = 8
+# pings still waiting for their pong; older ones count as lost
+MAX_OUTSTANDING = 8
+
+
+def wall_clock() -> float:
+    return round(time.time(), 6)
+
+
+def pong_for(ping: Dict) -> Dict:
+    """The answer to a timestamped ping (without any request id; callers add reply_fields)."""
+    return {"type": "pong", "t": ping.get("t"), "at": wall_clock()}
+
+
+class LatencyEstimator:
+    """Smoothed RTT, jitter and clock offset for one connection, from the pings this end sent."""
+    def __init__(self):
+        self.outstanding: Deque[float] = deque(maxlen=MAX_OUTSTANDING)
+        self.window: Deque[Tuple[float, float]] = deque(maxlen=OFFSET_WINDOW)
+        self.srtt: Optional[float] = None
+        self.rttvar = 0.0
+        self.jitter = 0.0
+        self.min_rtt: Optional[float] = None
+        self.last_rtt: Optional[float] = None
+        self.offset: Optional[float] = None
+        self.pings_sent = 0
+        self.samples = 0
+
+    def ping(self) -> Dict:
+        """A timestamped ping to send; its pong goes to observe_pong()."""
+        t = wall_clock()
+        if len(self.outstanding) == self.outstanding.maxlen:
+            # the oldest one was never answered
+            self.outstanding.popleft()
+        self.outstanding.append(t)
+        self.pings_sent += 1
+        return {"type": "ping", "t": t}
+
+    def observe_pong(self, msg: Dict, now: Optional[float] = None) -> bool:
+        """Take a pong; False if it doesn't answer one of our pings (e.g. an application ping)."""
+        t0 = msg.get("t")
+        if t0 not in self.outstanding:
+            return False
+        # pongs come back in order, so anything sent before this one is lost
+        while self.outstanding and self.outstanding[0] != t0:
+            self.outstanding.popleft()
+        self.outstanding.popleft()
+        t2 = time.time() if now is None else now
+        rtt = t2 - t0
+        if rtt < 0:
+            # the wall clock stepped back; this sample means nothing
+            return True
+        self.add_sample(rtt, msg.get("at"), t0, t2)
+        return True
+
+    def add_sample(self, rtt: float, at: Optional[float] = None, t0: float = 0.0, t2: float = 0.0):
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar += (abs(self.srtt - rtt) - self.rttvar) * RTTVAR_GAIN
+            self.srtt += (rtt - self.srtt) * SRTT_GAIN
+            self.jitter += (abs(rtt - self.last_rtt) - self.jitter) * JITTER_GAIN
+        self.last_rtt = rtt
+        if self.min_rtt is None or rtt < self.min_rtt:
+            self.min_rtt = rtt
+        self.samples += 1
+        if isinstance(at, (int, float)):
+            self.window.append((rtt, at - (t0 + t2) / 2))
+            self.offset = min(self.window)[1]
+
+    def timeout(self) -> Optional[float]:
+        """srtt + 4 * rttvar, as TCP's retransmission timeout (without its 1 s floor)."""
+        return None if self.srtt is None else self.srtt + 4 * self.rttvar
+
+    def stats(self) -> Dict:
+        def ms(v):
+            return None if v is None else round(v * 1000, 2)
+        return {"samples": self.samples, "pings_sent": self.pings_sent,
+                "lost": self.pings_sent - self.samples - len(self.outstanding),
+                "rtt_ms": ms(self.srtt), "rttvar_ms": ms(self.rttvar if self.samples else None),
+                "jitter_ms": ms(self.jitter if self.samples > 1 else None),
+                "min_rtt_ms": ms(self.min_rtt), "last_rtt_ms": ms(self.last_rtt),
+                "clock_offset_ms": ms(self.offset)}
@@ -1,19 +1,24 @@
-from typing import List
+from typing import List, Optional
 from .entities import Mob
 import random
 
+# highest level number there is (Game / the GUI default to this many); the server clamps start_level to it
+MAX_LEVEL = 50
+
 
 class Level:
     def __init__(self, number: int, difficulty: float = 1.0):
         self.number = number
         self.difficulty = difficulty
 
-    def spawn_mobs(self, player_count: int = 1) -> List[Mob]:
+    def spawn_mobs(self, player_count: int = 1, seed: Optional[int] = None) -> List[Mob]:
         """
         Spawn a small group of mobs scaled to the level and number of players.
 
         player_count increases mob HP and attack by a small multiplier so multiplayer
         is more challenging. Example multiplier: 1 + 0.15*(players-1)
+        A seed makes the spawn reproducible (the server caches and replays by seed);
+        without one the global random state is used as before.
         """
         base_count = 3
         count = base_count + (self.number // 3)  # increase mob count slowly
@@ -32,5 +37,6 @@ class Level:
             xp = int(5 * (1 + self.number * 0.1))
             crystals = max(1, int(1 * (1 + self.number * 0.06) * player_multiplier))
             mobs.append(Mob(name=f"Mob_L{self.number}_{i+1}", hp=hp, attack=attack, defense=defense, xp_reward=xp, crystal_drop=crystals))
-        random.shuffle(mobs)
+        rng = random.Random(seed) if seed is not None else random
+        rng.shuffle(mobs)
         return mobs
\ No newline at end of file
@@ -9,7 +9,21 @@ import traceback
 def print_usage():
     print("Usage:")
     print("  python -m dungeon_game.main gui     # start GUI")
+    print("  python -m dungeon_game.main gui --connect HOST:PORT [--room R]  # GUI joined to a server room")
     print("  python -m dungeon_game.main server  # start multiplayer server (simple)")
+    print("  python -m dungeon_game.main server --asyncio [port]  # single-threaded asyncio server")
+    print("  python -m dungeon_game.main server --workers N [port]  # rooms sharded over N processes")
+    print("      add --tick-rate HZ to any server mode to run levels as an authoritative simulation")
+    print("      add --stats-port P to serve runtime metrics as JSON on http://127.0.0.1:P/stats")
+    print("      heartbeats: --ping-interval S, --idle-timeout S, --read-timeout S (0 disables; defaults 5/15/10)")
+    print("      --resume-grace S holds a dropped player's slot for a resume (default 30, 0 disables)")
+    print("      --max-frame BYTES caps client frames (default 16384); --no-rate-limits turns off per-type limits")
+    print("      --journal DIR records each simulated level (needs --tick-rate) for scripts/replay_journal.py")
+    print("      --udp offers clients snapshots over UDP on the same port number (see udp_channel.py)")
+    print("  python -m dungeon_game.main proxy [port] --target HOST:PORT [--profile wifi|mobile|bad|...]")
+    print("      TCP proxy emulating --latency/--jitter MS, --rate-kbit, --loss, --reorder and")
+    print("      --disconnect-every S between clients and a server (see netem.py, proxy --help);")
+    print("      --udp relays the UDP snapshot channel through the same link")
     print("  python -m dungeon_game.demo    # run CLI demo")
 
 if __name__ == "__main__":
@@ -36,10 +50,58 @@ if __name__ == "__main__":
             print(names)
             raise ImportError("'launch_gui' not found in dungeon_game.gui; see available names above")
         # Call the launcher
-        launch_gui()
+        gui_args = sys.argv[2:]
+        gui_opts = {}
+        for opt in ("--connect", "--room"):
+            if opt in gui_args and gui_args.index(opt) + 1 < len(gui_args):
+                gui_opts[opt[2:]] = gui_args[gui_args.index(opt) + 1]
+        launch_gui(**gui_opts)
     elif cmd == "server":
+        args = sys.argv[2:]
+        use_asyncio = "--asyncio" in args
+        workers = 0
+        tick_rate = 0
+        stats_port = 0
+        conn_opts = {}
+        port = 6000
+        i = 0
+        while i < len(args):
+            if args[i] == "--workers" and i + 1 < len(args):
+                workers = int(args[i + 1])
+                i += 1
+            elif args[i] == "--tick-rate" and i + 1 < len(args):
+                tick_rate = int(args[i + 1])
+                i += 1
+            elif args[i] == "--stats-port" and i + 1 < len(args):
+                stats_port = int(args[i + 1])
+                i += 1
+            elif args[i] in ("--ping-interval", "--idle-timeout", "--read-timeout", "--resume-grace") \
+                    and i + 1 < len(args):
+                conn_opts[args[i][2:].replace("-", "_")] = float(args[i + 1])
+                i += 1
+            elif args[i] == "--max-frame" and i + 1 < len(args):
+                conn_opts["max_frame"] = int(args[i + 1])
+                i += 1
+            elif args[i] == "--journal" and i + 1 < len(args):
+                conn_opts["journal_dir"] = args[i + 1]
+                i += 1
+            elif args[i] == "--no-rate-limits":
+                conn_opts["rate_limits"] = None
+            elif args[i] == "--udp":
+                conn_opts["udp"] = True
+            elif args[i].isdigit():
+                port = int(args[i])
+            i += 1
+        if workers:
+            from .sharded_server import run_sharded_server
+            run_sharded_server(port=port, workers=workers, tick_rate=tick_rate, stats_port=stats_port, **conn_opts)
+            sys.exit(0)
+        if use_asyncio:
+            from .aio_server import run_async_server
+            run_async_server(port=port, tick_rate=tick_rate, stats_port=stats_port, **conn_opts)
+            sys.exit(0)
         from .server import start_server
-        start_server()
+        start_server(port=port, tick_rate=tick_rate, stats_port=stats_port, **conn_opts)
         print("Press Ctrl-C to exit server.")
         try:
             import time
@@ -47,6 +109,9 @@ if __name__ == "__main__":
                 time.sleep(1)
         except KeyboardInterrupt:
             print("Server exiting.")
+    elif cmd == "proxy":
+        from .netem import main as netem_main
+        netem_main(sys.argv[2:])
     elif cmd == "demo":
         from .main_cli import main as cli_main
         cli_main()
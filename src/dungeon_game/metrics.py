@@ -0,0 +1,272 @@
+"""
+Runtime metrics for the multiplayer servers.
+
+ServerMetrics keeps cheap counters (connections, frames and bytes in / out,
+messages, errors and rejected frames per type) and fixed-bucket latency
+histograms (message handling per type, broadcasts, simulation ticks), plus
+gauges read off the live connections (outbound queue depth, and RTT / jitter /
+clock offset from each connection's heartbeat pings, see latency.py) and the
+bytes and CPU time of frame compression (compression.py).
+Recording is a few integer adds and, for timings, a bisect into ~24 buckets,
+so it stays on in production. Hot-path updates take no lock: under the GIL an
+increment is only lost if a thread switch lands inside a single `+=`, which is
+rare enough for monitoring counters. Creating tables and the connection set
+use the lock.
+
+snapshot() turns everything into a JSON-able dict; servers return it for an
+admin {"type":"stats"} message and, optionally, from a small HTTP endpoint
+on localhost (serve_stats_http). Any client may send the message, so its
+reply is taken with per_client=False: aggregates only, no client ids.
+"""
+import asyncio
+import bisect
+import json
+import threading
+import time
+import weakref
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional
+
+# histogram bucket upper bounds in seconds: 1us, 2us, 4us ... ~8.4s
+BUCKET_BOUNDS = tuple((1 << k) / 1e6 for k in range(24))
+# connections listed by name in latency_stats(), highest RTT first
+SLOWEST_LISTED = 5
+
+
+class Histogram:
+    """Log2-bucketed latency histogram; quantiles are reported as bucket upper bounds (capped at max)."""
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank and c:
+                return min(BUCKET_BOUNDS[i], self.max) if i < len(BUCKET_BOUNDS) else self.max
+        return self.max
+
+    def snapshot(self) -> Dict:
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count * 1000, 4) if self.count else 0.0,
+            "p50_ms": round(self.quantile(0.50) * 1000, 4),
+            "p90_ms": round(self.quantile(0.90) * 1000, 4),
+            "p99_ms": round(self.quantile(0.99) * 1000, 4),
+            "max_ms": round(self.max * 1000, 4),
+        }
+
+
+class ServerMetrics:
+    """
+    Counters and histograms for one server process (the sharded front end and
+    each room worker have their own). Message types are bucketed by the caller
+    (server.MESSAGE_TYPES), so clients can't grow the tables without bound.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.connections_opened = 0
+        self.connections_closed = 0
+        # connections dropped by the heartbeat reaper, per reason (idle / read_timeout)
+        self.reaped: Counter = Counter()
+        self.pings_sent = 0
+        self.frames_in = 0
+        self.bytes_in = 0
+        self.decode_errors = 0
+        self.frames_out = 0
+        self.bytes_out = 0
+        self.errors: Counter = Counter()
+        # client frames refused before handling: "oversize", "rate:<type>"
+        self.rejected: Counter = Counter()
+        self.handle_time: Dict[str, Histogram] = {}
+        self.timings: Dict[str, Histogram] = {}
+        # frames compressed by connection writers (compression.py): count, bytes before / after, seconds
+        self.compression = [0, 0, 0, 0.0]
+        # live connections, for outbound queue depth gauges
+        self.connections = weakref.WeakSet()
+        # event loop of the asyncio servers, for task counts
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def connection_opened(self, conn):
+        with self.lock:
+            self.connections_opened += 1
+            self.connections.add(conn)
+
+    def connection_closed(self, conn):
+        with self.lock:
+            self.connections_closed += 1
+            self.connections.discard(conn)
+
+    def connection_reaped(self, reason: str):
+        with self.lock:
+            self.reaped[reason] += 1
+
+    def live_connections(self) -> list:
+        with self.lock:
+            return list(self.connections)
+
+    def frame_in(self, nbytes: int, decoded: bool = True):
+        self.frames_in += 1
+        self.bytes_in += nbytes
+        if not decoded:
+            self.decode_errors += 1
+
+    def frame_rejected(self, kind: str):
+        self.rejected[kind] += 1
+
+    def frames_sent(self, frames: int, nbytes: int):
+        self.frames_out += frames
+        self.bytes_out += nbytes
+
+    def observe_message(self, mtype: str, seconds: float):
+        """Count one handled message of mtype and how long handling took."""
+        hist = self.handle_time.get(mtype)
+        if hist is None:
+            with self.lock:
+                hist = self.handle_time.setdefault(mtype, Histogram())
+        hist.observe(seconds)
+
+    def observe_compression(self, raw: int, wire: int, seconds: float):
+        c = self.compression
+        c[0] += 1
+        c[1] += raw
+        c[2] += wire
+        c[3] += seconds
+
+    def observe_error(self, kind: str):
+        with self.lock:
+            self.errors[kind] += 1
+
+    def observe(self, name: str, seconds: float):
+        """Record a named timing (broadcast, sim_tick, ...)."""
+        hist = self.timings.get(name)
+        if hist is None:
+            with self.lock:
+                hist = self.timings.setdefault(name, Histogram())
+        hist.observe(seconds)
+
+    def queue_stats(self) -> Dict:
+        depths = []
+        dropped = 0
+        overflowed = 0
+        for conn in self.live_connections():
+            q = getattr(conn, "outbound", None)
+            if q is None:
+                continue
+            s = q.stats()
+            depths.append(s["depth"])
+            dropped += s["dropped"]
+            overflowed += 1 if s["overflowed"] else 0
+        return {"total_depth": sum(depths), "max_depth": max(depths, default=0),
+                "dropped": dropped, "overflowed": overflowed}
+
+    def latency_stats(self, per_client: bool = True) -> Dict:
+        """RTT / jitter / clock offset of the live connections that answered a ping; per_client adds the slowest."""
+        measured = []
+        for conn in self.live_connections():
+            est = getattr(conn, "latency", None)
+            if est is not None and est.srtt is not None:
+                measured.append((est.srtt, getattr(conn, "client_id", None), est))
+        if not measured:
+            return {"measured": 0}
+        measured.sort(key=lambda m: m[0])
+        rtts = [m[0] for m in measured]
+        jitters = [est.jitter for _, _, est in measured]
+        offsets = [est.offset for _, _, est in measured if est.offset is not None]
+
+        def ms(v):
+            return round(v * 1000, 2)
+        out = {"measured": len(measured),
+               "rtt_ms": {"mean": ms(sum(rtts) / len(rtts)), "p50": ms(rtts[len(rtts) // 2]),
+                          "p99": ms(rtts[min(len(rtts) - 1, int(len(rtts) * 0.99))]), "max": ms(rtts[-1])},
+               "jitter_ms": {"mean": ms(sum(jitters) / len(jitters)), "max": ms(max(jitters))}}
+        if per_client:
+            out["slowest"] = [{"client_id": cid, **est.stats()} for _, cid, est in measured[:-SLOWEST_LISTED - 1:-1]]
+        if offsets:
+            out["clock_offset_ms"] = {"min": ms(min(offsets)), "max": ms(max(offsets))}
+        return out
+
+    def task_count(self) -> Optional[int]:
+        if self.loop is None:
+            return None
+        try:
+            return len(asyncio.all_tasks(self.loop))
+        except RuntimeError:
+            # the loop's task set changed while another thread was counting it
+            return None
+
+    def snapshot(self, rooms=None, per_client: bool = True) -> Dict:
+        with self.lock:
+            handle_time = dict(self.handle_time)
+            timings = dict(self.timings)
+            out = {
+                "uptime_s": round(time.time() - self.started, 1),
+                "connections": {"open": self.connections_opened - self.connections_closed,
+                                "opened": self.connections_opened, "closed": self.connections_closed,
+                                "reaped": sum(self.reaped.values()), "reaped_by": dict(self.reaped),
+                                "pings_sent": self.pings_sent},
+                "traffic": {"frames_in": self.frames_in, "bytes_in": self.bytes_in,
+                            "decode_errors": self.decode_errors,
+                            "frames_out": self.frames_out, "bytes_out": self.bytes_out},
+                "errors": dict(self.errors),
+                "rejected": dict(self.rejected),
+            }
+        out["messages"] = {k: h.count for k, h in handle_time.items()}
+        out["handle_time"] = {k: h.snapshot() for k, h in handle_time.items()}
+        out["timings"] = {k: h.snapshot() for k, h in timings.items()}
+        out["queues"] = self.queue_stats()
+        out["latency"] = self.latency_stats(per_client)
+        frames, raw, wire, seconds = self.compression
+        out["compression"] = {"frames": frames, "raw_bytes": raw, "wire_bytes": wire,
+                              "ratio": round(raw / wire, 3) if wire else None,
+                              "cpu_ms": round(seconds * 1000, 3),
+                              "us_per_frame": round(seconds / frames * 1e6, 2) if frames else None}
+        out["threads"] = threading.active_count()
+        out["tasks"] = self.task_count()
+        if rooms is not None:
+            out["rooms"] = rooms.stats()
+        return out
+
+
+def serve_stats_http(get_stats: Callable[[], Dict], port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve GET /stats (JSON from get_stats) on a daemon thread; binds to localhost by default."""
+    class StatsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") not in ("", "/stats"):
+                self.send_error(404)
+                return
+            try:
+                body = json.dumps(get_stats()).encode("utf-8")
+            except Exception as e:
+                self.send_error(500, str(e))
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    httpd = ThreadingHTTPServer((host, port), StatsHandler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True, name="stats-http").start()
+    return httpd
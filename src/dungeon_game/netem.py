@@ -0,0 +1,662 @@
+"""
+Network-condition emulator: a TCP proxy that puts a bad link between
+clients and a server, so netcode can be tested and benchmarked on one box.
+
+    python -m dungeon_game.main proxy 7000 --target 127.0.0.1:6000 --profile wifi
+    python -m dungeon_game.main proxy 7000 --target 127.0.0.1:6000 --latency 80 --jitter 30 --loss 0.02
+
+Clients connect to the proxy's port instead of the server's. Every byte
+read from one side is cut into SEGMENT-sized segments, and each segment is
+given a delivery time by that direction's Shaper (per connection):
+
+  - bandwidth: segments leave one after another at the link rate, and the
+    reader stops reading once queue_bytes are waiting, so a slow link pushes
+    back into the sender's socket as a real one would;
+  - latency + a uniform 0..jitter extra per segment;
+  - loss: the segment arrives one retransmission timeout late;
+  - reorder: the segment arrives reorder_delay late.
+
+A TCP receiver never hands bytes to the application out of order, so a lost
+or reordered segment also holds back everything behind it (head-of-line
+blocking): over TCP both show up as delay spikes, which is exactly what the
+client sees on such a link. The proxy terminates TCP on both sides, so the
+endpoints' own TCP (Nagle, retransmits, congestion window) runs over
+loopback; what is emulated is when the bytes arrive.
+
+With udp=True (--udp) the proxy also relays UDP datagrams arriving on the
+same port number to the target's, one upstream socket per client address,
+for the game's snapshot channel (udp_channel.py). Datagrams go through their
+own Shapers with the same profiles, but as UDP goes: a lost datagram is
+gone, a reordered or jittered one simply arrives later than the ones behind
+it, and one that would overflow queue_bytes is dropped.
+
+Connections can also be cut, either at random (disconnect_every, mean
+seconds per connection) or all at once with cut(), optionally refusing new
+connections for a blackout period afterwards.
+
+NetemProxy runs on an asyncio loop (start(), or run_proxy() to block),
+or start_proxy() on a background thread for scripts that drive threaded
+clients (scripts/bench_netem.py). stats() has byte and segment counts and
+the added delay per direction; with log_interval the proxy prints a
+throughput line every so often. Delays are as precise as the event loop's
+timers, about a millisecond per direction.
+"""
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+# bytes per emulated segment (an Ethernet MSS with TCP timestamps)
+SEGMENT = 1448
+# bytes a direction holds before it stops reading from the sender
+DEFAULT_QUEUE_BYTES = 256 * 1024
+# Linux's minimum TCP retransmission timeout
+MIN_RTO = 0.2
+READ_SIZE = 64 * 1024
+# open connections listed individually in stats()
+LISTED_CONNECTIONS = 20
+# a UDP client address unheard from for this long has its upstream socket closed
+UDP_FLOW_IDLE = 60.0
+
+# name -> LinkProfile arguments (seconds, bytes per second), per direction
+PROFILES: Dict[str, Dict] = {
+    "lan": {"latency": 0.0005, "jitter": 0.0002},
+    "broadband": {"latency": 0.015, "jitter": 0.003, "bandwidth": 2_500_000, "loss": 0.001},
+    "wifi": {"latency": 0.025, "jitter": 0.015, "bandwidth": 1_250_000, "loss": 0.005, "reorder": 0.002},
+    "mobile": {"latency": 0.06, "jitter": 0.03, "bandwidth": 250_000, "loss": 0.01, "reorder": 0.01},
+    "bad": {"latency": 0.15, "jitter": 0.08, "bandwidth": 64_000, "loss": 0.03, "reorder": 0.02},
+}
+
+
+class LinkProfile:
+    """How one direction of the emulated link treats the bytes crossing it (seconds, bytes/s; 0 = off)."""
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, bandwidth: float = 0.0, loss: float = 0.0,
+                 reorder: float = 0.0, reorder_delay: Optional[float] = None,
+                 queue_bytes: int = DEFAULT_QUEUE_BYTES):
+        self.latency = latency
+        self.jitter = jitter
+        self.bandwidth = bandwidth
+        self.loss = loss
+        self.reorder = reorder
+        # how late a reordered segment is; by default about one more trip
+        self.reorder_delay = reorder_delay if reorder_delay is not None else latency + jitter
+        self.queue_bytes = queue_bytes
+
+    @classmethod
+    def named(cls, name: str, **overrides) -> "LinkProfile":
+        if name not in PROFILES:
+            raise ValueError(f"unknown link profile {name!r}")
+        return cls(**dict(PROFILES[name], **overrides))
+
+    def rto(self) -> float:
+        """Retransmission timeout for a lost segment: srtt + 4 * rttvar, at least MIN_RTO."""
+        return max(MIN_RTO, 2 * self.latency + 4 * self.jitter)
+
+    def describe(self) -> Dict:
+        return {"latency_ms": round(self.latency * 1000, 2), "jitter_ms": round(self.jitter * 1000, 2),
+                "bandwidth_kbit": round(self.bandwidth * 8 / 1000) if self.bandwidth else None,
+                "loss": self.loss, "reorder": self.reorder}
+
+
+class Shaper:
+    """One direction of one connection: when each segment that enters it comes out."""
+    def __init__(self, profile: LinkProfile, rng: random.Random):
+        self.profile = profile
+        self.rng = rng
+        # when the emulated wire has finished sending what it was given
+        self.free_at = 0.0
+        # delivery time of the previous segment; TCP delivers in order
+        self.last = 0.0
+
+    def schedule(self, size: int, now: float, counters: "DirectionStats") -> float:
+        p = self.profile
+        rng = self.rng
+        sent = now
+        if p.bandwidth:
+            sent = max(now, self.free_at) + size / p.bandwidth
+            self.free_at = sent
+        at = sent + p.latency
+        if p.jitter:
+            at += rng.uniform(0, p.jitter)
+        if p.loss and rng.random() < p.loss:
+            at += p.rto()
+            counters.lost += 1
+        elif p.reorder and rng.random() < p.reorder:
+            at += p.reorder_delay
+            counters.reordered += 1
+        if at < self.last:
+            at = self.last
+        self.last = at
+        counters.observe_delay(at - now)
+        return at
+
+    def datagram(self, size: int, now: float, counters: "DirectionStats") -> Optional[float]:
+        """Delivery time of one datagram, or None if the link drops it (lost, or the queue is full)."""
+        p = self.profile
+        rng = self.rng
+        if (p.loss and rng.random() < p.loss) or (p.bandwidth and counters.queued + size > p.queue_bytes):
+            counters.lost += 1
+            return None
+        sent = now
+        if p.bandwidth:
+            sent = max(now, self.free_at) + size / p.bandwidth
+            self.free_at = sent
+        at = sent + p.latency
+        if p.jitter:
+            at += rng.uniform(0, p.jitter)
+        if p.reorder and rng.random() < p.reorder:
+            at += p.reorder_delay
+            counters.reordered += 1
+        counters.observe_delay(at - now)
+        return at
+
+
+class DirectionStats:
+    __slots__ = ("bytes_in", "bytes_out", "segments", "lost", "reordered", "delay_sum", "delay_max", "queued")
+
+    def __init__(self):
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.segments = 0
+        self.lost = 0
+        self.reordered = 0
+        self.delay_sum = 0.0
+        self.delay_max = 0.0
+        # bytes read but not yet delivered
+        self.queued = 0
+
+    def observe_delay(self, delay: float):
+        self.delay_sum += delay
+        if delay > self.delay_max:
+            self.delay_max = delay
+
+    def add(self, other: "DirectionStats"):
+        for name in self.__slots__:
+            if name == "delay_max":
+                self.delay_max = max(self.delay_max, other.delay_max)
+            else:
+                setattr(self, name, getattr(self, name) + getattr(other, name))
+
+    def as_dict(self) -> Dict:
+        return {"bytes_in": self.bytes_in, "bytes_out": self.bytes_out, "queued": self.queued,
+                "segments": self.segments, "lost": self.lost, "reordered": self.reordered,
+                "delay_ms_mean": round(self.delay_sum / self.segments * 1000, 2) if self.segments else None,
+                "delay_ms_max": round(self.delay_max * 1000, 2)}
+
+
+class _ProxyConnection:
+    __slots__ = ("cid", "peer", "opened", "up", "down", "shapers", "writers", "tasks", "cut")
+
+    def __init__(self, cid: int, peer, opened: float, shapers: Tuple[Shaper, Shaper]):
+        self.cid = cid
+        self.peer = peer
+        self.opened = opened
+        self.up = DirectionStats()
+        self.down = DirectionStats()
+        # (up, down)
+        self.shapers = shapers
+        self.writers: List[asyncio.StreamWriter] = []
+        self.tasks: List[asyncio.Task] = []
+        self.cut = False
+
+
+class _UdpFlow(asyncio.DatagramProtocol):
+    """One client address's datagrams; also the protocol of its upstream socket to the target."""
+    def __init__(self, proxy: "NetemProxy", addr):
+        self.proxy = proxy
+        self.addr = addr
+        self.up = DirectionStats()
+        self.down = DirectionStats()
+        self.shapers = (Shaper(proxy.up, proxy.rng), Shaper(proxy.down, proxy.rng))
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        # datagrams from the client while the upstream socket is being opened
+        self.waiting: List[bytes] = []
+        self.last_active = 0.0
+
+    def connection_made(self, transport):
+        self.transport = transport
+        for data in self.waiting:
+            self.proxy._udp_shape(self, data, True)
+        self.waiting = []
+
+    def datagram_received(self, data: bytes, addr):
+        self.proxy._udp_shape(self, data, False)
+
+
+class _UdpListener(asyncio.DatagramProtocol):
+    def __init__(self, proxy: "NetemProxy"):
+        self.proxy = proxy
+
+    def datagram_received(self, data: bytes, addr):
+        self.proxy._udp_from_client(data, addr)
+
+
+class NetemProxy:
+    """TCP proxy from listen_port to target with emulated link conditions per direction."""
+    def __init__(self, target_host: str, target_port: int, down: Optional[LinkProfile] = None,
+                 up: Optional[LinkProfile] = None, host: str = "127.0.0.1", listen_port: int = 0,
+                 disconnect_every: float = 0.0, blackout: float = 0.0, seed: Optional[int] = None,
+                 log_interval: float = 0.0, udp: bool = False):
+        self.target_host = target_host
+        self.target_port = target_port
+        # down: server -> client, up: client -> server
+        self.down = down if down is not None else LinkProfile()
+        self.up = up if up is not None else self.down
+        self.host = host
+        self.port = listen_port
+        self.disconnect_every = disconnect_every
+        self.blackout = blackout
+        self.rng = random.Random(seed)
+        self.log_interval = log_interval
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.connections: Dict[int, _ProxyConnection] = {}
+        self.blackout_until = 0.0
+        self.started = time.time()
+        self._next_cid = 0
+        self._thread: Optional[threading.Thread] = None
+        self._log_task: Optional[asyncio.Future] = None
+        self._handlers = set()
+        # totals, including closed connections
+        self.accepted = 0
+        self.refused = 0
+        self.failed = 0
+        self.disconnects = 0
+        self.closed_up = DirectionStats()
+        self.closed_down = DirectionStats()
+        # UDP relay on the same port number
+        self.udp = udp
+        self.udp_transport: Optional[asyncio.DatagramTransport] = None
+        self.udp_flows: Dict[Tuple, _UdpFlow] = {}
+        self.closed_udp_up = DirectionStats()
+        self.closed_udp_down = DirectionStats()
+
+    async def start(self) -> "NetemProxy":
+        self.loop = asyncio.get_running_loop()
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        if self.udp:
+            self.udp_transport, _ = await self.loop.create_datagram_endpoint(
+                lambda: _UdpListener(self), local_addr=(self.host, self.port))
+        self.started = time.time()
+        if self.log_interval:
+            self._log_task = asyncio.ensure_future(self._log_loop())
+        return self
+
+    def set_profiles(self, down: LinkProfile, up: Optional[LinkProfile] = None):
+        """Change the link for new and existing connections (e.g. degrade it mid-run)."""
+        self.down = down
+        self.up = up if up is not None else down
+        for conn in list(self.connections.values()) + list(self.udp_flows.values()):
+            conn.shapers[0].profile = self.up
+            conn.shapers[1].profile = self.down
+
+    async def _handle(self, creader: asyncio.StreamReader, cwriter: asyncio.StreamWriter):
+        loop = self.loop
+        if loop.time() < self.blackout_until:
+            self.refused += 1
+            cwriter.transport.abort()
+            return
+        me = asyncio.current_task()
+        self._handlers.add(me)
+        try:
+            await self._proxy(creader, cwriter)
+        finally:
+            self._handlers.discard(me)
+
+    async def _proxy(self, creader: asyncio.StreamReader, cwriter: asyncio.StreamWriter):
+        try:
+            sreader, swriter = await asyncio.open_connection(self.target_host, self.target_port)
+        except OSError:
+            self.failed += 1
+            cwriter.transport.abort()
+            return
+        self.accepted += 1
+        self._next_cid += 1
+        conn = _ProxyConnection(self._next_cid, cwriter.get_extra_info("peername"), time.time(),
+                                (Shaper(self.up, self.rng), Shaper(self.down, self.rng)))
+        conn.writers = [cwriter, swriter]
+        conn.tasks = [asyncio.ensure_future(self._relay(creader, swriter, conn.shapers[0], conn.up)),
+                      asyncio.ensure_future(self._relay(sreader, cwriter, conn.shapers[1], conn.down))]
+        self.connections[conn.cid] = conn
+        timer = None
+        if self.disconnect_every:
+            timer = asyncio.ensure_future(self._disconnect_later(conn, self.rng.expovariate(1.0 / self.disconnect_every)))
+        try:
+            # both directions finished (FIN passed on both ways), or one failed / was cut
+            done, _ = await asyncio.wait(conn.tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                if not task.cancelled():
+                    task.exception()
+        finally:
+            if timer is not None:
+                timer.cancel()
+            for task in conn.tasks:
+                task.cancel()
+            for w in conn.writers:
+                w.transport.abort()
+            del self.connections[conn.cid]
+            # whatever was still queued is gone with the connection
+            conn.up.queued = conn.down.queued = 0
+            self.closed_up.add(conn.up)
+            self.closed_down.add(conn.down)
+
+    async def _relay(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, shaper: Shaper,
+                     counters: DirectionStats):
+        """Copy reader to writer through shaper; ends when the reader does and everything is delivered."""
+        loop = self.loop
+        queue: Deque[Tuple[float, Optional[bytes]]] = deque()
+        ready = asyncio.Event()
+        room = asyncio.Event()
+        room.set()
+
+        async def deliver():
+            while True:
+                while not queue:
+                    ready.clear()
+                    await ready.wait()
+                at, data = queue[0]
+                delay = at - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                now = loop.time()
+                out = []
+                while queue and queue[0][0] <= now and queue[0][1] is not None:
+                    out.append(queue.popleft()[1])
+                if out:
+                    chunk = b"".join(out)
+                    writer.write(chunk)
+                    await writer.drain()
+                    counters.bytes_out += len(chunk)
+                    counters.queued -= len(chunk)
+                    if counters.queued <= shaper.profile.queue_bytes:
+                        room.set()
+                elif queue and queue[0][1] is None:
+                    # the sender closed its side: pass the FIN on once the data before it is through
+                    if writer.can_write_eof():
+                        writer.write_eof()
+                    return
+
+        sender = asyncio.ensure_future(deliver())
+        try:
+            while True:
+                data = await reader.read(READ_SIZE)
+                now = loop.time()
+                if not data:
+                    queue.append((shaper.last, None))
+                    ready.set()
+                    break
+                counters.bytes_in += len(data)
+                counters.queued += len(data)
+                for i in range(0, len(data), SEGMENT):
+                    seg = data[i:i + SEGMENT]
+                    queue.append((shaper.schedule(len(seg), now, counters), seg))
+                    counters.segments += 1
+                ready.set()
+                if counters.queued > shaper.profile.queue_bytes:
+                    room.clear()
+                    await room.wait()
+            await sender
+        finally:
+            sender.cancel()
+
+    def _udp_from_client(self, data: bytes, addr):
+        now = self.loop.time()
+        flow = self.udp_flows.get(addr)
+        if flow is None:
+            self._expire_flows(now)
+            flow = self.udp_flows[addr] = _UdpFlow(self, addr)
+            asyncio.ensure_future(self._open_flow(flow))
+        flow.last_active = now
+        if flow.transport is None:
+            flow.waiting.append(data)
+        else:
+            self._udp_shape(flow, data, True)
+
+    async def _open_flow(self, flow: _UdpFlow):
+        try:
+            await self.loop.create_datagram_endpoint(lambda: flow, remote_addr=(self.target_host, self.target_port))
+        except OSError:
+            self.failed += 1
+            self.udp_flows.pop(flow.addr, None)
+
+    def _udp_shape(self, flow: _UdpFlow, data: bytes, upstream: bool):
+        counters = flow.up if upstream else flow.down
+        counters.bytes_in += len(data)
+        counters.segments += 1
+        now = self.loop.time()
+        if now < self.blackout_until:
+            # the link is down
+            counters.lost += 1
+            return
+        at = flow.shapers[0 if upstream else 1].datagram(len(data), now, counters)
+        if at is None:
+            return
+        counters.queued += len(data)
+        self.loop.call_at(at, self._udp_deliver, flow, data, upstream)
+
+    def _udp_deliver(self, flow: _UdpFlow, data: bytes, upstream: bool):
+        counters = flow.up if upstream else flow.down
+        counters.queued -= len(data)
+        transport = flow.transport if upstream else self.udp_transport
+        if transport is None or transport.is_closing():
+            return
+        if upstream:
+            transport.sendto(data)
+        else:
+            transport.sendto(data, flow.addr)
+        counters.bytes_out += len(data)
+
+    def _close_flow(self, flow: _UdpFlow):
+        self.udp_flows.pop(flow.addr, None)
+        if flow.transport is not None:
+            flow.transport.close()
+        flow.up.queued = flow.down.queued = 0
+        self.closed_udp_up.add(flow.up)
+        self.closed_udp_down.add(flow.down)
+
+    def _expire_flows(self, now: float):
+        for flow in [f for f in self.udp_flows.values() if now - f.last_active > UDP_FLOW_IDLE]:
+            self._close_flow(flow)
+
+    async def _disconnect_later(self, conn: _ProxyConnection, after: float):
+        await asyncio.sleep(after)
+        self._cut_connection(conn)
+        if self.blackout:
+            self.blackout_until = self.loop.time() + self.blackout
+
+    def _cut_connection(self, conn: _ProxyConnection, count: bool = True):
+        if conn.cut:
+            return
+        conn.cut = True
+        if count:
+            self.disconnects += 1
+        for w in conn.writers:
+            w.transport.abort()
+        for task in conn.tasks:
+            task.cancel()
+
+    def _cut_all(self, blackout: float):
+        self.blackout_until = self.loop.time() + blackout
+        for conn in list(self.connections.values()):
+            self._cut_connection(conn)
+
+    def cut(self, blackout: float = 0.0):
+        """Drop every connection now and refuse new ones for blackout seconds (safe from any thread)."""
+        if self._thread is not None and threading.current_thread() is not self._thread:
+            self.loop.call_soon_threadsafe(self._cut_all, blackout)
+        else:
+            self._cut_all(blackout)
+
+    def stats(self) -> Dict:
+        up, down = DirectionStats(), DirectionStats()
+        up.add(self.closed_up)
+        down.add(self.closed_down)
+        conns = list(self.connections.values())
+        for conn in conns:
+            up.add(conn.up)
+            down.add(conn.down)
+        now = time.time()
+        listed = [{"id": c.cid, "peer": f"{c.peer[0]}:{c.peer[1]}" if c.peer else None,
+                   "age_s": round(now - c.opened, 1), "down_bytes": c.down.bytes_out, "up_bytes": c.up.bytes_out,
+                   "down_delay_ms_mean": c.down.as_dict()["delay_ms_mean"]}
+                  for c in conns[:LISTED_CONNECTIONS]]
+        out = {"uptime_s": round(time.time() - self.started, 1), "target": f"{self.target_host}:{self.target_port}",
+               "down_profile": self.down.describe(), "up_profile": self.up.describe(),
+               "connections": len(self.connections), "accepted": self.accepted, "refused": self.refused,
+               "failed": self.failed, "disconnects": self.disconnects,
+               "down": down.as_dict(), "up": up.as_dict(), "open": listed}
+        if self.udp:
+            # segments here are datagrams, and lost ones were dropped
+            up, down = DirectionStats(), DirectionStats()
+            up.add(self.closed_udp_up)
+            down.add(self.closed_udp_down)
+            for flow in list(self.udp_flows.values()):
+                up.add(flow.up)
+                down.add(flow.down)
+            out["udp"] = {"flows": len(self.udp_flows), "down": down.as_dict(), "up": up.as_dict()}
+        return out
+
+    async def _log_loop(self):
+        prev = self.stats()
+        while True:
+            await asyncio.sleep(self.log_interval)
+            cur = self.stats()
+
+            def rate(direction):
+                return (cur[direction]["bytes_out"] - prev[direction]["bytes_out"]) / self.log_interval / 1024
+            print(f"[netem] conns {cur['connections']:>4}  down {rate('down'):8.1f} KB/s  up {rate('up'):7.1f} KB/s  "
+                  f"queued {cur['down']['queued'] // 1024:>5} KB  lost {cur['down']['lost'] + cur['up']['lost']:>5}  "
+                  f"reordered {cur['down']['reordered'] + cur['up']['reordered']:>5}  "
+                  f"delay ms {cur['down']['delay_ms_mean']!s:>7}  disconnects {cur['disconnects']}", flush=True)
+            prev = cur
+
+    async def aclose(self):
+        if self.server is not None:
+            self.server.close()
+        if self._log_task is not None:
+            self._log_task.cancel()
+        for conn in list(self.connections.values()):
+            self._cut_connection(conn, count=False)
+        for flow in list(self.udp_flows.values()):
+            self._close_flow(flow)
+        if self.udp_transport is not None:
+            self.udp_transport.close()
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+
+    def close(self):
+        """Stop a proxy started with start_proxy()."""
+        if self._thread is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.aclose(), self.loop).result(5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(5)
+        self._thread = None
+
+
+def start_proxy(target_host: str, target_port: int, down: Optional[LinkProfile] = None,
+                up: Optional[LinkProfile] = None, **kwargs) -> NetemProxy:
+    """A NetemProxy on its own event loop thread; proxy.port is where clients connect."""
+    proxy = NetemProxy(target_host, target_port, down, up, **kwargs)
+    started = threading.Event()
+    errors = []
+
+    def _run():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(proxy.start())
+        except Exception as exc:
+            errors.append(exc)
+            started.set()
+            return
+        started.set()
+        try:
+            loop.run_forever()
+            # as asyncio.run() does: let cancelled relays and timers finish before the loop goes
+            pending = asyncio.all_tasks(loop)
+            for task in pending:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        finally:
+            loop.close()
+    proxy._thread = threading.Thread(target=_run, name="netem-proxy", daemon=True)
+    proxy._thread.start()
+    started.wait(5)
+    if errors:
+        raise errors[0]
+    return proxy
+
+
+def run_proxy(proxy: NetemProxy):
+    """Blocking entry point used by `python -m dungeon_game.main proxy`."""
+    async def _main():
+        await proxy.start()
+        print(f"netem proxy on {proxy.host}:{proxy.port}{' (tcp+udp)' if proxy.udp else ''} -> "
+              f"{proxy.target_host}:{proxy.target_port}  "
+              f"down {json.dumps(proxy.down.describe())}  up {json.dumps(proxy.up.describe())}", flush=True)
+        try:
+            await proxy.server.serve_forever()
+        finally:
+            # close the proxied connections before asyncio.run() cancels their handlers
+            await proxy.aclose()
+    try:
+        asyncio.run(_main())
+    except KeyboardInterrupt:
+        print(json.dumps(proxy.stats(), indent=2))
+
+
+def profile_fields(args) -> Dict:
+    """LinkProfile arguments from the --profile preset and any explicit flags (ms and kbit/s on the command line)."""
+    fields = dict(PROFILES[args.profile]) if args.profile else {}
+    if args.latency is not None:
+        fields["latency"] = args.latency / 1000.0
+    if args.jitter is not None:
+        fields["jitter"] = args.jitter / 1000.0
+    if args.rate_kbit is not None:
+        fields["bandwidth"] = args.rate_kbit * 1000 / 8.0
+    for name in ("loss", "reorder"):
+        if getattr(args, name) is not None:
+            fields[name] = getattr(args, name)
+    return fields
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m dungeon_game.main proxy",
+                                 description="TCP proxy emulating latency, jitter, bandwidth, loss, reordering "
+                                             "and disconnects between clients and a server.")
+    ap.add_argument("port", type=int, nargs="?", default=7000, help="port clients connect to")
+    ap.add_argument("--target", default="127.0.0.1:6000", help="server HOST:PORT")
+    ap.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    ap.add_argument("--profile", choices=list(PROFILES), help="preset link; the flags below override it")
+    ap.add_argument("--latency", type=float, help="one-way latency in ms, each direction")
+    ap.add_argument("--jitter", type=float, help="extra one-way delay, uniform 0..J ms")
+    ap.add_argument("--rate-kbit", type=float, help="bandwidth cap per direction in kbit/s")
+    ap.add_argument("--loss", type=float, help="share of segments lost (delivered one RTO late)")
+    ap.add_argument("--reorder", type=float, help="share of segments reordered (held back)")
+    ap.add_argument("--up-latency", type=float, help="client -> server latency in ms if different")
+    ap.add_argument("--up-rate-kbit", type=float, help="client -> server bandwidth if different")
+    ap.add_argument("--disconnect-every", type=float, default=0.0, help="cut each connection after ~S seconds (mean)")
+    ap.add_argument("--blackout", type=float, default=0.0, help="refuse connections for S seconds after a cut")
+    ap.add_argument("--udp", action="store_true", help="relay UDP datagrams on the same port too (udp_channel.py)")
+    ap.add_argument("--log-interval", type=float, default=5.0, help="seconds between throughput lines (0: quiet)")
+    ap.add_argument("--seed", type=int)
+    args = ap.parse_args(argv)
+
+    host, _, port = args.target.rpartition(":")
+    fields = profile_fields(args)
+    down = LinkProfile(**fields)
+    up = None
+    if args.up_latency is not None or args.up_rate_kbit is not None:
+        if args.up_latency is not None:
+            fields["latency"] = args.up_latency / 1000.0
+        if args.up_rate_kbit is not None:
+            fields["bandwidth"] = args.up_rate_kbit * 1000 / 8.0
+        up = LinkProfile(**fields)
+    run_proxy(NetemProxy(host or "127.0.0.1", int(port), down, up, host=args.host, listen_port=args.port,
+                         disconnect_every=args.disconnect_every, blackout=args.blackout, seed=args.seed,
+                         log_interval=args.log_interval, udp=args.udp))
@@ -1,66 +1,437 @@
+import random
 import socket
-import json
 import threading
-from typing import Callable, Optional
+import time
+from typing import Callable, Dict, List, Optional, Tuple
 
+from .protocol import FrameDecoder, encode_frame, decode_frame, JSON_CODEC, CODECS
+from .latency import LatencyEstimator, pong_for
+from .compression import ZLIB
+from .udp_channel import UdpClient, SEQ_MOD
 
-# Simple newline-delimited JSON protocol
+# with batch_frames these wait for the per-frame flush(); anything else is sent right away
+FRAME_BATCHED = ("input", "ack")
+# ...unless this many messages are already waiting
+MAX_BATCH = 64
+# a link that takes nothing for this long loses the oldest queued messages (like outbound.DROP_OLDEST)
+MAX_QUEUED = 1024
+# seconds between the client's own timestamped pings (RTT / clock offset, see latency.py)
+DEFAULT_PING_INTERVAL = 2.0
+# after a level_started, UDP snapshots are held back this long at most while the server's udp_level is on its way
+LEVEL_FENCE_SECONDS = 1.0
+
+
+def _collapse_key(payload: Dict) -> Optional[str]:
+    """Queued messages with the same key are superseded by a newer one; None never collapses."""
+    mtype = payload.get("type")
+    if mtype == "ack":
+        return "ack"
+    if mtype == "input" and not payload.get("melee") and payload.get("fire") is None and "seq" not in payload:
+        # movement is held until the next input, so only the latest matters; fire/melee are one-shot, and
+        # a seq'd input is one predicted step (prediction.py) the server has to apply for reconcile to match
+        return "move"
+    return None
+
+
+# Newline-delimited JSON protocol; pass codec="binary" to ask for the compact codec at join,
+# and compress=True to have the server zlib-compress large frames (compression.py).
+# Server heartbeat pings are answered from the receive thread and not passed to on_message.
+# The client pings the server every ping_interval seconds too; the answers are kept out of
+# on_message as well and feed self.latency (smoothed RTT, jitter, server clock offset).
+# With reconnect=True a dropped connection is re-dialled with exponential backoff and the
+# session resumed with the token from "joined" (see sessions.py): on_message gets a local
+# {"type":"reconnecting","attempt":n,"delay":s} per attempt, then the server's "resumed".
+# If the server no longer knows the token, the client re-sends its last join instead.
+# With udp=True the join / resume asks for the UDP snapshot channel (udp_channel.py): if the
+# server offers it, snapshots arrive as datagrams (stale ones dropped) and acks leave that way,
+# everything else stays on TCP. on_message is then called from two threads, never at once;
+# datagrams of the previous level that arrive after the TCP level_started are dropped.
+#
+# send() never touches the socket: it queues the message and a writer thread sends
+# everything queued so far with one sendall, so a congested link can't stall the caller.
+# A movement-only input without a seq, or an ack, still waiting in the queue is
+# superseded by the next one (merged into it). With batch_frames=True inputs and acks wait for flush(), which
+# the game loop calls once per frame; everything else goes out right away.
+# send_stats() reports queue depth, batching and flush latency.
 class GameClient:
-    def __init__(self, host: str = "localhost", port: int = 6000, on_message: Optional[Callable] = None):
+    def __init__(self, host: str = "localhost", port: int = 6000, on_message: Optional[Callable] = None,
+                 codec: str = JSON_CODEC, reconnect: bool = False, backoff_initial: float = 0.25,
+                 backoff_max: float = 5.0, max_attempts: int = 10, batch_frames: bool = False,
+                 ping_interval: float = DEFAULT_PING_INTERVAL, compress: bool = False, udp: bool = False):
+        if codec not in CODECS:
+            raise ValueError(f"unknown codec {codec!r}")
         self.host = host
         self.port = port
         self.sock: Optional[socket.socket] = None
         self._recv_thread: Optional[threading.Thread] = None
         self._running = False
+        # outbound queue of (collapse key, message, time queued), emptied by the writer thread
+        self.batch_frames = batch_frames
+        self._out_cond = threading.Condition()
+        self._outbox: List[Tuple[Optional[str], Dict, float]] = []
+        self._flush_requested = False
+        self._writing = False
+        self._writer_thread: Optional[threading.Thread] = None
+        self._send_counts = {"enqueued": 0, "collapsed": 0, "dropped": 0, "errors": 0, "flushes": 0,
+                             "frames_sent": 0, "bytes_sent": 0, "max_depth": 0, "sent_udp": 0}
+        self._flush_latency_sum = 0.0
+        self._flush_latency_max = 0.0
+        # the writer thread queues a ping whenever one is due
+        self.ping_interval = ping_interval
+        self.latency = LatencyEstimator()
+        self._next_ping = 0.0
         self.on_message = on_message
+        self._notify_lock = threading.RLock()
+        # UDP snapshot channel, created on the first udp_offer and kept across reconnects
+        self.udp = udp
+        self.udp_channel: Optional[UdpClient] = None
+        # (first datagram seq of the new level or None until udp_level says, give-up time) after a
+        # level_started: datagrams below it were sent during the previous level (see _udp_frame)
+        self._level_fence: Optional[Tuple[Optional[int], float]] = None
+        self._udp_previous_level = 0
+        # codec requested in join messages; self.codec is what we send with (switched by "joined")
+        self.requested_codec = codec
+        self.codec = JSON_CODEC
+        self.compress = compress
+        # decoder of the current connection, for compression_stats()
+        self._decoder: Optional[FrameDecoder] = None
+        # automatic reconnect; the backoff doubles per failed attempt and resets once we are back in
+        self.reconnect = reconnect
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.max_attempts = max_attempts
+        self.reconnects = 0
+        self._reconnecting = False
+        self._attempt = 0
+        self._stop = threading.Event()
+        # session state from the last "joined" / "resumed"
+        self.resume_token: Optional[str] = None
+        self.room: Optional[str] = None
+        self._last_join: Optional[Dict] = None
+
+    def _dial(self, timeout: float) -> socket.socket:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        try:
+            sock.connect((self.host, self.port))
+        except OSError:
+            sock.close()
+            raise
+        sock.settimeout(None)
+        # inputs and pings are tiny; Nagle would hold each one back until the previous one is acked
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
 
     def connect(self, timeout: float = 5.0) -> None:
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.sock.settimeout(timeout)
-        self.sock.connect((self.host, self.port))
-        self.sock.settimeout(None)
+        self.sock = self._dial(timeout)
         self._running = True
+        self._stop.clear()
         self._recv_thread = threading.Thread(target=self._recv_loop, daemon=True)
         self._recv_thread.start()
+        # a writer left over from before a close() sees it has been replaced and exits
+        self._writer_thread = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer_thread.start()
 
     def close(self):
+        if self._running:
+            # a leave (or anything else) still queued goes out first
+            self.drain(1.0)
         self._running = False
-        if self.sock:
+        self._stop.set()
+        with self._out_cond:
+            self._out_cond.notify_all()
+        # the receive thread also closes on EOF; take the socket first so only one of us does
+        sock, self.sock = self.sock, None
+        if sock:
             try:
-                self.sock.shutdown(socket.SHUT_RDWR)
+                sock.shutdown(socket.SHUT_RDWR)
             except Exception:
                 pass
-            self.sock.close()
-        self.sock = None
+            sock.close()
+        channel, self.udp_channel = self.udp_channel, None
+        if channel is not None:
+            channel.close()
 
     def send(self, payload: dict):
+        mtype = payload.get("type")
+        if mtype == "join":
+            if self.requested_codec != JSON_CODEC:
+                payload = dict(payload, codec=self.requested_codec)
+            if self.compress:
+                payload = dict(payload, compress=ZLIB)
+            if self.udp:
+                payload = dict(payload, udp=True)
+            self._last_join = payload
+        elif mtype == "leave":
+            # the server closes the connection after a leave; that is not a drop to recover from
+            self.resume_token = None
+        elif mtype == "ack" and self.udp_channel is not None and self.sock:
+            # a lost ack only means a bigger delta next time; no need to queue behind TCP
+            if self.udp_channel.send_frame(encode_frame(payload, self.codec)):
+                self._send_counts["sent_udp"] += 1
+                return
         if not self.sock:
+            if self._reconnecting:
+                # inputs sent while away are stale by the time we are back; the resume resyncs state
+                self._send_counts["dropped"] += 1
+                return
             raise RuntimeError("Not connected")
-        data = json.dumps(payload, separators=(",", ":")) + "\n"
-        self.sock.sendall(data.encode("utf-8"))
+        key = _collapse_key(payload)
+        queued_at = time.perf_counter()
+        with self._out_cond:
+            if key is not None:
+                for i, (other, older, t) in enumerate(self._outbox):
+                    if other == key:
+                        # superseded before it went out; fields the new message leaves out keep their value
+                        payload = {**older, **payload}
+                        queued_at = t
+                        del self._outbox[i]
+                        self._send_counts["collapsed"] += 1
+                        break
+            if len(self._outbox) >= MAX_QUEUED:
+                del self._outbox[0]
+                self._send_counts["dropped"] += 1
+            self._outbox.append((key, payload, queued_at))
+            self._send_counts["enqueued"] += 1
+            if len(self._outbox) > self._send_counts["max_depth"]:
+                self._send_counts["max_depth"] = len(self._outbox)
+            if not (self.batch_frames and mtype in FRAME_BATCHED) or len(self._outbox) >= MAX_BATCH:
+                self._flush_requested = True
+                self._out_cond.notify_all()
+
+    def flush(self):
+        """Let the writer send everything queued; with batch_frames the game loop calls this once per frame."""
+        with self._out_cond:
+            if self._outbox:
+                self._flush_requested = True
+                self._out_cond.notify_all()
+
+    def drain(self, timeout: float = 1.0) -> bool:
+        """flush() and wait until the writer has sent it all; False on timeout."""
+        deadline = time.monotonic() + timeout
+        with self._out_cond:
+            if self._outbox:
+                self._flush_requested = True
+                self._out_cond.notify_all()
+            while self._outbox or self._writing:
+                left = deadline - time.monotonic()
+                if left <= 0 or not (self._writer_thread and self._writer_thread.is_alive()):
+                    return False
+                self._out_cond.wait(left)
+        return True
+
+    def send_stats(self) -> Dict:
+        c = self._send_counts
+        return {"queued": len(self._outbox), **c,
+                "frames_per_flush": round(c["frames_sent"] / c["flushes"], 2) if c["flushes"] else None,
+                "flush_latency_ms_mean": round(self._flush_latency_sum / c["flushes"] * 1000, 3)
+                if c["flushes"] else None,
+                "flush_latency_ms_max": round(self._flush_latency_max * 1000, 3)}
+
+    def compression_stats(self) -> Optional[Dict]:
+        """Ratio and decompression CPU time on the current connection; None before its first compressed frame."""
+        decoder = self._decoder
+        if decoder is None or decoder.decompressor is None:
+            return None
+        return decoder.decompressor.stats()
+
+    def udp_stats(self) -> Optional[Dict]:
+        """Datagram counts, loss and stale drops of the UDP channel; None if the server never offered one."""
+        channel = self.udp_channel
+        return None if channel is None else {**channel.stats(), "previous_level": self._udp_previous_level}
+
+    def _write_loop(self):
+        cond = self._out_cond
+        me = threading.current_thread()
+        while True:
+            with cond:
+                while self._running and self._writer_thread is me and not (self._flush_requested and self._outbox):
+                    wait = self._ping_wait()
+                    if wait == 0.0:
+                        self._queue_ping()
+                    else:
+                        cond.wait(wait)
+                if not self._running or self._writer_thread is not me:
+                    break
+                batch, self._outbox = self._outbox, []
+                self._flush_requested = False
+                self._writing = True
+                sock = self.sock
+                codec = self.codec
+            try:
+                if sock is None:
+                    self._send_counts["dropped"] += len(batch)
+                    continue
+                data = b"".join([encode_frame(msg, codec) for _, msg, _ in batch])
+                sock.sendall(data)
+                latency = time.perf_counter() - batch[0][2]
+                c = self._send_counts
+                c["flushes"] += 1
+                c["frames_sent"] += len(batch)
+                c["bytes_sent"] += len(data)
+                self._flush_latency_sum += latency
+                if latency > self._flush_latency_max:
+                    self._flush_latency_max = latency
+            except OSError:
+                self._send_counts["errors"] += 1
+                # wake the receive thread: it reconnects, or closes the client
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+            except Exception:
+                # an unencodable message; the rest of the batch is lost with it
+                self._send_counts["errors"] += 1
+            finally:
+                with cond:
+                    self._writing = False
+                    cond.notify_all()
+
+    def _ping_wait(self) -> Optional[float]:
+        """Seconds until the next ping is due (0: now); None while there's no connection to ping over."""
+        if not self.ping_interval or self.sock is None:
+            return None
+        return max(0.0, self._next_ping - time.monotonic())
+
+    def _queue_ping(self):
+        # called by the writer with _out_cond held
+        self._next_ping = time.monotonic() + self.ping_interval
+        self._outbox.append((None, self.latency.ping(), time.perf_counter()))
+        self._send_counts["enqueued"] += 1
+        self._flush_requested = True
 
     def _recv_loop(self):
-        buff = ""
+        while True:
+            self._read(self.sock)
+            if not (self._running and self.reconnect and self.resume_token and self._reconnect()):
+                break
+        self.close()
+
+    def _read(self, sock: Optional[socket.socket]):
+        # frames are parsed in place from the decoder's buffer; see protocol.FrameDecoder
+        decoder = self._decoder = FrameDecoder()
         try:
-            while self._running and self.sock:
-                data = self.sock.recv(4096).decode("utf-8")
-                if not data:
+            while self._running and sock:
+                if not decoder.recv_into(sock):
                     break
-                buff += data
-                while "\n" in buff:
-                    line, buff = buff.split("\n", 1)
-                    if not line.strip():
-                        continue
-                    try:
-                        msg = json.loads(line)
-                    except Exception:
-                        continue
-                    if self.on_message:
-                        try:
-                            self.on_message(msg)
-                        except Exception:
-                            pass
+                for msg in decoder.messages():
+                    self._dispatch(msg)
         except Exception:
             pass
+
+    def _dispatch(self, msg: Dict):
+        mtype = msg.get("type")
+        if mtype == "ping":
+            self.send(pong_for(msg))
+            return
+        if mtype == "pong" and self.latency.observe_pong(msg):
+            return
+        if mtype == "udp_offer":
+            self._udp_offer(msg.get("token"))
+            return
+        if mtype == "udp_level":
+            with self._notify_lock:
+                if self._level_fence is not None and isinstance(msg.get("seq"), int):
+                    self._level_fence = (msg["seq"] % SEQ_MOD, self._level_fence[1])
+            return
+        if mtype in ("joined", "resumed"):
+            if msg.get("codec") in CODECS:
+                self.codec = msg["codec"]
+            self.resume_token = msg.get("resume")
+            self.room = msg.get("room")
+            self._attempt = 0
+        elif mtype == "error" and msg.get("message") == "resume_failed" and self._last_join is not None:
+            # the grace period ran out (or the server restarted): join from scratch
+            self.send(self._last_join)
+        elif mtype == "level_started" and self.udp_channel is not None:
+            with self._notify_lock:
+                # set together with handing it on, so no UDP snapshot slips in between
+                self._level_fence = (None, time.monotonic() + LEVEL_FENCE_SECONDS)
+                self._notify(msg)
+            return
+        self._notify(msg)
+
+    def _notify(self, msg: Dict):
+        if self.on_message:
+            # the UDP channel's thread delivers snapshots too; on_message sees one message at a time
+            with self._notify_lock:
+                try:
+                    self.on_message(msg)
+                except Exception:
+                    pass
+
+    def _udp_offer(self, token):
+        if not self.udp or not isinstance(token, str) or not self._running:
+            return
+        channel = self.udp_channel
+        if channel is None:
+            try:
+                channel = self.udp_channel = UdpClient(self.host, self.port, self._udp_frame)
+            except OSError:
+                # no UDP to the server from here; snapshots keep coming over TCP
+                return
+        with self._notify_lock:
+            # a new server-side channel numbers its datagrams from scratch
+            self._level_fence = None
+        channel.offer(token)
+
+    def _udp_frame(self, frame: bytes, seq: int):
+        msg = decode_frame(frame)
+        if msg is None:
+            return
+        with self._notify_lock:
+            fence = self._level_fence
+            if fence is not None:
+                first, until = fence
+                if first is None and time.monotonic() < until:
+                    # level_started is in, the udp_level right behind it isn't yet
+                    self._udp_previous_level += 1
+                    return
+                if first is not None and (seq - first) % SEQ_MOD >= SEQ_MOD // 2:
+                    # sent before the new level started; the new simulation counts ticks from 0 again
+                    self._udp_previous_level += 1
+                    return
+                # the new level's: the channel drops anything older from now on
+                self._level_fence = None
+            self._notify(msg)
+
+    def _reconnect(self) -> bool:
+        """Re-dial with exponential backoff and send a resume; False once closed or out of attempts."""
+        old, self.sock = self.sock, None
+        if old:
+            try:
+                old.close()
+            except OSError:
+                pass
+        self._reconnecting = True
+        try:
+            while self._attempt < self.max_attempts:
+                self._attempt += 1
+                delay = min(self.backoff_max, self.backoff_initial * (2 ** (self._attempt - 1)))
+                self._notify({"type": "reconnecting", "attempt": self._attempt, "delay": round(delay, 3)})
+                # full jitter, so clients dropped together don't come back in lockstep
+                if self._stop.wait(random.uniform(0, delay)):
+                    return False
+                try:
+                    sock = self._dial(min(5.0, self.backoff_max))
+                except OSError:
+                    continue
+                self.codec = JSON_CODEC
+                with self._out_cond:
+                    # whatever was queued for the old connection is stale; the resume goes first
+                    self._send_counts["dropped"] += len(self._outbox)
+                    self._outbox = []
+                self.sock = sock
+                self.reconnects += 1
+                resume = {"type": "resume", "token": self.resume_token, "room": self.room,
+                          "codec": self.requested_codec}
+                if self.compress:
+                    # a new connection, so a new deflate stream
+                    resume["compress"] = ZLIB
+                if self.udp:
+                    resume["udp"] = True
+                self.send(resume)
+                return True
+            return False
         finally:
-            self.close()
\ No newline at end of file
+            self._reconnecting = False
@@ -0,0 +1,127 @@
+"""
+Bounded per-connection outbound queues.
+
+Broadcasting only appends encoded frames to each recipient's queue; a writer
+owned by that connection (a thread for server.py, a task for aio_server.py)
+drains it to the socket. A slow client therefore only backs up its own queue,
+and the overflow policy decides what happens when it fills:
+
+  drop_oldest - discard the oldest queued frame to make room (lossy, keeps link)
+  disconnect  - flag the client as a slow consumer so its connection is closed
+"""
+import asyncio
+import threading
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+DROP_OLDEST = "drop_oldest"
+DISCONNECT = "disconnect"
+OVERFLOW_POLICIES = (DROP_OLDEST, DISCONNECT)
+
+DEFAULT_QUEUE_SIZE = 256
+
+
+class OutboundQueue:
+    """Thread-safe bounded FIFO of encoded frames, drained by a writer thread."""
+    def __init__(self, maxlen: int = DEFAULT_QUEUE_SIZE, policy: str = DROP_OLDEST):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"unknown overflow policy {policy!r}")
+        self.maxlen = max(1, int(maxlen))
+        self.policy = policy
+        self.lock = threading.Lock()
+        self.cond = threading.Condition(self.lock)
+        self.items: Deque[bytes] = deque()
+        self.closed = False
+        self.overflowed = False
+        # counters
+        self.enqueued = 0
+        self.sent = 0
+        self.dropped = 0
+        self.high_water = 0
+
+    def put(self, frame: bytes) -> bool:
+        """
+        Queue one frame without blocking. Returns False if the connection should be
+        dropped (queue closed or overflowed under the disconnect policy).
+        """
+        with self.lock:
+            if self.closed:
+                return False
+            if len(self.items) >= self.maxlen:
+                if self.policy == DISCONNECT:
+                    self.overflowed = True
+                    self.dropped += len(self.items) + 1
+                    self.items.clear()
+                    self.closed = True
+                    self._wakeup()
+                    return False
+                self.items.popleft()
+                self.dropped += 1
+            self.items.append(frame)
+            self.enqueued += 1
+            if len(self.items) > self.high_water:
+                self.high_water = len(self.items)
+            self._wakeup()
+            return True
+
+    def close(self):
+        """Stop accepting frames; the writer still flushes what is already queued."""
+        with self.lock:
+            self.closed = True
+            self._wakeup()
+
+    def get_batch(self, timeout: Optional[float] = None) -> Optional[List[bytes]]:
+        """
+        Block until frames are available and take all of them at once so the writer
+        can send them in a single write. Returns [] on timeout and None once the
+        queue is closed and empty.
+        """
+        with self.lock:
+            if not self.items and not self.closed:
+                self.cond.wait(timeout)
+            return self._take()
+
+    def _take(self) -> Optional[List[bytes]]:
+        if not self.items:
+            return None if self.closed else []
+        batch = list(self.items)
+        self.items.clear()
+        self.sent += len(batch)
+        return batch
+
+    def _wakeup(self):
+        self.cond.notify()
+
+    def depth(self) -> int:
+        return len(self.items)
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                "depth": len(self.items),
+                "high_water": self.high_water,
+                "enqueued": self.enqueued,
+                "sent": self.sent,
+                "dropped": self.dropped,
+                "overflowed": self.overflowed,
+            }
+
+
+class AsyncOutboundQueue(OutboundQueue):
+    """Same queue for aio_server.py; the writer is a task woken by an asyncio.Event."""
+    def __init__(self, maxlen: int = DEFAULT_QUEUE_SIZE, policy: str = DROP_OLDEST):
+        super().__init__(maxlen, policy)
+        self.event = asyncio.Event()
+
+    def _wakeup(self):
+        # put/close are only called from the event loop thread
+        self.event.set()
+
+    async def wait_batch(self) -> Optional[List[bytes]]:
+        while True:
+            with self.lock:
+                batch = self._take()
+                if batch != []:
+                    return batch
+                self.event.clear()
+            await self.event.wait()
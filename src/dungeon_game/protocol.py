@@ -0,0 +1,296 @@
+"""
+Wire framing shared by the servers and clients.
+
+Every connection starts on newline-delimited JSON. A client can ask for the
+compact binary codec (binary_codec.py) in its join message; once the join
+succeeds, the server sends that client binary frames, and after reading the
+"codec" field of "joined" the client may send binary too. Binary frames start
+with a byte that can't begin a JSON line, so readers accept both framings on
+any connection and JSON stays usable for debugging tools.
+
+Messages are encoded once into immutable bytes frames so a broadcast can hand
+the same buffer to every recipient's outbound queue. A client that asked for
+compression at join also gets large frames wrapped in zlib frames, which the
+connection's writer makes and FrameDecoder unwraps (compression.py).
+
+Servers read client frames with a size cap (MAX_CLIENT_FRAME by default;
+FrameTooLarge past it) and can look at a frame's type with peek_type before
+paying for a full decode (rate limiting, see ratelimit.py).
+"""
+import asyncio
+import json
+import re
+from typing import Callable, Dict, List, Optional
+
+from .binary_codec import (MAGIC, MAGIC_BYTE, MAX_HEADER, T_STATE, T_DELTA, T_INPUT, T_ACK, T_LOBBY_UPDATE,
+                           encode_binary, decode_binary, decode_body, parse_header)
+from .compression import ZMAGIC, FrameDecompressor
+
+JSON_CODEC = "json"
+BINARY_CODEC = "binary"
+CODECS = (JSON_CODEC, BINARY_CODEC)
+# largest binary frame body a reader accepts
+MAX_FRAME = 64 * 1024
+# largest frame servers accept from a client; client messages are small, replies and snapshots may not be
+MAX_CLIENT_FRAME = 16 * 1024
+# client receive buffer: initial size, and the largest single frame it grows to hold
+RECV_BUFFER_SIZE = 64 * 1024
+MAX_RECV_FRAME = 4 * 1024 * 1024
+
+# "type" of a JSON frame; if "type" appears again (nested objects) peek_type gives up
+_TYPE_RE = re.compile(rb'"type"\s*:\s*"([A-Za-z0-9_]{1,32})"')
+# binary layouts whose type byte alone names the message (T_JSON bodies are scanned like JSON)
+_BINARY_TYPES = {T_STATE: "state", T_DELTA: "delta", T_INPUT: "input", T_ACK: "ack", T_LOBBY_UPDATE: "lobby_update"}
+
+
+class FrameTooLarge(ValueError):
+    """A client frame exceeded the reader's size cap."""
+
+
+def encode_message(msg: Dict) -> bytes:
+    """Serialize msg into a complete frame (compact JSON + newline)."""
+    return (json.dumps(msg, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def encode_frame(msg: Dict, codec: str = JSON_CODEC) -> bytes:
+    """Serialize msg with the given codec."""
+    if codec == BINARY_CODEC:
+        return encode_binary(msg)
+    return encode_message(msg)
+
+
+def decode_line(raw: bytes) -> Optional[Dict]:
+    """Decode one newline-terminated JSON frame; returns None for blank or malformed lines."""
+    try:
+        line = raw.decode("utf-8").strip()
+    except Exception:
+        return None
+    if not line:
+        return None
+    try:
+        msg = json.loads(line)
+    except Exception:
+        return None
+    return msg if isinstance(msg, dict) else None
+
+
+def decode_frame(raw: bytes) -> Optional[Dict]:
+    """Decode one frame of either codec, as returned by read_frame / read_frame_async."""
+    if raw[:1] == MAGIC_BYTE:
+        return decode_binary(raw)
+    return decode_line(raw)
+
+
+def peek_type(raw: bytes) -> Optional[str]:
+    """
+    The message type of one frame without decoding it, or None if it can't be
+    told cheaply (no "type", several "type" keys, or an unknown binary layout).
+    """
+    if raw[:1] == MAGIC_BYTE:
+        header = parse_header(raw)
+        if header is None or header[0] >= len(raw):
+            return None
+        name = _BINARY_TYPES.get(raw[header[0]])
+        if name is not None:
+            return name
+    m = _TYPE_RE.search(raw)
+    if m is None or raw.find(b'"type"', m.end()) >= 0:
+        return None
+    return m.group(1).decode("ascii")
+
+
+def _binary_length(header: bytes, max_size: int = MAX_FRAME) -> int:
+    parsed = parse_header(header)
+    if parsed is None:
+        raise ValueError("frame length varint too long")
+    length = parsed[1]
+    if length > max_size:
+        raise FrameTooLarge(f"binary frame of {length} bytes exceeds {max_size}")
+    return length
+
+
+def read_frame(rfile, on_start: Optional[Callable[[], None]] = None, max_size: int = MAX_FRAME) -> bytes:
+    """
+    Read one frame of either codec from a buffered binary file; b"" at EOF.
+    on_start is called once the frame's first byte has arrived (heartbeat read timeouts).
+    Raises FrameTooLarge for a frame over max_size bytes, without buffering more than that.
+    """
+    first = rfile.read(1)
+    if not first:
+        return b""
+    if on_start is not None:
+        on_start()
+    if first != MAGIC_BYTE:
+        rest = rfile.readline(max_size)
+        if len(rest) >= max_size and not rest.endswith(b"\n"):
+            raise FrameTooLarge(f"line exceeds {max_size} bytes")
+        return first + rest
+    header = bytearray(first)
+    while len(header) < MAX_HEADER:
+        b = rfile.read(1)
+        if not b:
+            return b""
+        header += b
+        if b[0] < 0x80:
+            break
+    length = _binary_length(header, max_size)
+    body = rfile.read(length)
+    if len(body) < length:
+        return b""
+    return bytes(header) + body
+
+
+async def read_frame_async(reader: asyncio.StreamReader, on_start: Optional[Callable[[], None]] = None,
+                           max_size: int = MAX_FRAME) -> bytes:
+    """
+    asyncio counterpart of read_frame.
+
+    A JSON line can only buffer up to the reader's limit before it is refused, so
+    create the StreamReader with limit=max_size to have it refused at max_size.
+    """
+    first = await reader.read(1)
+    if not first:
+        return b""
+    if on_start is not None:
+        on_start()
+    if first != MAGIC_BYTE:
+        try:
+            rest = await reader.readuntil(b"\n")
+        except asyncio.IncompleteReadError as e:
+            # EOF mid-line: hand back what came, as readline would
+            rest = e.partial
+        except asyncio.LimitOverrunError as e:
+            raise FrameTooLarge(str(e))
+        if len(rest) > max_size:
+            raise FrameTooLarge(f"line exceeds {max_size} bytes")
+        return first + rest
+    header = bytearray(first)
+    try:
+        while len(header) < MAX_HEADER:
+            b = await reader.readexactly(1)
+            header += b
+            if b[0] < 0x80:
+                break
+        length = _binary_length(header, max_size)
+        return bytes(header) + await reader.readexactly(length)
+    except asyncio.IncompleteReadError:
+        return b""
+
+
+class FrameDecoder:
+    """
+    Incremental decoder for a byte stream that may mix JSON lines and binary frames.
+
+    Bytes land in one preallocated bytearray: recv_into(sock) reads straight into
+    its free tail (feed(data) copies in data read some other way), and messages()
+    decodes every complete frame in place from memoryview slices, so nothing is
+    copied per chunk or per frame and a multi-byte character split across reads
+    is simply waiting for its other half. The newline search resumes where the
+    last one stopped, so a large frame arriving in many chunks is scanned once.
+    Unparsed bytes are moved to the front only when the tail fills up, and the
+    buffer doubles (up to max_frame) once a partial frame fills over half of it.
+    Compressed (ZMAGIC) frames go through one FrameDecompressor per decoder,
+    i.e. per connection, created when the first one arrives.
+    """
+    def __init__(self, size: int = RECV_BUFFER_SIZE, max_frame: int = MAX_RECV_FRAME):
+        self.buf = bytearray(size)
+        self.view = memoryview(self.buf)
+        self.max_frame = max_frame
+        # buf[start:end] is received but not yet decoded
+        self.start = 0
+        self.end = 0
+        # no newline before this offset in the pending partial line
+        self.scan = 0
+        self.decompressor: Optional[FrameDecompressor] = None
+
+    def _make_room(self):
+        """The tail is full: move the pending bytes to the front, or grow if they fill over half the buffer."""
+        pending = self.end - self.start
+        size = len(self.buf)
+        if pending * 2 > size and size < self.max_frame:
+            grown = bytearray(min(2 * size, self.max_frame))
+            grown[:pending] = self.view[self.start:self.end]
+            self.view.release()
+            self.buf = grown
+            self.view = memoryview(grown)
+        elif self.start:
+            self.buf[:pending] = self.buf[self.start:self.end]
+        else:
+            raise FrameTooLarge(f"frame exceeds {self.max_frame} bytes")
+        self.scan -= self.start
+        self.start = 0
+        self.end = pending
+
+    def recv_into(self, sock) -> int:
+        """One sock.recv_into into the free space; returns the byte count (0 at EOF)."""
+        if self.end == len(self.buf):
+            self._make_room()
+        n = sock.recv_into(self.view[self.end:])
+        self.end += n
+        return n
+
+    def feed(self, data: bytes) -> List[Dict]:
+        """Append data read some other way (e.g. StreamReader.read) and return the messages it completes."""
+        msgs = []
+        data = memoryview(data)
+        while data:
+            if self.end == len(self.buf):
+                self._make_room()
+            n = min(len(data), len(self.buf) - self.end)
+            self.view[self.end:self.end + n] = data[:n]
+            self.end += n
+            data = data[n:]
+            msgs += self.messages()
+        return msgs
+
+    def messages(self) -> List[Dict]:
+        """Decode and consume every complete frame received so far."""
+        buf = self.buf
+        pos = self.start
+        end = self.end
+        data = self.view[:end]
+        msgs = []
+        while pos < end:
+            first = buf[pos]
+            if first == MAGIC or first == ZMAGIC:
+                header = parse_header(data, pos)
+                if header is None:
+                    break
+                start, length = header
+                if length > self.max_frame:
+                    raise FrameTooLarge(f"binary frame of {length} bytes exceeds {self.max_frame}")
+                if start + length > end:
+                    break
+                if first == MAGIC:
+                    msg = decode_body(data[start:start + length])
+                else:
+                    if self.decompressor is None:
+                        self.decompressor = FrameDecompressor()
+                    msg = decode_frame(self.decompressor.decompress(data[start:start + length], self.max_frame,
+                                                                    start + length - pos))
+                pos = start + length
+            else:
+                nl = buf.find(b"\n", max(pos, self.scan), end)
+                if nl < 0:
+                    self.scan = end
+                    break
+                msg = _decode_json_view(data[pos:nl])
+                pos = nl + 1
+            if msg is not None:
+                msgs.append(msg)
+        data.release()
+        if pos == end:
+            # everything consumed: start over at the front without moving anything
+            pos = end = self.end = self.scan = 0
+        self.start = pos
+        return msgs
+
+
+def _decode_json_view(line: memoryview) -> Optional[Dict]:
+    """decode_line for a slice of a receive buffer (without its newline)."""
+    try:
+        msg = json.loads(str(line, "utf-8"))
+    except ValueError:
+        # also UnicodeDecodeError; blank lines land here too
+        return None
+    return msg if isinstance(msg, dict) else None
@@ -0,0 +1,108 @@
+"""
+Per-connection rate limits for client messages.
+
+Every connection gets a RateLimiter holding one token bucket per message type
+(unknown types share the "other" bucket). Servers look the type up with
+protocol.peek_type -- a regex over the raw JSON, or the type byte of a binary
+frame -- and charge the bucket before decoding, so a flood of messages that
+will be dropped costs a scan and a few float operations each rather than a
+json.loads and a handler call. A rejected message is counted in
+ServerMetrics.rejected and, once per run of rejections, answered with
+{"type":"error","message":"rate_limited","for":type,"retry_after":s}.
+"""
+from typing import Dict, Optional, Tuple
+
+from .protocol import decode_frame, peek_type
+
+# message type -> (sustained messages per second, burst); "other" covers unlisted types
+DEFAULT_RATE_LIMITS: Dict[str, Tuple[float, float]] = {
+    "join": (2.0, 5),
+    "resume": (1.0, 3),
+    "create_room": (2.0, 5),
+    "list_rooms": (5.0, 10),
+    # each one spawns mobs and broadcasts to the whole room
+    "start_level": (1.0, 3),
+    # inputs / acks at up to 60 Hz with room for bursts after a stall
+    "input": (60.0, 120),
+    "ack": (60.0, 120),
+    "ping": (5.0, 10),
+    "pong": (5.0, 10),
+    "stats": (2.0, 5),
+    "leave": (2.0, 5),
+    "other": (20.0, 40),
+}
+OTHER = "other"
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "stamp", "notified")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.stamp = now
+        # the client has been told about the current run of rejections
+        self.notified = False
+
+    def take(self, now: float) -> bool:
+        tokens = self.tokens + (now - self.stamp) * self.rate
+        if tokens > self.burst:
+            tokens = self.burst
+        self.stamp = now
+        if tokens >= 1.0:
+            self.tokens = tokens - 1.0
+            self.notified = False
+            return True
+        self.tokens = tokens
+        return False
+
+    def retry_after(self) -> float:
+        return (1.0 - self.tokens) / self.rate if self.rate > 0 else 0.0
+
+
+class RateLimiter:
+    """Token buckets for one connection, created lazily per message type."""
+    def __init__(self, limits: Dict[str, Tuple[float, float]] = DEFAULT_RATE_LIMITS):
+        self.limits = limits
+        self.buckets: Dict[str, TokenBucket] = {}
+
+    def key(self, mtype: Optional[str]) -> str:
+        return mtype if mtype in self.limits else OTHER
+
+    def allow(self, mtype: Optional[str], now: float) -> bool:
+        key = mtype if mtype in self.limits else OTHER
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            rate, burst = self.limits.get(key, DEFAULT_RATE_LIMITS[OTHER])
+            bucket = self.buckets[key] = TokenBucket(rate, burst, now)
+        return bucket.take(now)
+
+    def admit(self, conn, mtype: Optional[str], now: float) -> bool:
+        """
+        Charge one mtype message for conn (which has metrics and send_message);
+        on rejection count it and tell the client once per run of rejections.
+        """
+        if self.allow(mtype, now):
+            return True
+        key = self.key(mtype)
+        conn.metrics.frame_rejected("rate:" + key)
+        bucket = self.buckets[key]
+        if not bucket.notified:
+            bucket.notified = True
+            conn.send_message({"type": "error", "message": "rate_limited", "for": key,
+                               "retry_after": round(bucket.retry_after(), 3)})
+        return False
+
+    def admit_frame(self, conn, raw: bytes, now: float) -> Tuple[bool, Optional[Dict]]:
+        """
+        admit() for a raw frame typed with peek_type. Frames it can't type are
+        decoded to find out; returns (admitted, msg), msg being that decoded
+        message or None if the frame was not decoded here.
+        """
+        mtype = peek_type(raw)
+        msg = None
+        if mtype is None:
+            msg = decode_frame(raw)
+            mtype = msg.get("type") if msg else None
+        return self.admit(conn, mtype, now), msg
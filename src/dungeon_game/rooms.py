@@ -0,0 +1,180 @@
+"""
+Rooms for the multiplayer server.
+
+A LobbyState is one independent game room with its own lock; RoomManager maps
+room ids to rooms so a single process can host many of them. The manager lock
+is only taken to create or retire a room -- joins, leaves and broadcasts only
+ever touch the lock of the room involved, so rooms never contend with each other.
+"""
+import itertools
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from .metrics import ServerMetrics
+from .protocol import encode_frame, JSON_CODEC
+from .sessions import SessionStore, DEFAULT_RESUME_GRACE
+from .simulation import simulation_stats
+
+MAX_PLAYERS = 3
+# room used by clients that join without naming one (the original single-lobby behaviour)
+DEFAULT_ROOM = "lobby"
+
+
+class LobbyState:
+    def __init__(self, room_id: str = DEFAULT_ROOM, max_players: int = MAX_PLAYERS,
+                 metrics: Optional[ServerMetrics] = None):
+        self.room_id = room_id
+        self.max_players = max_players
+        self.metrics = metrics
+        self.lock = threading.Lock()
+        self.clients: Dict[str, "RequestHandler"] = {}  # client_id -> handler
+        # set once the manager retires the room; late joiners must look it up again
+        self.closed = False
+        # simulation.RoomSimulation while an authoritative level is running
+        self.sim = None
+
+    def add(self, client_id: str, handler: "RequestHandler") -> bool:
+        with self.lock:
+            if self.closed or len(self.clients) >= self.max_players:
+                return False
+            self.clients[client_id] = handler
+            return True
+
+    def remove(self, client_id: str, handler=None) -> bool:
+        """Remove client_id; with handler, only if that handler still holds the slot (not a resumed one)."""
+        with self.lock:
+            current = self.clients.get(client_id)
+            if current is None or (handler is not None and current is not handler):
+                return False
+            del self.clients[client_id]
+            return True
+
+    def list_clients(self) -> List[str]:
+        with self.lock:
+            return list(self.clients.keys())
+
+    def player_count(self) -> int:
+        return len(self.clients)
+
+    def broadcast(self, message: Dict):
+        self.broadcast_frames(lambda codec: encode_frame(message, codec))
+
+    def broadcast_frame(self, frame: bytes):
+        """Send the same pre-encoded bytes to every client, whatever codec it negotiated."""
+        self.broadcast_frames(lambda codec: frame)
+
+    def broadcast_frames(self, frame_for: Callable[[str], bytes]):
+        """Broadcast frame_for(codec), called once per codec in use in the room."""
+        # snapshot under the lock, enqueue outside it: send_frame only appends the shared
+        # bytes to each client's outbound queue, so a slow socket never holds up the lobby
+        t0 = time.perf_counter()
+        with self.lock:
+            handlers = list(self.clients.values())
+        frames: Dict[str, bytes] = {}
+        for handler in handlers:
+            codec = getattr(handler, "codec", JSON_CODEC)
+            frame = frames.get(codec)
+            if frame is None:
+                frame = frames[codec] = frame_for(codec)
+            try:
+                handler.send_frame(frame)
+            except Exception:
+                pass
+        if self.metrics is not None:
+            self.metrics.observe("broadcast", time.perf_counter() - t0)
+
+    def queue_stats(self) -> Dict:
+        """Aggregate outbound queue counters across the lobby's clients."""
+        with self.lock:
+            handlers = list(self.clients.items())
+        per_client = {}
+        for cid, handler in handlers:
+            q = getattr(handler, "outbound", None)
+            if q is not None:
+                per_client[cid] = q.stats()
+        return {
+            "total_depth": sum(s["depth"] for s in per_client.values()),
+            "max_depth": max((s["depth"] for s in per_client.values()), default=0),
+            "dropped": sum(s["dropped"] for s in per_client.values()),
+            "clients": per_client,
+        }
+
+    def info(self) -> Dict:
+        return {"room": self.room_id, "players": len(self.clients), "max_players": self.max_players}
+
+
+class RoomManager:
+    """
+    Registry of rooms keyed by id. Lookup is a plain dict read (atomic under the
+    GIL, no lock); create/retire take the manager lock briefly. All operations
+    are O(1) in the number of rooms except list_rooms, which is paginated.
+    """
+    def __init__(self, max_players: int = MAX_PLAYERS, tick_rate: int = 0, resume_grace: float = DEFAULT_RESUME_GRACE,
+                 journal_dir: Optional[str] = None):
+        self.max_players = max_players
+        # >0 runs an authoritative simulation at this rate for every started level
+        self.tick_rate = tick_rate
+        # directory each simulated level run is journaled to (journal.py); None disables it
+        self.journal_dir = journal_dir
+        self.lock = threading.Lock()
+        self.rooms: Dict[str, LobbyState] = {}
+        self._ids = itertools.count(1)
+        self.metrics = ServerMetrics()
+        self.sessions = SessionStore(resume_grace)
+        # udp_channel.UdpChannel of a server started with --udp; snapshots may go that way
+        self.udp = None
+
+    def get(self, room_id: str) -> Optional[LobbyState]:
+        return self.rooms.get(room_id)
+
+    def create(self, room_id: Optional[str] = None, max_players: Optional[int] = None) -> Optional[LobbyState]:
+        """Create a room; returns None if room_id is already taken."""
+        with self.lock:
+            if room_id is None:
+                room_id = f"room-{next(self._ids)}"
+                while room_id in self.rooms:
+                    room_id = f"room-{next(self._ids)}"
+            elif room_id in self.rooms:
+                return None
+            room = LobbyState(room_id, max_players or self.max_players, self.metrics)
+            self.rooms[room_id] = room
+            return room
+
+    def get_or_create(self, room_id: str) -> LobbyState:
+        room = self.rooms.get(room_id)
+        if room is not None and not room.closed:
+            return room
+        with self.lock:
+            room = self.rooms.get(room_id)
+            if room is None or room.closed:
+                room = LobbyState(room_id, self.max_players, self.metrics)
+                self.rooms[room_id] = room
+            return room
+
+    def discard_if_empty(self, room: LobbyState) -> bool:
+        """Retire room once its last player has left."""
+        with self.lock:
+            with room.lock:
+                if room.clients or room.closed:
+                    return False
+                room.closed = True
+            if self.rooms.get(room.room_id) is room:
+                del self.rooms[room.room_id]
+        if room.sim is not None:
+            room.sim.stop()
+        return True
+
+    def list_rooms(self, offset: int = 0, limit: int = 100) -> List[Dict]:
+        # copy the dict view in one step so concurrent create/retire can't break iteration
+        rooms = list(self.rooms.values())
+        return [r.info() for r in itertools.islice(rooms, max(0, offset), max(0, offset) + max(0, limit))]
+
+    def __len__(self) -> int:
+        return len(self.rooms)
+
+    def stats(self) -> Dict:
+        rooms = list(self.rooms.values())
+        return {"rooms": len(rooms), "players": sum(len(r.clients) for r in rooms),
+                "simulation": simulation_stats(rooms), "sessions": self.sessions.stats(),
+                **({"udp": self.udp.stats()} if self.udp is not None else {})}
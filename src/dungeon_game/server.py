@@ -1,114 +1,501 @@
+import socket
 import socketserver
 import threading
-import json
-from typing import Dict, List
-from .level import Level
+import time
+from functools import lru_cache
+from typing import Dict, Optional
+from .level import Level, MAX_LEVEL
+from .rooms import RoomManager, MAX_PLAYERS, DEFAULT_ROOM
+from .simulation import start_room_simulation
+from .protocol import (encode_frame, decode_frame, read_frame, peek_type, FrameTooLarge, JSON_CODEC, CODECS,
+                       MAX_CLIENT_FRAME)
+from .outbound import OutboundQueue, DEFAULT_QUEUE_SIZE, DROP_OLDEST, OVERFLOW_POLICIES
+from .metrics import serve_stats_http
+from .heartbeat import Reaper, DEFAULT_PING_INTERVAL, DEFAULT_IDLE_TIMEOUT, DEFAULT_READ_TIMEOUT
+from .sessions import DEFAULT_RESUME_GRACE
+from .ratelimit import RateLimiter, DEFAULT_RATE_LIMITS
+from .latency import LatencyEstimator, pong_for
+from .compression import negotiate
+from .udp_channel import UdpChannel
 
-MAX_PLAYERS = 3
+# start_level requests without an explicit seed all share this one, so they hit the cache
+DEFAULT_LEVEL_SEED = 0
+# page size cap for list_rooms replies
+MAX_ROOM_LIST = 500
+# message types counted individually in metrics; anything else a client sends is "other"
+MESSAGE_TYPES = frozenset(("join", "create_room", "list_rooms", "start_level", "input", "ack", "leave", "stats",
+                           "ping", "pong", "resume"))
 
+ROOMS = RoomManager()
 
-class LobbyState:
-    def __init__(self):
-        self.lock = threading.Lock()
-        self.clients: Dict[str, "RequestHandler"] = {}  # client_id -> handler
 
-    def add(self, client_id: str, handler: "RequestHandler") -> bool:
-        with self.lock:
-            if len(self.clients) >= MAX_PLAYERS:
-                return False
-            self.clients[client_id] = handler
+@lru_cache(maxsize=512)
+def level_started_frame(level_no: int, players: int, seed: int, codec: str = JSON_CODEC) -> bytes:
+    """
+    Encoded level_started broadcast for (level, player_count, seed, codec). The spawn is
+    deterministic for a given seed, so repeated start_level requests reuse the
+    cached bytes and skip Level.spawn_mobs and serialization entirely.
+    """
+    mobs = Level(level_no).spawn_mobs(player_count=players, seed=seed)
+    # serialize mobs minimally
+    mobs_ser = [{"name": m.name, "hp": m.hp, "attack": m.attack, "defense": m.defense, "crystal_drop": getattr(m, "crystal_drop", 0)} for m in mobs]
+    return encode_frame({"type": "level_started", "level": level_no, "player_count": players, "seed": seed,
+                         "mobs": mobs_ser}, codec)
+
+
+def handle_message(rooms: RoomManager, conn, msg: Dict) -> bool:
+    """
+    Apply one decoded client message on behalf of conn.
+    conn is anything with client_id/room attributes and send_message/send_frame methods, so the
+    threaded RequestHandler and the asyncio server share the same protocol rules.
+    Returns False when the connection should be closed.
+    """
+    mtype = msg.get("type")
+    key = mtype if mtype in MESSAGE_TYPES else "other"
+    t0 = time.perf_counter()
+    sim = getattr(getattr(conn, "room", None), "sim", None)
+    if sim is not None and sim.journal is not None and mtype != "input":
+        # a journaled room records everything its members send (inputs are queued below anyway)
+        sim.submit(conn.client_id, msg)
+    try:
+        return _dispatch(rooms, conn, msg, mtype)
+    except Exception as e:
+        rooms.metrics.observe_error(f"{key}:{type(e).__name__}")
+        raise
+    finally:
+        rooms.metrics.observe_message(key, time.perf_counter() - t0)
+
+
+def compression_fields(rooms: RoomManager, conn, msg: Dict) -> Dict:
+    """
+    Turn on compression for conn's writer if a join / resume asks for it, and
+    return what to confirm in the reply. Once on it stays on: the deflate
+    stream is the connection's and can't restart.
+    """
+    comp = getattr(conn, "compressor", None)
+    if comp is None:
+        comp = negotiate(msg, rooms.metrics)
+        if comp is None:
+            return {}
+        conn.compressor = comp
+    return comp.join_fields()
+
+
+def offer_udp(rooms: RoomManager, conn, msg: Dict):
+    """After a join / resume asking for it, offer the UDP snapshot channel if this server runs one (udp_channel.py)."""
+    channel = rooms.udp
+    if channel is not None and msg.get("udp") and hasattr(conn, "send_state_frame"):
+        conn.send_message(channel.offer(conn))
+
+
+def handle_datagram(rooms: RoomManager, conn, frame: bytes):
+    """A frame from conn's UDP channel: only snapshot acks are taken that way, everything else must use TCP."""
+    if peek_type(frame) != "ack" or getattr(conn, "room", None) is None:
+        return
+    if conn.limiter is not None and not conn.limiter.admit_frame(conn, frame, time.monotonic())[0]:
+        return
+    msg = decode_frame(frame)
+    if msg is not None:
+        handle_message(rooms, conn, msg)
+
+
+def reply_fields(msg: Dict) -> Dict:
+    """
+    {"rid": ...} if the client tagged msg with a request id, else {}. Merged into
+    the direct reply (or error) so a client can match it to its request;
+    broadcasts such as level_started are not tagged.
+    """
+    rid = msg.get("rid")
+    return {} if rid is None else {"rid": rid}
+
+
+def requested_room(msg: Dict) -> Optional[str]:
+    """The room id a join / resume / create_room names, as rooms are keyed; None if it names none."""
+    room_id = msg.get("room")
+    return None if room_id is None else str(room_id)
+
+
+def _send_error(rooms: RoomManager, conn, message: str, **extra):
+    rooms.metrics.observe_error(message)
+    conn.send_message({"type": "error", "message": message, **extra})
+
+
+def int_field(msg: Dict, name: str, default: int, lo: Optional[int] = None, hi: Optional[int] = None) -> Optional[int]:
+    """msg[name] (or default) as an int clamped to [lo, hi]; None if the client sent something that isn't a number."""
+    try:
+        value = int(msg.get(name, default))
+    except (TypeError, ValueError, OverflowError):
+        return None
+    if lo is not None:
+        value = max(lo, value)
+    if hi is not None:
+        value = min(hi, value)
+    return value
+
+
+def _bad_field(rooms: RoomManager, conn, msg: Dict, name: str) -> bool:
+    _send_error(rooms, conn, "bad_field", field=name, **reply_fields(msg))
+    return True
+
+
+def _dispatch(rooms: RoomManager, conn, msg: Dict, mtype) -> bool:
+    if mtype == "join":
+        cid = msg.get("client_id")
+        if not cid:
+            _send_error(rooms, conn, "no client_id", **reply_fields(msg))
             return True
+        room_id = requested_room(msg)
+        if room_id is None:
+            room = rooms.get_or_create(DEFAULT_ROOM)
+        else:
+            room = rooms.get(room_id)
+            if room is None:
+                _send_error(rooms, conn, "no_such_room", room=room_id, **reply_fields(msg))
+                return True
+        current = getattr(conn, "room", None)
+        if current is room:
+            # re-join of the same room (maybe under a new id) keeps the slot
+            room.remove(conn.client_id, conn)
+        elif current is not None:
+            # switching rooms: leave the current one first
+            handle_disconnect(rooms, conn)
+        # joining afresh under a name whose slot is held for a resume gives that slot up
+        rooms.sessions.release(room, cid)
+        # attempt to add
+        ok = room.add(cid, conn)
+        if not ok and room.closed and room_id is None:
+            # the default room was retired between lookup and add; take the fresh one
+            room = rooms.get_or_create(DEFAULT_ROOM)
+            ok = room.add(cid, conn)
+        if not ok:
+            _send_error(rooms, conn, "lobby_full", room=room.room_id, **reply_fields(msg))
+            return False
+        conn.client_id = cid
+        conn.room = room
+        conn.player_class = str(msg.get("class", "warrior"))
+        # "codec" picks the encoding for everything after "joined"; unknown codecs keep the current one
+        codec = msg.get("codec")
+        if codec not in CODECS:
+            codec = getattr(conn, "codec", JSON_CODEC)
+        joined = {"type": "joined", "client_id": cid, "room": room.room_id, "codec": codec,
+                  **compression_fields(rooms, conn, msg), **reply_fields(msg)}
+        if rooms.tick_rate:
+            # clients predicting their own movement step it at the simulation's rate (prediction.py)
+            joined["tick_rate"] = rooms.tick_rate
+        token = rooms.sessions.issue(conn)
+        if token is not None:
+            joined["resume"] = token
+        conn.send_message(joined)
+        conn.codec = codec
+        offer_udp(rooms, conn, msg)
+        room.broadcast({"type": "lobby_update", "room": room.room_id, "clients": room.list_clients()})
+    elif mtype == "resume":
+        if getattr(conn, "room", None) is not None:
+            # resuming is for a fresh connection; this one already holds a slot
+            _send_error(rooms, conn, "resume_failed", reason="in_room", **reply_fields(msg))
+            return True
+        def greet(old):
+            room = conn.room
+            codec = msg.get("codec")
+            if codec not in CODECS:
+                codec = old.codec
+            # the snapshot stream still has this client's ack, so its next snapshot is a delta from that tick
+            tick = room.sim.snapshots.acks.get(conn.client_id) if room.sim is not None else None
+            conn.send_message({"type": "resumed", "client_id": conn.client_id, "room": room.room_id,
+                               "codec": codec, "resume": rooms.sessions.issue(conn), "tick": tick,
+                               **compression_fields(rooms, conn, msg), **reply_fields(msg)})
+            conn.codec = codec
+        old = rooms.sessions.resume(msg.get("token"), conn, greet)
+        if old is None:
+            _send_error(rooms, conn, "resume_failed", **reply_fields(msg))
+            return True
+        # a stale connection the client gave up on; a DetachedConn ignores this
+        old.drop_connection()
+        offer_udp(rooms, conn, msg)
+    elif mtype == "create_room":
+        room_id = requested_room(msg)
+        max_players = None
+        if msg.get("max_players") is not None:
+            max_players = int_field(msg, "max_players", 0, lo=1)
+            if max_players is None:
+                return _bad_field(rooms, conn, msg, "max_players")
+        room = rooms.create(room_id, max_players)
+        if room is None:
+            _send_error(rooms, conn, "room_exists", room=room_id, **reply_fields(msg))
+        else:
+            conn.send_message({"type": "room_created", **room.info(), **reply_fields(msg)})
+    elif mtype == "list_rooms":
+        offset = int_field(msg, "offset", 0, lo=0)
+        limit = int_field(msg, "limit", 100, lo=0, hi=MAX_ROOM_LIST)
+        if offset is None or limit is None:
+            return _bad_field(rooms, conn, msg, "offset" if offset is None else "limit")
+        conn.send_message({"type": "room_list", "total": len(rooms), "offset": offset,
+                           "rooms": rooms.list_rooms(offset, limit), **reply_fields(msg)})
+    elif mtype == "start_level":
+        room = getattr(conn, "room", None)
+        if room is None:
+            _send_error(rooms, conn, "not_in_room", **reply_fields(msg))
+            return True
+        # leader requested a level start; server will spawn mobs scaled to player count
+        level_no = int_field(msg, "level", 1, lo=1, hi=MAX_LEVEL)
+        seed = int_field(msg, "seed", DEFAULT_LEVEL_SEED)
+        if level_no is None or seed is None:
+            return _bad_field(rooms, conn, msg, "level" if level_no is None else "seed")
+        players = room.player_count()
+        room.broadcast_frames(lambda codec: level_started_frame(level_no, players, seed, codec))
+        if rooms.tick_rate:
+            # the first wave uses the same seed, so it matches the mobs just announced
+            start_room_simulation(room, level_no, seed, rooms.tick_rate, rooms.journal_dir)
+            mark_udp_level(room)
+    elif mtype == "input":
+        room = getattr(conn, "room", None)
+        if room is not None and room.sim is not None:
+            # applied by the tick loop at the next tick boundary
+            room.sim.submit(conn.client_id, msg)
+    elif mtype == "ack":
+        # client has state for this tick; later snapshots are deltas against it
+        room = getattr(conn, "room", None)
+        tick = int_field(msg, "tick", 0)
+        if tick is None:
+            return _bad_field(rooms, conn, msg, "tick")
+        if room is not None and room.sim is not None:
+            room.sim.snapshots.ack(conn.client_id, tick)
+    elif mtype == "stats":
+        # any client may ask: other players' ids and RTTs stay on the localhost HTTP endpoint
+        conn.send_message({"type": "stats", **rooms.metrics.snapshot(rooms, per_client=False), **reply_fields(msg)})
+    elif mtype == "ping":
+        conn.send_message({**pong_for(msg), **reply_fields(msg)})
+    elif mtype == "pong":
+        # answer to a heartbeat ping (the read loop already refreshed last_seen): an RTT / clock sample
+        latency = getattr(conn, "latency", None)
+        if latency is not None:
+            latency.observe_pong(msg)
+    elif mtype == "leave":
+        # an explicit leave frees the slot right away instead of holding it for a resume
+        rooms.sessions.discard(conn)
+        return False
+    else:
+        # unknown message - echo to others
+        pass
+    return True
 
-    def remove(self, client_id: str):
-        with self.lock:
-            if client_id in self.clients:
-                del self.clients[client_id]
 
-    def list_clients(self) -> List[str]:
-        with self.lock:
-            return list(self.clients.keys())
+def mark_udp_level(room):
+    """After a level_started broadcast: tell members with a UDP channel where the new level's datagrams start."""
+    with room.lock:
+        members = list(room.clients.values())
+    for conn in members:
+        mark = getattr(conn, "mark_udp_level", None)
+        if mark is not None:
+            # a sharded worker's connection: the front end owns the channel
+            mark()
+        elif getattr(conn, "udp", None) is not None:
+            conn.send_message(conn.udp.level_message())
 
-    def broadcast(self, message: Dict):
-        with self.lock:
-            for handler in list(self.clients.values()):
-                try:
-                    handler.send_message(message)
-                except Exception:
-                    pass
+
+def handle_disconnect(rooms: RoomManager, conn):
+    """Take conn out of its room now (leave, room switch, expired resume grace)."""
+    rooms.sessions.discard(conn)
+    room = getattr(conn, "room", None)
+    if room is not None and getattr(conn, "client_id", None):
+        removed = room.remove(conn.client_id, conn)
+        conn.room = None
+        if removed and not rooms.discard_if_empty(room):
+            room.broadcast({"type": "lobby_update", "room": room.room_id, "clients": room.list_clients()})
+
+
+def handle_connection_lost(rooms: RoomManager, conn):
+    """Connection closed without a leave: hold the slot for a resume if conn has a session, else disconnect."""
+    if rooms.udp is not None:
+        rooms.udp.release(conn)
+    if not rooms.sessions.detach(conn, lambda held: handle_disconnect(rooms, held)):
+        handle_disconnect(rooms, conn)
 
 
-LOBBY = LobbyState()
+def reject_oversize(conn, max_frame: int):
+    """Count an oversized client frame and say why the connection is about to close."""
+    conn.metrics.frame_rejected("oversize")
+    conn.send_message({"type": "error", "message": "frame_too_large", "max": max_frame})
 
 
 class RequestHandler(socketserver.StreamRequestHandler):
     """
-    Each client connects and speaks JSON messages terminated by newline.
+    Each client connects and speaks JSON messages terminated by newline (or binary
+    frames once it has negotiated them, see protocol.py).
     We expect an initial {"type":"join","client_id":"name"} from each client.
     """
+    def setup(self):
+        super().setup()
+        # snapshots go out every tick; don't let Nagle hold one until the last is acked (asyncio does this itself)
+        try:
+            self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except OSError:
+            pass
+        self.outbound = OutboundQueue(getattr(self.server, "queue_size", DEFAULT_QUEUE_SIZE),
+                                      getattr(self.server, "overflow_policy", DROP_OLDEST))
+        self.codec = JSON_CODEC
+        self.metrics = getattr(self.server, "rooms", ROOMS).metrics
+        # heartbeat state, see heartbeat.Reaper
+        self.last_seen = time.monotonic()
+        self.frame_started = 0.0
+        self.ping_sent = 0.0
+        self.latency = LatencyEstimator()
+        # set by a join asking for compression; used by _write_loop only
+        self.compressor = None
+        # udp_channel.UdpPeer once a join asked for the UDP channel
+        self.udp = None
+        self.reaped = None
+        self.session = None
+        limits = getattr(self.server, "rate_limits", DEFAULT_RATE_LIMITS)
+        self.limiter = RateLimiter(limits) if limits else None
+        self.metrics.connection_opened(self)
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
     def handle(self):
         self.client_id = None
+        self.room = None
+        rooms = getattr(self.server, "rooms", ROOMS)
+        max_frame = getattr(self.server, "max_frame", MAX_CLIENT_FRAME)
+        # no socket timeout: a timed-out read leaves the buffered rfile unusable, so dead
+        # peers are detected by the server's Reaper, which shuts the socket down instead
         self.connection.settimeout(None)
         try:
-            for raw in self.rfile:
+            while True:
                 try:
-                    line = raw.decode("utf-8").strip()
-                except Exception:
-                    continue
-                if not line:
-                    continue
-                try:
-                    msg = json.loads(line)
-                except Exception:
-                    continue
-                mtype = msg.get("type")
-                if mtype == "join":
-                    cid = msg.get("client_id")
-                    if not cid:
-                        self.send_message({"type": "error", "message": "no client_id"})
+                    raw = read_frame(self.rfile, self.frame_started_now, max_frame)
+                except FrameTooLarge:
+                    reject_oversize(self, max_frame)
+                    break
+                except (ValueError, OSError):
+                    break
+                if not raw:
+                    break
+                self.frame_done()
+                msg = None
+                if self.limiter is not None:
+                    admitted, msg = self.limiter.admit_frame(self, raw, self.last_seen)
+                    if not admitted:
+                        self.metrics.frame_in(len(raw))
                         continue
-                    # attempt to add
-                    ok = LOBBY.add(cid, self)
-                    if not ok:
-                        self.send_message({"type": "error", "message": "lobby_full"})
-                        break
-                    self.client_id = cid
-                    self.send_message({"type": "joined", "client_id": cid})
-                    LOBBY.broadcast({"type": "lobby_update", "clients": LOBBY.list_clients()})
-                elif mtype == "start_level":
-                    # leader requested a level start; server will spawn mobs scaled to player count
-                    level_no = int(msg.get("level", 1))
-                    players = len(LOBBY.list_clients())
-                    level = Level(level_no)
-                    mobs = level.spawn_mobs(player_count=players)
-                    # serialize mobs minimally
-                    mobs_ser = [{"name": m.name, "hp": m.hp, "attack": m.attack, "defense": m.defense, "crystal_drop": getattr(m, "crystal_drop", 0)} for m in mobs]
-                    LOBBY.broadcast({"type": "level_started", "level": level_no, "player_count": players, "mobs": mobs_ser})
-                elif mtype == "leave":
+                if msg is None:
+                    msg = decode_frame(raw)
+                self.metrics.frame_in(len(raw), msg is not None)
+                if msg is None:
+                    continue
+                if not handle_message(rooms, self, msg):
                     break
-                else:
-                    # unknown message - echo to others
-                    pass
         finally:
-            if getattr(self, "client_id", None):
-                LOBBY.remove(self.client_id)
-                LOBBY.broadcast({"type": "lobby_update", "clients": LOBBY.list_clients()})
+            handle_connection_lost(rooms, self)
+
+    def finish(self):
+        # let the writer flush anything already queued (e.g. a final error) before closing
+        self.outbound.close()
+        self._writer.join(timeout=2.0)
+        self.metrics.connection_closed(self)
+        super().finish()
+
+    def frame_started_now(self):
+        self.frame_started = time.monotonic()
+
+    def frame_done(self):
+        self.last_seen = self.frame_started
+        self.frame_started = 0.0
 
     def send_message(self, msg: Dict):
-        raw = json.dumps(msg, separators=(",", ":")) + "\n"
+        self.send_frame(encode_frame(msg, self.codec))
+
+    def send_frame(self, frame: bytes):
+        if not self.outbound.put(frame) and self.outbound.overflowed:
+            self.drop_connection()
+
+    def send_state_frame(self, frame: bytes):
+        """A snapshot: over the UDP channel if this client has one up, else like any other frame."""
+        udp = self.udp
+        if udp is None or not udp.send_state(frame):
+            self.send_frame(frame)
+
+    def _write_loop(self):
+        while True:
+            batch = self.outbound.get_batch()
+            if batch is None:
+                break
+            if not batch:
+                continue
+            if self.compressor is not None:
+                batch = [self.compressor.compress(frame) for frame in batch]
+            data = b"".join(batch)
+            try:
+                self.wfile.write(data)
+                self.wfile.flush()
+            except Exception:
+                self.outbound.close()
+                break
+            self.metrics.frames_sent(len(batch), len(data))
+        if self.outbound.overflowed:
+            self.drop_connection()
+
+    def drop_connection(self):
+        # wakes the blocked rfile read in handle(), which then runs the normal cleanup
         try:
-            self.wfile.write(raw.encode("utf-8"))
-            self.wfile.flush()
-        except Exception:
+            self.connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
             pass
 
 
 class ThreadedTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
     allow_reuse_address = True
+    # socketserver defaults to a listen backlog of 5, which drops SYNs under connection bursts
+    request_queue_size = 128
+    queue_size = DEFAULT_QUEUE_SIZE
+    overflow_policy = DROP_OLDEST
+    max_frame = MAX_CLIENT_FRAME
+    rate_limits = DEFAULT_RATE_LIMITS
+    rooms = ROOMS
+    reaper: Optional[Reaper] = None
 
+    def server_close(self):
+        if self.reaper is not None:
+            self.reaper.stop()
+        if self.rooms.udp is not None:
+            self.rooms.udp.close()
+        super().server_close()
 
-def start_server(host: str = "0.0.0.0", port: int = 6000):
+
+def start_server(host: str = "0.0.0.0", port: int = 6000, queue_size: int = DEFAULT_QUEUE_SIZE,
+                 overflow_policy: str = DROP_OLDEST, rooms: Optional[RoomManager] = None, tick_rate: int = 0,
+                 stats_port: int = 0, ping_interval: float = DEFAULT_PING_INTERVAL,
+                 idle_timeout: float = DEFAULT_IDLE_TIMEOUT, read_timeout: float = DEFAULT_READ_TIMEOUT,
+                 resume_grace: float = DEFAULT_RESUME_GRACE, max_frame: int = MAX_CLIENT_FRAME,
+                 rate_limits: Optional[Dict] = DEFAULT_RATE_LIMITS, journal_dir: Optional[str] = None,
+                 udp: bool = False):
+    """
+    rate_limits maps message type -> (per second, burst), see ratelimit.py; None disables limiting.
+    journal_dir records every simulated level run for offline replay (journal.py).
+    udp offers clients snapshots over UDP on the same port number (udp_channel.py).
+    """
+    if overflow_policy not in OVERFLOW_POLICIES:
+        raise ValueError(f"unknown overflow policy {overflow_policy!r}")
     server = ThreadedTCPServer((host, port), RequestHandler)
+    server.queue_size = queue_size
+    server.overflow_policy = overflow_policy
+    server.max_frame = max_frame
+    server.rate_limits = rate_limits
+    if rooms is None and tick_rate:
+        rooms = RoomManager(tick_rate=tick_rate)
+    if rooms is not None:
+        server.rooms = rooms
+    server.rooms.sessions.grace = resume_grace
+    server.rooms.journal_dir = journal_dir
+    server.reaper = Reaper(server.rooms.metrics, ping_interval, idle_timeout, read_timeout)
+    server.reaper.start_thread()
+    if udp:
+        rooms = server.rooms
+        rooms.udp = UdpChannel(host, server.server_address[1], lambda conn, frame: handle_datagram(rooms, conn, frame))
+        rooms.udp.start_thread()
     t = threading.Thread(target=server.serve_forever, daemon=True)
     t.start()
-    print(f"Multiplayer server started on {host}:{port} (max players {MAX_PLAYERS})")
+    if stats_port:
+        serve_stats_http(lambda: server.rooms.metrics.snapshot(server.rooms), stats_port)
+    print(f"Multiplayer server started on {host}:{port} (max players per room {MAX_PLAYERS})")
     return server
\ No newline at end of file
@@ -0,0 +1,200 @@
+"""
+Resumable sessions.
+
+A successful join gets a resume token (the "resume" field of "joined"). When a
+connection is lost without an explicit leave -- network drop, reaped by the
+heartbeat, dropped for overflowing its queue -- the player's room slot is held
+by a DetachedConn placeholder for a grace period instead of being freed, and
+the room's snapshot stream pins the player's last acknowledged state. A new
+connection sending {"type":"resume","token":T,"room":R} within the grace period
+takes the slot back ("resumed", carrying a fresh token), and its next snapshot
+is a delta against that acknowledged state rather than a keyframe.
+
+A resume can also take over a connection the server still thinks is live (the
+client noticed the drop first); the stale connection is closed. When the grace
+period ends the slot is freed as for any other disconnect.
+"""
+import asyncio
+import secrets
+import threading
+from typing import Callable, Dict, Optional
+
+# seconds a lost connection's slot is held for a resume; 0 disables resume tokens
+DEFAULT_RESUME_GRACE = 30.0
+
+
+class DetachedConn:
+    """Holds a disconnected player's room slot; anything sent to it is discarded."""
+    outbound = None
+    detached = True
+
+    def __init__(self, client_id: str, room, player_class: str, codec: str):
+        self.client_id = client_id
+        self.room = room
+        self.player_class = player_class
+        self.codec = codec
+        self.session: Optional["Session"] = None
+
+    def send_message(self, msg: Dict):
+        pass
+
+    def send_frame(self, frame: bytes):
+        pass
+
+    def drop_connection(self):
+        pass
+
+
+class Session:
+    def __init__(self, token: str, conn):
+        self.token = token
+        # the live connection, or a DetachedConn while the client is away
+        self.conn = conn
+        # pending expiry (asyncio.TimerHandle or threading.Timer) while detached
+        self.timer = None
+
+
+def _call_later(delay: float, fn: Callable, *args):
+    """Run fn(*args) after delay on the running event loop if there is one, else on a timer thread."""
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    if loop is not None:
+        return loop.call_later(delay, fn, *args)
+    timer = threading.Timer(delay, fn, args)
+    timer.daemon = True
+    timer.start()
+    return timer
+
+
+class SessionStore:
+    """Resume tokens for one RoomManager; connections point at their Session via conn.session."""
+    def __init__(self, grace: float = DEFAULT_RESUME_GRACE):
+        self.grace = grace
+        self.lock = threading.Lock()
+        self.sessions: Dict[str, Session] = {}
+        # counters
+        self.issued = 0
+        self.resumed = 0
+        self.takeovers = 0
+        self.expired = 0
+        self.failed = 0
+
+    def issue(self, conn) -> Optional[str]:
+        """New token for a connection that just joined or resumed; None when resume is disabled."""
+        self.discard(conn)
+        if self.grace <= 0:
+            return None
+        session = Session(secrets.token_urlsafe(16), conn)
+        with self.lock:
+            self.sessions[session.token] = session
+            self.issued += 1
+        conn.session = session
+        return session.token
+
+    def discard(self, conn):
+        """Forget conn's session (explicit leave, room switch, expiry)."""
+        session = getattr(conn, "session", None)
+        if session is None:
+            return
+        conn.session = None
+        with self.lock:
+            if self.sessions.get(session.token) is session:
+                del self.sessions[session.token]
+        if session.timer is not None:
+            session.timer.cancel()
+
+    def detach(self, conn, on_expire: Callable[[DetachedConn], None]) -> bool:
+        """
+        Hold conn's room slot for the grace period; on_expire(placeholder) runs if
+        nobody resumes. Returns False if conn has no session to hold.
+        """
+        session = getattr(conn, "session", None)
+        room = getattr(conn, "room", None)
+        cid = getattr(conn, "client_id", None)
+        if session is None or session.conn is not conn or room is None or not cid:
+            return False
+        held = DetachedConn(cid, room, getattr(conn, "player_class", "warrior"), getattr(conn, "codec", "json"))
+        with room.lock:
+            if room.closed or room.clients.get(cid) is not conn:
+                return False
+            room.clients[cid] = held
+        conn.session = None
+        conn.room = None
+        held.session = session
+        session.conn = held
+        if room.sim is not None:
+            room.sim.snapshots.hold(cid)
+        session.timer = _call_later(self.grace, self._expire, session, on_expire)
+        return True
+
+    def _expire(self, session: Session, on_expire: Callable[[DetachedConn], None]):
+        with self.lock:
+            if self.sessions.get(session.token) is not session or not isinstance(session.conn, DetachedConn):
+                return
+            del self.sessions[session.token]
+            self.expired += 1
+        session.timer = None
+        on_expire(session.conn)
+
+    def resume(self, token, conn, greet: Callable[[object], None]):
+        """
+        Move the session for token onto conn and put conn in its room slot.
+        greet(old) runs under the room lock just before conn takes the slot, so
+        whatever it sends (the "resumed" reply) is queued ahead of any broadcast
+        or snapshot. Returns the connection conn replaced -- a DetachedConn, or a
+        stale live connection the caller should close -- or None for an
+        unknown/expired token.
+        """
+        with self.lock:
+            session = self.sessions.pop(token, None) if isinstance(token, str) else None
+            if session is None:
+                self.failed += 1
+                return None
+        old = session.conn
+        room = old.room
+        ok = False
+        if room is not None:
+            with room.lock:
+                if not room.closed and room.clients.get(old.client_id) is old:
+                    conn.client_id = old.client_id
+                    conn.room = room
+                    conn.player_class = old.player_class
+                    greet(old)
+                    room.clients[old.client_id] = conn
+                    ok = True
+        if session.timer is not None:
+            session.timer.cancel()
+            session.timer = None
+        if not ok:
+            with self.lock:
+                self.failed += 1
+            return None
+        old.session = None
+        old.room = None
+        with self.lock:
+            if isinstance(old, DetachedConn):
+                self.resumed += 1
+            else:
+                self.takeovers += 1
+        return old
+
+    def release(self, room, client_id: str):
+        """Free a held slot for client_id, e.g. when the player joins again instead of resuming."""
+        with room.lock:
+            held = room.clients.get(client_id)
+            if not isinstance(held, DetachedConn):
+                return
+            del room.clients[client_id]
+        self.discard(held)
+        if room.sim is not None:
+            # the new connection has none of the old baselines
+            room.sim.snapshots.forget(client_id)
+
+    def stats(self) -> Dict:
+        with self.lock:
+            held = sum(1 for s in self.sessions.values() if isinstance(s.conn, DetachedConn))
+            return {"grace_s": self.grace, "active": len(self.sessions) - held, "held": held,
+                    "issued": self.issued, "resumed": self.resumed, "takeovers": self.takeovers,
+                    "expired": self.expired, "failed": self.failed}
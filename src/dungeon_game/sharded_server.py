@@ -0,0 +1,511 @@
+"""
+Process-sharded multiplayer server.
+
+A front-end asyncio acceptor owns every client socket and its outbound queue;
+rooms live in N worker processes, each running its own RoomManager and the same
+handle_message rules as server.py. A room is pinned to worker
+crc32(room_id) % N, so a worker's rooms never share a GIL with another worker's.
+
+Front end and workers talk over one socketpair per worker using small
+length-prefixed records (see _HEADER). The front end only parses client lines
+that can change routing (join / create_room / list_rooms); everything else is
+forwarded as raw bytes, in whichever codec the client used. Broadcasts cross the pipe once per room, tagged with
+all recipient connection ids, and are fanned out by the front end. Heartbeats are
+the front end's business too: it pings and reaps client sockets and answers
+client pings itself, and a reaped client reaches its worker as a K_CLOSE.
+So is the UDP snapshot channel (udp_channel.py): workers send snapshots as
+K_STATE records and the front end picks datagram or TCP per client.
+"""
+import asyncio
+import itertools
+import json
+import multiprocessing
+import socket
+import struct
+import time
+import zlib
+from typing import Dict, List, Optional, Set
+
+from .aio_server import AsyncConnection, MAX_LINE
+from .outbound import DEFAULT_QUEUE_SIZE, DROP_OLDEST, OVERFLOW_POLICIES
+from .metrics import ServerMetrics, serve_stats_http
+from .heartbeat import Reaper, DEFAULT_PING_INTERVAL, DEFAULT_IDLE_TIMEOUT, DEFAULT_READ_TIMEOUT
+from .protocol import (decode_frame, encode_frame, encode_message, peek_type, read_frame_async, FrameTooLarge,
+                       JSON_CODEC, CODECS, MAX_CLIENT_FRAME)
+from .ratelimit import DEFAULT_RATE_LIMITS
+from .latency import pong_for
+from .compression import negotiate
+from .udp_channel import UdpChannel
+from .rooms import RoomManager, DEFAULT_ROOM, MAX_PLAYERS
+from .server import (handle_message, handle_disconnect, handle_connection_lost, reject_oversize, reply_fields,
+                     int_field, requested_room, MAX_ROOM_LIST)
+from .sessions import DEFAULT_RESUME_GRACE
+
+# record header: payload length, record kind, connection / request id
+_HEADER = struct.Struct("!IBI")
+_ID = struct.Struct("!I")
+# the (empty) frame of K_LEVEL records, one object so WorkerLink batches their ids
+_NO_FRAME = b""
+
+# front end -> worker
+K_DATA = 1    # id=conn_id, payload=one client line
+K_CLOSE = 2   # id=conn_id, client went away
+K_QUERY = 3   # id=request id, payload=json query
+K_LEAVE = 9   # id=conn_id, client moved to a room on another worker: free its slot now (no resume hold)
+# worker -> front end
+K_SEND = 4    # id=recipient count, payload=ids + frame
+K_DROP = 5    # id=conn_id, worker wants the client disconnected
+K_REPLY = 6   # id=request id, payload=json reply
+K_STATE = 7   # as K_SEND, for snapshots: the front end may send them over a client's UDP channel
+K_LEVEL = 8   # id=count, payload=conn ids: a level just started, send each client's channel its udp_level
+
+# stop reading from a client while its worker's pipe has this much unsent data
+LINK_HIGH_WATER = 1 << 20
+
+
+def worker_for(room_id: str, workers: int) -> int:
+    return zlib.crc32(room_id.encode("utf-8")) % workers
+
+
+async def _read_record(reader: asyncio.StreamReader):
+    header = await reader.readexactly(_HEADER.size)
+    length, kind, ident = _HEADER.unpack(header)
+    payload = await reader.readexactly(length) if length else b""
+    return kind, ident, payload
+
+
+def _record(kind: int, ident: int, payload: bytes = b"") -> bytes:
+    return _HEADER.pack(len(payload), kind, ident) + payload
+
+
+# ---------------------------------------------------------------- worker side
+
+class WorkerConn:
+    """Worker-side stand-in for a client; frames go back to the front end."""
+    def __init__(self, link: "WorkerLink", conn_id: int):
+        self.link = link
+        self.conn_id = conn_id
+        self.client_id: Optional[str] = None
+        self.room = None
+        self.codec = JSON_CODEC
+        self.session = None
+
+    def send_message(self, msg: Dict):
+        self.send_frame(encode_frame(msg, self.codec))
+
+    def send_frame(self, frame: bytes):
+        self.link.queue_frame(self.conn_id, frame)
+
+    def send_state_frame(self, frame: bytes):
+        self.link.queue_frame(self.conn_id, frame, K_STATE)
+
+    def mark_udp_level(self):
+        self.link.queue_frame(self.conn_id, _NO_FRAME, K_LEVEL)
+
+    def drop_connection(self):
+        self.link.drop(self.conn_id)
+
+
+class WorkerLink:
+    """Batches outgoing frames; consecutive sends of the same frame object become one record."""
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.pending: List[list] = []  # [frame, [conn_ids], kind]
+        self._loop = asyncio.get_running_loop()
+
+    def queue_frame(self, conn_id: int, frame: bytes, kind: int = K_SEND):
+        if self.pending and self.pending[-1][0] is frame and self.pending[-1][2] == kind:
+            self.pending[-1][1].append(conn_id)
+        else:
+            if not self.pending:
+                # frames queued outside record handling (simulation ticks, session expiry
+                # timers) would otherwise wait for the next record from the front end
+                self._loop.call_soon(self.flush)
+            self.pending.append([frame, [conn_id], kind])
+
+    def flush(self):
+        if not self.pending:
+            return
+        out = []
+        for frame, ids, kind in self.pending:
+            out.append(_record(kind, len(ids), b"".join(_ID.pack(i) for i in ids) + frame))
+        self.pending = []
+        self.writer.write(b"".join(out))
+
+    def drop(self, conn_id: int):
+        """Ask the front end to close a client once what was queued for it is sent."""
+        self.flush()
+        self.writer.write(_record(K_DROP, conn_id))
+
+
+async def _worker_loop(sock: socket.socket, tick_rate: int = 0, resume_grace: float = DEFAULT_RESUME_GRACE,
+                       journal_dir: Optional[str] = None):
+    reader, writer = await asyncio.open_connection(sock=sock, limit=MAX_LINE)
+    link = WorkerLink(writer)
+    rooms = RoomManager(tick_rate=tick_rate, resume_grace=resume_grace, journal_dir=journal_dir)
+    rooms.metrics.loop = asyncio.get_running_loop()
+    conns: Dict[int, WorkerConn] = {}
+    while True:
+        try:
+            kind, ident, payload = await _read_record(reader)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            break
+        if kind == K_DATA:
+            conn = conns.get(ident)
+            if conn is None:
+                conn = conns[ident] = WorkerConn(link, ident)
+            msg = decode_frame(payload)
+            rooms.metrics.frame_in(len(payload), msg is not None)
+            try:
+                keep = msg is None or handle_message(rooms, conn, msg)
+            except Exception:
+                # handle_message has counted it; one bad client must not take the worker's other rooms down
+                keep = False
+                try:
+                    conn.send_message({"type": "error", "message": "internal_error"})
+                except Exception:
+                    pass
+            if not keep:
+                handle_disconnect(rooms, conn)
+                conns.pop(ident, None)
+                link.drop(ident)
+        elif kind == K_CLOSE:
+            conn = conns.pop(ident, None)
+            if conn is not None:
+                handle_connection_lost(rooms, conn)
+        elif kind == K_LEAVE:
+            conn = conns.pop(ident, None)
+            if conn is not None:
+                # as server._dispatch does on a room switch: the player chose to go
+                handle_disconnect(rooms, conn)
+        elif kind == K_QUERY:
+            query = json.loads(payload)
+            reply = {}
+            if query.get("type") == "list_rooms":
+                reply = {"total": len(rooms), "rooms": rooms.list_rooms(0, int(query.get("upto", MAX_ROOM_LIST)))}
+            elif query.get("type") == "stats":
+                reply = rooms.metrics.snapshot(rooms, per_client=bool(query.get("per_client", True)))
+            link.flush()
+            writer.write(_record(K_REPLY, ident, json.dumps(reply).encode("utf-8")))
+        link.flush()
+        # only wait on the pipe once it is actually backed up
+        if writer.transport.get_write_buffer_size() > LINK_HIGH_WATER:
+            await writer.drain()
+
+
+def worker_main(sock: socket.socket, tick_rate: int = 0, inherited: List[socket.socket] = (),
+                resume_grace: float = DEFAULT_RESUME_GRACE, journal_dir: Optional[str] = None):
+    """multiprocessing target: run one room worker until the front end goes away."""
+    # front-end ends of the socketpairs copied into this process by fork; holding them
+    # would keep our own pipe open after the front end exits, so we'd never see EOF
+    for s in inherited:
+        s.close()
+    try:
+        asyncio.run(_worker_loop(sock, tick_rate, resume_grace, journal_dir))
+    except KeyboardInterrupt:
+        pass
+
+
+# ------------------------------------------------------------- front-end side
+
+class FrontendConnection(AsyncConnection):
+    def __init__(self, reader, writer, conn_id: int, queue_size: int, overflow_policy: str,
+                 metrics: Optional[ServerMetrics] = None, rate_limits: Optional[Dict] = None):
+        super().__init__(reader, writer, queue_size, overflow_policy, metrics, rate_limits)
+        self.conn_id = conn_id
+        # worker currently holding this client's room (None until it joins one)
+        self.worker: Optional[int] = None
+        # every worker that has seen this connection and must be told when it closes
+        self.workers: Set[int] = set()
+        self.dropped = False
+
+
+class ShardedFrontend:
+    def __init__(self, workers: int = 2, queue_size: int = DEFAULT_QUEUE_SIZE, overflow_policy: str = DROP_OLDEST,
+                 tick_rate: int = 0, ping_interval: float = DEFAULT_PING_INTERVAL,
+                 idle_timeout: float = DEFAULT_IDLE_TIMEOUT, read_timeout: float = DEFAULT_READ_TIMEOUT,
+                 resume_grace: float = DEFAULT_RESUME_GRACE, max_frame: int = MAX_CLIENT_FRAME,
+                 rate_limits: Optional[Dict] = DEFAULT_RATE_LIMITS, journal_dir: Optional[str] = None,
+                 udp: bool = False):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"unknown overflow policy {overflow_policy!r}")
+        self.worker_count = max(1, int(workers))
+        self.queue_size = queue_size
+        self.overflow_policy = overflow_policy
+        # size caps and rate limits are enforced here, so floods never reach a worker
+        self.max_frame = max_frame
+        self.rate_limits = rate_limits
+        self.tick_rate = tick_rate
+        # resume sessions live in the workers, next to the rooms they hold slots in
+        self.resume_grace = resume_grace
+        # workers journal their own rooms; file names carry the worker pid
+        self.journal_dir = journal_dir
+        # client sockets are the front end's, so the UDP channel (udp_channel.py) is too; opened by serve()
+        self.udp_enabled = udp
+        self.udp: Optional[UdpChannel] = None
+        self.conns: Dict[int, FrontendConnection] = {}
+        self.procs: List[multiprocessing.Process] = []
+        self.links: List[asyncio.StreamWriter] = []
+        self._conn_ids = itertools.count(1)
+        self._room_ids = itertools.count(1)
+        self._req_ids = itertools.count(1)
+        self._pending: Dict[int, asyncio.Future] = {}
+        # connections and traffic seen by the front end; rooms and messages are counted per worker
+        self.metrics = ServerMetrics()
+        self.reaper = Reaper(self.metrics, ping_interval, idle_timeout, read_timeout)
+        self._reaper_task: Optional[asyncio.Future] = None
+
+    async def start_workers(self):
+        parent_socks = []
+        for idx in range(self.worker_count):
+            parent_sock, child_sock = socket.socketpair()
+            parent_socks.append(parent_sock)
+            proc = multiprocessing.Process(target=worker_main,
+                                           args=(child_sock, self.tick_rate, parent_socks, self.resume_grace,
+                                                 self.journal_dir),
+                                           daemon=True, name=f"room-worker-{idx}")
+            proc.start()
+            child_sock.close()
+            reader, writer = await asyncio.open_connection(sock=parent_sock, limit=MAX_LINE)
+            self.procs.append(proc)
+            self.links.append(writer)
+            asyncio.ensure_future(self._read_worker(idx, reader))
+
+    def stop_workers(self):
+        self.reaper.stop()
+        if self.udp is not None:
+            self.udp.close()
+        for writer in self.links:
+            writer.close()
+        for proc in self.procs:
+            proc.join(timeout=2.0)
+            if proc.is_alive():
+                proc.terminate()
+
+    async def _read_worker(self, idx: int, reader: asyncio.StreamReader):
+        while True:
+            try:
+                kind, ident, payload = await _read_record(reader)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                break
+            if kind == K_SEND or kind == K_STATE:
+                cut = ident * _ID.size
+                frame = payload[cut:]
+                for (conn_id,) in _ID.iter_unpack(payload[:cut]):
+                    conn = self.conns.get(conn_id)
+                    if conn is not None:
+                        if kind == K_STATE:
+                            conn.send_state_frame(frame)
+                        else:
+                            conn.send_frame(frame)
+            elif kind == K_LEVEL:
+                # after the level_started broadcast, which came first on this pipe, as did the old level's snapshots
+                for (conn_id,) in _ID.iter_unpack(payload[:ident * _ID.size]):
+                    conn = self.conns.get(conn_id)
+                    if conn is not None and conn.udp is not None:
+                        conn.send_message(conn.udp.level_message())
+            elif kind == K_DROP:
+                conn = self.conns.get(ident)
+                if conn is not None:
+                    conn.dropped = True
+                    conn.workers.discard(idx)
+                    # flush what is queued (e.g. lobby_full), then the write loop closes the socket
+                    conn.outbound.close()
+            elif kind == K_REPLY:
+                fut = self._pending.pop(ident, None)
+                if fut is not None and not fut.done():
+                    fut.set_result(json.loads(payload))
+        print(f"room worker {idx} exited")
+
+    def _forward(self, conn: FrontendConnection, idx: int, line: bytes):
+        conn.workers.add(idx)
+        self.links[idx].write(_record(K_DATA, conn.conn_id, line))
+
+    def _udp_message(self, conn: FrontendConnection, frame: bytes):
+        """A frame from a client's UDP channel: snapshot acks go on to its worker like a client line."""
+        if peek_type(frame) != "ack" or conn.worker is None or conn.dropped:
+            return
+        if conn.limiter is not None and not conn.limiter.admit_frame(conn, frame, time.monotonic())[0]:
+            return
+        self._forward(conn, conn.worker, frame)
+
+    async def query_all(self, query: Dict) -> List[Dict]:
+        loop = asyncio.get_running_loop()
+        futs = []
+        payload = json.dumps(query).encode("utf-8")
+        for writer in self.links:
+            req_id = next(self._req_ids)
+            fut = loop.create_future()
+            self._pending[req_id] = fut
+            futs.append(fut)
+            writer.write(_record(K_QUERY, req_id, payload))
+        return await asyncio.gather(*futs)
+
+    async def stats(self, per_client: bool = True) -> Dict:
+        out = {"frontend": self.metrics.snapshot(per_client=per_client),
+               "workers": await self.query_all({"type": "stats", "per_client": per_client})}
+        if self.udp is not None:
+            out["udp"] = self.udp.stats()
+        return out
+
+    async def _list_rooms(self, conn: FrontendConnection, msg: Dict):
+        offset = int_field(msg, "offset", 0, lo=0)
+        limit = int_field(msg, "limit", 100, lo=0, hi=MAX_ROOM_LIST)
+        if offset is None or limit is None:
+            self.metrics.observe_error("bad_field")
+            conn.send_message({"type": "error", "message": "bad_field",
+                               "field": "offset" if offset is None else "limit", **reply_fields(msg)})
+            return
+        replies = await self.query_all({"type": "list_rooms", "upto": offset + limit})
+        merged = [r for reply in replies for r in reply["rooms"]]
+        conn.send_message({"type": "room_list", "total": sum(r["total"] for r in replies), "offset": offset,
+                           "rooms": merged[offset:offset + limit], **reply_fields(msg)})
+
+    def _route(self, conn: FrontendConnection, raw: bytes) -> Optional[int]:
+        """Pick the worker for one client line, rewriting it if the front end must assign a room id."""
+        if b'"join"' in raw or b'"create_room"' in raw or b'"resume"' in raw:
+            msg = decode_frame(raw)
+            mtype = msg.get("type") if msg else None
+            if mtype in ("join", "resume"):
+                # a resume names the room its token belongs to, so it routes like a join
+                if msg.get("codec") in CODECS:
+                    # the worker switches codec on join; match it for replies sent from here
+                    conn.codec = msg["codec"]
+                if conn.compressor is None:
+                    # the worker confirms it in "joined"; frames to this client are compressed here
+                    conn.compressor = negotiate(msg, self.metrics)
+                if mtype == "join" and msg.get("client_id") is not None:
+                    # only a label here (metrics' latency listing); the worker owns the identity
+                    conn.client_id = str(msg["client_id"])
+                # the room the worker will look up, so a join without one meets everyone else in the default room
+                room_id = requested_room(msg)
+                idx = worker_for(DEFAULT_ROOM if room_id is None else room_id, self.worker_count)
+                if conn.worker is not None and conn.worker != idx:
+                    # moving to a room on another worker: leave the old one there first
+                    self.links[conn.worker].write(_record(K_LEAVE, conn.conn_id))
+                    conn.workers.discard(conn.worker)
+                conn.worker = idx
+                if self.udp is not None and msg.get("udp"):
+                    # sent ahead of the worker's "joined"; the client takes it in either order
+                    conn.send_message(self.udp.offer(conn))
+                return idx
+            if mtype == "create_room":
+                room_id = requested_room(msg)
+                if room_id is None:
+                    # ids must be unique across workers, so the front end hands them out
+                    room_id = msg["room"] = f"room-{next(self._room_ids)}"
+                    raw = encode_message(msg)
+                idx = worker_for(room_id, self.worker_count)
+                self._forward(conn, idx, raw)
+                return None
+        if conn.worker is not None:
+            return conn.worker
+        return worker_for(DEFAULT_ROOM, self.worker_count)
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        conn = FrontendConnection(reader, writer, next(self._conn_ids), self.queue_size, self.overflow_policy,
+                                  self.metrics, self.rate_limits)
+        self.conns[conn.conn_id] = conn
+        self.metrics.connection_opened(conn)
+
+        async def write_then_close():
+            await conn.write_loop()
+            writer.close()
+
+        writer_task = asyncio.ensure_future(write_then_close())
+        try:
+            while not conn.dropped:
+                try:
+                    raw = await read_frame_async(reader, conn.frame_started_now, self.max_frame)
+                except FrameTooLarge:
+                    reject_oversize(conn, self.max_frame)
+                    break
+                except (ValueError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                if not raw:
+                    break
+                conn.frame_done()
+                self.metrics.frame_in(len(raw))
+                if conn.limiter is not None and not conn.limiter.admit_frame(conn, raw, conn.last_seen)[0]:
+                    continue
+                if b'"ping"' in raw or b'"pong"' in raw:
+                    msg = decode_frame(raw)
+                    mtype = msg.get("type") if msg else None
+                    if mtype == "ping":
+                        conn.send_message({**pong_for(msg), **reply_fields(msg)})
+                        continue
+                    if mtype == "pong":
+                        conn.latency.observe_pong(msg)
+                        continue
+                if b'"list_rooms"' in raw:
+                    msg = decode_frame(raw)
+                    if msg and msg.get("type") == "list_rooms":
+                        await self._list_rooms(conn, msg)
+                        continue
+                if b'"stats"' in raw:
+                    msg = decode_frame(raw)
+                    if msg and msg.get("type") == "stats":
+                        # as in server.py: no per-client data for whoever asks in-band
+                        conn.send_message({"type": "stats", **await self.stats(per_client=False),
+                                           **reply_fields(msg)})
+                        continue
+                idx = self._route(conn, raw)
+                if idx is not None and not conn.dropped:
+                    self._forward(conn, idx, raw)
+                    link = self.links[idx]
+                    if link.transport.get_write_buffer_size() > LINK_HIGH_WATER:
+                        await link.drain()
+        finally:
+            self.conns.pop(conn.conn_id, None)
+            self.metrics.connection_closed(conn)
+            if self.udp is not None:
+                self.udp.release(conn)
+            for idx in conn.workers:
+                self.links[idx].write(_record(K_CLOSE, conn.conn_id))
+            conn.outbound.close()
+            try:
+                await asyncio.wait_for(writer_task, timeout=2.0)
+            except (asyncio.TimeoutError, Exception):
+                writer_task.cancel()
+                writer.close()
+
+    async def serve(self, host: str = "0.0.0.0", port: int = 6000, backlog: int = 1024) -> asyncio.AbstractServer:
+        if not self.links:
+            await self.start_workers()
+        self.metrics.loop = asyncio.get_running_loop()
+        if self._reaper_task is None:
+            self._reaper_task = asyncio.ensure_future(self.reaper.run())
+        server = await asyncio.start_server(self.handle_client, host, port, limit=self.max_frame, backlog=backlog)
+        if self.udp_enabled and self.udp is None:
+            self.udp = UdpChannel(host, server.sockets[0].getsockname()[1], self._udp_message)
+            self.udp.attach(asyncio.get_running_loop())
+        return server
+
+
+def run_sharded_server(host: str = "0.0.0.0", port: int = 6000, workers: int = 2, tick_rate: int = 0,
+                       stats_port: int = 0, ping_interval: float = DEFAULT_PING_INTERVAL,
+                       idle_timeout: float = DEFAULT_IDLE_TIMEOUT, read_timeout: float = DEFAULT_READ_TIMEOUT,
+                       resume_grace: float = DEFAULT_RESUME_GRACE, max_frame: int = MAX_CLIENT_FRAME,
+                       rate_limits: Optional[Dict] = DEFAULT_RATE_LIMITS, journal_dir: Optional[str] = None,
+                       udp: bool = False):
+    """Blocking entry point used by `python -m dungeon_game.main server --workers N`."""
+    frontend = ShardedFrontend(workers, tick_rate=tick_rate, ping_interval=ping_interval,
+                               idle_timeout=idle_timeout, read_timeout=read_timeout, resume_grace=resume_grace,
+                               max_frame=max_frame, rate_limits=rate_limits, journal_dir=journal_dir, udp=udp)
+
+    async def _main():
+        server = await frontend.serve(host, port)
+        if stats_port:
+            loop = asyncio.get_running_loop()
+            serve_stats_http(lambda: asyncio.run_coroutine_threadsafe(frontend.stats(), loop).result(5.0),
+                             stats_port)
+        print(f"Sharded multiplayer server started on {host}:{port} "
+              f"({frontend.worker_count} room workers, max players per room {MAX_PLAYERS})")
+        async with server:
+            await server.serve_forever()
+    try:
+        asyncio.run(_main())
+    except KeyboardInterrupt:
+        print("Server exiting.")
+    finally:
+        frontend.stop_workers()
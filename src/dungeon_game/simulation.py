@@ -0,0 +1,401 @@
+"""
+Headless, authoritative arena simulation for the multiplayer server.
+
+ArenaSimulation runs the same rules as gui.ArenaScene.update -- ArenaMob
+chasing, Projectile flight and hits, melee, contact damage and wave scheduling
+as in ArenaScene.spawn_wave -- against a fixed-step clock instead of pygame
+and wall time, so it can run on the server and replay deterministically from
+a seed.
+
+RoomSimulation drives one ArenaSimulation for a room at a fixed tick rate,
+feeds it the players' input messages (queued and applied at the next tick
+boundary, optionally journaled, see journal.py), streams state to every client each tick
+(delta-encoded against the client's last ack, see snapshots.py) and keeps
+per-tick time-budget counters (how much of the tick interval the
+room uses, and therefore roughly how many such rooms fit on one core).
+"""
+import asyncio
+import itertools
+import random
+import threading
+import time
+import zlib
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from .arena import ArenaMob, ArenaPlayer, Projectile
+from .game import Game
+from .level import Level
+from .snapshots import SnapshotStream
+
+# arena size used by the GUI (gui.WIDTH, gui.HEIGHT)
+ARENA_SIZE = (900, 700)
+DEFAULT_TICK_RATE = 20
+# ArenaScene applies contact damage once per rendered frame at this rate
+CLIENT_FPS = 60
+WAVES_TOTAL = 5
+INTER_WAVE_DELAY = 4.0
+# journal a state digest every N ticks (see journal.py)
+CHECKPOINT_INTERVAL = 100
+# seq'd inputs waiting for their tick beyond this are applied at once, so a client can't fall behind
+MAX_INPUT_BACKLOG = 3
+
+
+class ArenaSimulation:
+    def __init__(self, level_no: int, players: Dict[str, str], seed: int = 0,
+                 bounds: Tuple[int, int] = ARENA_SIZE, waves_total: int = WAVES_TOTAL,
+                 inter_wave_delay: float = INTER_WAVE_DELAY):
+        """players maps client_id -> player class name."""
+        self.level_no = level_no
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.bounds = bounds
+        self.waves_total = waves_total
+        self.inter_wave_delay = inter_wave_delay
+        self.tick = 0
+        self.time = 0.0
+        self.players: Dict[str, ArenaPlayer] = {}
+        self.inputs: Dict[str, Dict] = {}
+        # seq'd inputs not yet applied, one per tick (see apply_input)
+        self.input_queues: Dict[str, deque] = {}
+        # entity id -> object; ids are never reused within a simulation
+        self.mobs: Dict[int, ArenaMob] = {}
+        self.projectiles: Dict[int, Projectile] = {}
+        self._ids = itertools.count(1)
+        self.current_wave = 0
+        self.next_wave_time: Optional[float] = None
+        self.coins = 0
+        self.result: Optional[str] = None  # "cleared" | "defeated"
+        for cid, player_class in players.items():
+            self.add_player(cid, player_class)
+        self.spawn_wave()
+
+    def add_player(self, client_id: str, player_class: str = "warrior"):
+        if client_id in self.players:
+            return
+        player = Game.create_player_by_class(player_class, client_id)
+        # spread players around the centre so they don't stack on one point
+        offset = 30 * len(self.players)
+        self.players[client_id] = ArenaPlayer(player, self.bounds[0] // 2 + offset, self.bounds[1] // 2)
+
+    def remove_player(self, client_id: str):
+        self.players.pop(client_id, None)
+        self.inputs.pop(client_id, None)
+        self.input_queues.pop(client_id, None)
+
+    def spawn_wave(self):
+        """Append the next wave; wave 1 uses the level seed so it matches level_started."""
+        self.current_wave += 1
+        wave_seed = self.seed + self.current_wave - 1
+        mob_list = Level(self.level_no).spawn_mobs(player_count=max(1, len(self.players)), seed=wave_seed)
+        w, h = self.bounds
+        for m in mob_list:
+            self.mobs[next(self._ids)] = ArenaMob(m, self.rng.randint(40, w - 40), self.rng.randint(40, h - 40))
+        if self.current_wave < self.waves_total:
+            self.next_wave_time = self.time + self.inter_wave_delay
+        else:
+            self.next_wave_time = None
+
+    def apply_input(self, client_id: str, msg: Dict):
+        """
+        Record one input message: {"type":"input","dx":-1..1,"dy":-1..1,"melee":bool,"fire":[x,y],"seq":n}.
+        Movement is held until the next input; melee/fire are one-shot and consumed by the next step.
+        Inputs with a seq come from a client predicting one input per tick (prediction.py): they are
+        queued and step() takes one per tick, so network jitter doesn't merge two into one tick and
+        hold the previous one for two. Without a seq an input takes effect at the next step.
+        """
+        if "seq" in msg:
+            self.input_queues.setdefault(client_id, deque()).append(msg)
+        else:
+            self._apply(client_id, msg)
+
+    def _apply(self, client_id: str, msg: Dict):
+        inp = self.inputs.setdefault(client_id, {"dx": 0.0, "dy": 0.0})
+        try:
+            if "dx" in msg:
+                inp["dx"] = max(-1.0, min(1.0, float(msg["dx"])))
+            if "dy" in msg:
+                inp["dy"] = max(-1.0, min(1.0, float(msg["dy"])))
+            if msg.get("melee"):
+                inp["melee"] = True
+            fire = msg.get("fire")
+            if fire is not None:
+                inp["fire"] = (float(fire[0]), float(fire[1]))
+            if "seq" in msg:
+                inp["seq"] = int(msg["seq"])
+        except (TypeError, ValueError, IndexError):
+            pass
+
+    def step(self, dt: float):
+        self.tick += 1
+        self.time += dt
+        now = self.time
+        if self.next_wave_time is not None and now >= self.next_wave_time and self.current_wave < self.waves_total:
+            # append next wave while previous may still be alive
+            self.spawn_wave()
+
+        for cid, queue in self.input_queues.items():
+            if queue:
+                while len(queue) > MAX_INPUT_BACKLOG:
+                    self._apply(cid, queue.popleft())
+                self._apply(cid, queue.popleft())
+
+        mobs = list(self.mobs.values())
+        for cid, ap in self.players.items():
+            inp = self.inputs.get(cid)
+            if inp is None or not ap.is_alive():
+                continue
+            ap.move(inp["dx"], inp["dy"], dt, self.bounds)
+            if inp.pop("melee", False):
+                ap.melee_attack(mobs, now=now)
+            aim = inp.pop("fire", None)
+            if aim is not None:
+                proj = ap.ranged_attack(aim, now=now)
+                if proj:
+                    self.projectiles[next(self._ids)] = proj
+
+        for pid, p in list(self.projectiles.items()):
+            p.update(dt)
+            if p.is_expired(now):
+                del self.projectiles[pid]
+                continue
+            for m in mobs:
+                if not m.is_alive():
+                    continue
+                if (p.x - m.x) ** 2 + (p.y - m.y) ** 2 <= (p.radius + m.radius) ** 2:
+                    m.take_damage(p.damage)
+                    del self.projectiles[pid]
+                    break
+
+        # mob updates and collision with players; contact damage is scaled so a tick
+        # deals what ArenaScene would deal over the same time at CLIENT_FPS
+        frames = max(1, round(dt * CLIENT_FPS))
+        alive_players = [ap for ap in self.players.values() if ap.is_alive()]
+        for m in mobs:
+            if not m.is_alive() or not alive_players:
+                continue
+            target = min(alive_players, key=lambda ap: (ap.x - m.x) ** 2 + (ap.y - m.y) ** 2)
+            m.update(dt, target.x, target.y)
+            if (m.x - target.x) ** 2 + (m.y - target.y) ** 2 <= (m.radius + target.radius) ** 2:
+                dmg = max(1, m.mob.attack - target.player.defense)
+                target.take_damage(dmg * frames)
+
+        # collect coin drops from dead mobs
+        for mid, m in list(self.mobs.items()):
+            if not m.is_alive():
+                self.coins += getattr(m.mob, "crystal_drop", 0)
+                del self.mobs[mid]
+
+        if self.current_wave >= self.waves_total and not self.mobs:
+            self.result = "cleared"
+        elif self.players and not any(ap.is_alive() for ap in self.players.values()):
+            self.result = "defeated"
+
+    def digest(self) -> int:
+        """CRC of the full-precision state, for checking a replay against the original run."""
+        parts = [self.tick, self.current_wave, self.coins, self.result]
+        parts += [(cid, ap.x, ap.y, ap.player.hp) for cid, ap in self.players.items()]
+        parts += [(mid, m.x, m.y, m.mob.hp) for mid, m in self.mobs.items()]
+        parts += [(pid, p.x, p.y) for pid, p in self.projectiles.items()]
+        return zlib.crc32(repr(parts).encode("utf-8"))
+
+    def snapshot(self) -> Dict:
+        inputs = self.inputs
+        return {
+            "type": "state",
+            "tick": self.tick,
+            "wave": self.current_wave,
+            "waves_total": self.waves_total,
+            "coins": self.coins,
+            "players": [_player_record(cid, ap, inputs.get(cid)) for cid, ap in self.players.items()],
+            "mobs": [{"id": mid, "x": round(m.x, 1), "y": round(m.y, 1), "hp": m.mob.hp}
+                     for mid, m in self.mobs.items()],
+            "projectiles": [{"id": pid, "x": round(p.x, 1), "y": round(p.y, 1)}
+                            for pid, p in self.projectiles.items()],
+        }
+
+
+def _player_record(cid: str, ap: ArenaPlayer, inp: Optional[Dict]) -> Dict:
+    rec = {"id": cid, "x": round(ap.x, 1), "y": round(ap.y, 1), "hp": ap.player.hp}
+    if inp is not None and "seq" in inp:
+        # the last input applied, so the client can reconcile its prediction (see prediction.py)
+        rec["seq"] = inp["seq"]
+    return rec
+
+
+class RoomSimulation:
+    """Runs an ArenaSimulation for one room at a fixed tick rate and broadcasts snapshots."""
+    def __init__(self, room, sim: ArenaSimulation, tick_rate: int = DEFAULT_TICK_RATE, journal=None):
+        self.room = room
+        self.sim = sim
+        self.tick_rate = max(1, int(tick_rate))
+        self.dt = 1.0 / self.tick_rate
+        self.running = False
+        self.snapshots = SnapshotStream()
+        # (client_id, message) received since the last tick; deque appends are thread-safe
+        self.inbox = deque()
+        # journal.RoomJournal recording this run, if journaling is on
+        self.journal = journal
+        # per-tick time budget counters
+        self.ticks = 0
+        self.busy = 0.0
+        self.max_tick = 0.0
+        self.overruns = 0
+
+    def submit(self, client_id: str, msg: Dict):
+        """Queue a message from a room member; inputs are applied (and everything journaled) at the next tick."""
+        if self.running and (self.journal is not None or msg.get("type") == "input"):
+            self.inbox.append((client_id, msg))
+
+    def sync_players(self) -> Dict:
+        """Add/remove simulated players to match the room; returns client_id -> connection."""
+        with self.room.lock:
+            members = dict(self.room.clients)
+        journal = self.journal
+        for cid, conn in members.items():
+            if cid not in self.sim.players:
+                player_class = getattr(conn, "player_class", "warrior")
+                self.sim.add_player(cid, player_class)
+                if journal is not None:
+                    journal.player_added(self.sim.tick, cid, player_class)
+        for cid in list(self.sim.players):
+            if cid not in members:
+                self.sim.remove_player(cid)
+                self.snapshots.forget(cid)
+                if journal is not None:
+                    journal.player_removed(self.sim.tick, cid)
+        return members
+
+    def drain_inbox(self):
+        inbox = self.inbox
+        journal = self.journal
+        tick = self.sim.tick
+        while inbox:
+            cid, msg = inbox.popleft()
+            if journal is not None:
+                journal.message(tick, cid, msg)
+            if msg.get("type") == "input":
+                self.sim.apply_input(cid, msg)
+
+    def tick_once(self):
+        t0 = time.perf_counter()
+        members = self.sync_players()
+        self.drain_inbox()
+        self.sim.step(self.dt)
+        if self.journal is not None and self.sim.tick % CHECKPOINT_INTERVAL == 0:
+            self.journal.checkpoint(self.sim)
+        self.snapshots.publish(self.sim.snapshot(), members)
+        if self.sim.result:
+            self.room.broadcast({"type": "level_result", "level": self.sim.level_no, "result": self.sim.result,
+                                 "coins": self.sim.coins, "tick": self.sim.tick})
+            self.running = False
+        elapsed = time.perf_counter() - t0
+        metrics = getattr(self.room, "metrics", None)
+        if metrics is not None:
+            metrics.observe("sim_tick", elapsed)
+        self.ticks += 1
+        self.busy += elapsed
+        if elapsed > self.max_tick:
+            self.max_tick = elapsed
+        if elapsed > self.dt:
+            self.overruns += 1
+
+    def _should_run(self) -> bool:
+        return self.running and not self.room.closed and self.room.sim is self
+
+    async def run_async(self):
+        next_tick = time.monotonic()
+        try:
+            while self._should_run():
+                self.tick_once()
+                next_tick += self.dt
+                delay = next_tick - time.monotonic()
+                if delay < -self.dt:
+                    # fell more than a tick behind; don't try to catch up in a burst
+                    next_tick = time.monotonic()
+                    delay = 0
+                await asyncio.sleep(max(0.0, delay))
+        finally:
+            self.end_journal()
+
+    def run_thread(self):
+        next_tick = time.monotonic()
+        try:
+            while self._should_run():
+                self.tick_once()
+                next_tick += self.dt
+                delay = next_tick - time.monotonic()
+                if delay < -self.dt:
+                    next_tick = time.monotonic()
+                    delay = 0
+                time.sleep(max(0.0, delay))
+        finally:
+            self.end_journal()
+
+    def end_journal(self):
+        # runs on the tick loop once it has stopped, so the journal keeps a single writer
+        journal, self.journal = self.journal, None
+        if journal is not None:
+            journal.end(self.sim)
+
+    def start(self):
+        """Tick on the running event loop if there is one (asyncio/sharded servers), else on a thread."""
+        self.running = True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is not None:
+            loop.create_task(self.run_async())
+        else:
+            threading.Thread(target=self.run_thread, daemon=True, name=f"sim-{self.room.room_id}").start()
+
+    def stop(self):
+        self.running = False
+
+    def stats(self) -> Dict:
+        avg = self.busy / self.ticks if self.ticks else 0.0
+        return {
+            **self.snapshots.stats(),
+            "tick_rate": self.tick_rate,
+            "ticks": self.ticks,
+            "avg_tick_ms": round(avg * 1000, 3),
+            "max_tick_ms": round(self.max_tick * 1000, 3),
+            "overruns": self.overruns,
+            # fraction of one core this room uses; 1 / budget_used ~ rooms per core
+            "budget_used": round(avg / self.dt, 4),
+        }
+
+
+def start_room_simulation(room, level_no: int, seed: int, tick_rate: int = DEFAULT_TICK_RATE,
+                          journal_dir: Optional[str] = None) -> RoomSimulation:
+    """Replace any running simulation in room with a fresh one for level_no, journaled to journal_dir if set."""
+    if room.sim is not None:
+        room.sim.stop()
+    with room.lock:
+        players = {cid: getattr(conn, "player_class", "warrior") for cid, conn in room.clients.items()}
+    sim = ArenaSimulation(level_no, players, seed=seed)
+    journal = None
+    if journal_dir:
+        # journal.py imports this module for replay, so load it only when it is used
+        from .journal import RoomJournal
+        try:
+            journal = RoomJournal.open(journal_dir, room.room_id, sim, players, tick_rate)
+        except OSError:
+            journal = None
+    room_sim = RoomSimulation(room, sim, tick_rate, journal)
+    room.sim = room_sim
+    room_sim.start()
+    return room_sim
+
+
+def simulation_stats(rooms: List) -> Dict:
+    """Aggregate tick-budget counters across running room simulations."""
+    sims = [r.sim for r in rooms if r.sim is not None and r.sim.running]
+    used = sum(s.stats()["budget_used"] for s in sims)
+    return {
+        "running": len(sims),
+        "core_utilization": round(used, 4),
+        "rooms_per_core": round(len(sims) / used, 1) if used else None,
+        "overruns": sum(s.overruns for s in sims),
+    }
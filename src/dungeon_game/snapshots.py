@@ -0,0 +1,248 @@
+"""
+Delta-compressed state snapshots.
+
+Server side, SnapshotStream keeps a short history of room states by tick and,
+for each client, encodes the current state as a delta against the last tick
+that client acknowledged ({"type":"ack","tick":T}): only changed fields of
+changed entities, plus spawn and despawn records. Clients without a usable
+baseline (new, never acked, or acked a tick that has aged out) get a full
+"state" keyframe, and every KEYFRAME_INTERVAL ticks everyone does, so a client
+that lost track always recovers. Clients acking the same tick (and using the
+same codec) share one encoded frame. While a player is disconnected but may
+resume (sessions.py), hold() pins its acknowledged state so the first snapshot
+after the resume can still be a delta, however long the gap. A new level
+restarts the tick count, so an ack for a tick not published yet (one still in
+flight from the last level) is ignored, and a stream that sees its ticks go
+back forgets every baseline.
+
+Client side, SnapshotReceiver rebuilds full states from keyframes and deltas
+and says which tick to acknowledge.
+"""
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from .protocol import encode_frame, JSON_CODEC
+
+ENTITY_KINDS = ("players", "mobs", "projectiles")
+SCALAR_FIELDS = ("wave", "waves_total", "coins")
+# ticks of history kept for delta baselines (~3s at 20 Hz)
+HISTORY_TICKS = 64
+# every N ticks all clients get a full keyframe
+KEYFRAME_INTERVAL = 100
+
+
+def state_from_snapshot(snap: Dict) -> Dict:
+    """Index a "state" snapshot's entity lists by id: {"mobs": {id: {"x":..,"y":..,"hp":..}}, ...}."""
+    state = {k: snap.get(k) for k in SCALAR_FIELDS}
+    state["tick"] = snap.get("tick", 0)
+    for kind in ENTITY_KINDS:
+        state[kind] = {e["id"]: {f: v for f, v in e.items() if f != "id"} for e in snap.get(kind, [])}
+    return state
+
+
+def snapshot_from_state(state: Dict) -> Dict:
+    """Inverse of state_from_snapshot: a full "state" message."""
+    snap = {"type": "state", "tick": state["tick"]}
+    for k in SCALAR_FIELDS:
+        snap[k] = state.get(k)
+    for kind in ENTITY_KINDS:
+        snap[kind] = [dict(fields, id=eid) for eid, fields in state[kind].items()]
+    return snap
+
+
+def diff_states(base: Dict, cur: Dict) -> Dict:
+    """Build a "delta" message that turns base into cur."""
+    delta = {"type": "delta", "tick": cur["tick"], "base": base["tick"]}
+    for k in SCALAR_FIELDS:
+        if cur.get(k) != base.get(k):
+            delta[k] = cur.get(k)
+    for kind in ENTITY_KINDS:
+        old = base[kind]
+        new = cur[kind]
+        spawn = []
+        update = []
+        for eid, fields in new.items():
+            prev = old.get(eid)
+            if prev is None:
+                spawn.append(dict(fields, id=eid))
+            elif prev != fields:
+                changed = {f: v for f, v in fields.items() if prev.get(f) != v}
+                changed["id"] = eid
+                update.append(changed)
+        despawn = [eid for eid in old if eid not in new]
+        section = {}
+        if spawn:
+            section["spawn"] = spawn
+        if update:
+            section["update"] = update
+        if despawn:
+            section["despawn"] = despawn
+        if section:
+            delta[kind] = section
+    return delta
+
+
+def apply_delta(base: Dict, delta: Dict) -> Dict:
+    """Apply a delta to the state it was computed against; returns a new state."""
+    state = {k: delta.get(k, base.get(k)) for k in SCALAR_FIELDS}
+    state["tick"] = delta["tick"]
+    for kind in ENTITY_KINDS:
+        ents = {eid: dict(fields) for eid, fields in base[kind].items()}
+        section = delta.get(kind)
+        if section:
+            for eid in section.get("despawn", ()):
+                ents.pop(eid, None)
+            for rec in section.get("spawn", ()):
+                ents[rec["id"]] = {f: v for f, v in rec.items() if f != "id"}
+            for rec in section.get("update", ()):
+                fields = ents.setdefault(rec["id"], {})
+                for f, v in rec.items():
+                    if f != "id":
+                        fields[f] = v
+        state[kind] = ents
+    return state
+
+
+class SnapshotStream:
+    """Per-room delta encoder; RoomSimulation calls publish() once per tick."""
+    def __init__(self, history: int = HISTORY_TICKS, keyframe_interval: int = KEYFRAME_INTERVAL):
+        self.history_ticks = history
+        self.keyframe_interval = keyframe_interval
+        self.history: "OrderedDict[int, Dict]" = OrderedDict()
+        # client_id -> last tick the client acknowledged
+        self.acks: Dict[str, int] = {}
+        # client_id -> acknowledged state kept past the history window for a resuming client
+        self.pinned: Dict[str, Dict] = {}
+        # newest tick published, -1 before the first
+        self.last_tick = -1
+        # counters
+        self.ticks = 0
+        self.keyframes_sent = 0
+        self.deltas_sent = 0
+        self.bytes_sent = 0
+        self.encode_time = 0.0
+
+    def ack(self, client_id: str, tick: int):
+        if tick > self.last_tick:
+            # never published here: an ack from before this level started
+            return
+        if tick > self.acks.get(client_id, -1):
+            self.acks[client_id] = tick
+            pin = self.pinned.get(client_id)
+            if pin is not None and tick > pin["tick"]:
+                del self.pinned[client_id]
+
+    def forget(self, client_id: str):
+        self.acks.pop(client_id, None)
+        self.pinned.pop(client_id, None)
+
+    def hold(self, client_id: str):
+        """Keep client_id's acknowledged state until it acks a newer one (or is forgotten)."""
+        state = self.history.get(self.acks.get(client_id))
+        if state is not None:
+            self.pinned[client_id] = state
+
+    def publish(self, snap: Dict, recipients: Dict[str, object]):
+        """Encode snap for every recipient (client_id -> connection) and queue the frames."""
+        t0 = time.perf_counter()
+        state = state_from_snapshot(snap)
+        tick = state["tick"]
+        if tick <= self.last_tick:
+            # a new simulation started over at tick 0: no acknowledged state belongs to it
+            self.history.clear()
+            self.acks.clear()
+            self.pinned.clear()
+        self.last_tick = tick
+        self.history[tick] = state
+        while len(self.history) > self.history_ticks:
+            self.history.popitem(last=False)
+        force_key = self.keyframe_interval > 0 and tick % self.keyframe_interval == 0
+
+        # group recipients by baseline and codec so each distinct frame is encoded once
+        groups: Dict[Tuple[Optional[int], str], List] = {}
+        baselines = self.history
+        for cid, conn in recipients.items():
+            if getattr(conn, "detached", False):
+                continue
+            base = self.acks.get(cid)
+            if force_key or base is None or base >= tick:
+                base = None
+            elif base not in baselines:
+                pin = self.pinned.get(cid)
+                if pin is None or pin["tick"] != base:
+                    base = None
+                else:
+                    if baselines is self.history:
+                        baselines = dict(self.history)
+                    baselines[base] = pin
+            groups.setdefault((base, getattr(conn, "codec", JSON_CODEC)), []).append(conn)
+
+        messages: Dict[Optional[int], Dict] = {}
+        for (base, codec), conns in groups.items():
+            msg = messages.get(base)
+            if msg is None:
+                if base is None:
+                    msg = dict(snap, keyframe=True)
+                else:
+                    msg = diff_states(baselines[base], state)
+                messages[base] = msg
+            frame = encode_frame(msg, codec)
+            if base is None:
+                self.keyframes_sent += len(conns)
+            else:
+                self.deltas_sent += len(conns)
+            self.bytes_sent += len(frame) * len(conns)
+            for conn in conns:
+                try:
+                    # connections with a UDP channel (udp_channel.py) may send it as a datagram
+                    getattr(conn, "send_state_frame", conn.send_frame)(frame)
+                except Exception:
+                    pass
+        self.ticks += 1
+        self.encode_time += time.perf_counter() - t0
+
+    def stats(self) -> Dict:
+        ticks = self.ticks or 1
+        return {
+            "bytes_per_tick": round(self.bytes_sent / ticks, 1),
+            "encode_ms_per_tick": round(self.encode_time / ticks * 1000, 4),
+            "keyframes_sent": self.keyframes_sent,
+            "deltas_sent": self.deltas_sent,
+        }
+
+
+class SnapshotReceiver:
+    """
+    Client-side reassembly of keyframes and deltas.
+    receive() returns the full state (see state_from_snapshot) or None if the
+    delta's baseline is unknown, in which case the client keeps acking its last
+    good tick and the server falls back to a keyframe.
+    """
+    def __init__(self, history: int = HISTORY_TICKS):
+        self.history_ticks = history
+        self.states: "OrderedDict[int, Dict]" = OrderedDict()
+        self.latest: Optional[Dict] = None
+
+    def receive(self, msg: Dict) -> Optional[Dict]:
+        mtype = msg.get("type")
+        if mtype == "state":
+            state = state_from_snapshot(msg)
+        elif mtype == "delta":
+            base = self.states.get(msg.get("base"))
+            if base is None:
+                return None
+            state = apply_delta(base, msg)
+        else:
+            return None
+        self.states[state["tick"]] = state
+        while len(self.states) > self.history_ticks:
+            self.states.popitem(last=False)
+        if self.latest is None or state["tick"] >= self.latest["tick"]:
+            self.latest = state
+        return state
+
+    def ack_message(self) -> Optional[Dict]:
+        if self.latest is None:
+            return None
+        return {"type": "ack", "tick": self.latest["tick"]}
@@ -0,0 +1,244 @@
+"""
+Shared-memory ring buffer for handing per-tick room state between processes.
+
+A StateRing is one multiprocessing.shared_memory block holding `slots` fixed
+size slots. The process running a room's ArenaSimulation writes the state after
+each tick (write(sim)): tick, wave and coin counters, then packed records for
+every player (id, x, y, hp, last input seq), mob (id, x, y, hp) and projectile (id, x, y) --
+straight from the simulation objects, with no snapshot dict and no pickling.
+Another process attached to the same block by name reads the new ticks with
+poll() (or the newest with latest()). Records are unpacked in place from the
+shared buffer, without copying the slot out first, into the same "state" dict
+ArenaSimulation.snapshot() builds, ready for SnapshotStream or encode_frame --
+or, for a gateway that just forwards keyframes, formatted straight into the
+JSON line (encode_keyframe / poll(keyframes=True)).
+Whether an entity is alive is its hp, as in snapshots; dead mobs are already
+gone by the time a tick ends.
+
+Each slot is guarded by a sequence counter (a seqlock): the writer makes it odd
+while writing and even when done, and a reader that sees it change (or odd)
+during a read knows the slot was being overwritten and drops it. There is one
+writer per ring. The reader stores how far it has read in the ring header, so a
+writer that must not lose ticks can check backlog() and wait; one that would
+rather stay current just keeps writing, and poll() skips what was overwritten
+(counted in `skipped`). Positions are stored as doubles so a snapshot read back
+compares equal to the one the simulation would have produced.
+"""
+import json
+import struct
+import sys
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+
+MAGIC = b"DGSR"
+DEFAULT_SLOTS = 64
+# room for ~2500 mobs / projectiles per tick
+DEFAULT_SLOT_SIZE = 64 * 1024
+# player ids are stored with a one-byte length
+MAX_ID_BYTES = 255
+
+# magic, slots, slot size, ticks published, ticks consumed by the reader
+HEADER = struct.Struct("<4sIIQQ")
+PUBLISHED_AT = 12
+CONSUMED_AT = 20
+COUNTER = struct.Struct("<Q")
+# seq, write index, tick, wave, waves_total, coins, players, mobs, projectiles
+SLOT_HEADER = struct.Struct("<QQIHHiHHH")
+# x, y, hp, last input seq (-1: none yet)
+PLAYER = struct.Struct("<ddii")
+MOB = struct.Struct("<Iddi")
+PROJECTILE = struct.Struct("<Idd")
+
+
+class StateRing:
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        self.shm = shm
+        self.buf = shm.buf
+        self.owner = owner
+        magic, self.slots, self.slot_size, _, _ = HEADER.unpack_from(self.buf, 0)
+        if magic != MAGIC:
+            raise ValueError(f"shared memory {shm.name!r} is not a state ring")
+        # reader side: next write index poll() will return
+        self.next = 0
+        self.skipped = 0
+        # writer side: ticks that didn't fit in a slot
+        self.overflows = 0
+
+    @classmethod
+    def create(cls, name: Optional[str] = None, slots: int = DEFAULT_SLOTS,
+               slot_size: int = DEFAULT_SLOT_SIZE) -> "StateRing":
+        shm = shared_memory.SharedMemory(name=name, create=True, size=HEADER.size + slots * slot_size)
+        HEADER.pack_into(shm.buf, 0, MAGIC, slots, slot_size, 0, 0)
+        for i in range(slots):
+            SLOT_HEADER.pack_into(shm.buf, HEADER.size + i * slot_size, 0, 0, 0, 0, 0, 0, 0, 0, 0)
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> "StateRing":
+        """
+        Open a ring made by create() in another process. Before Python 3.13 that process
+        should be a multiprocessing relative of the creator: they share one resource
+        tracker, so the attach isn't treated as a second owner that leaked the block.
+        """
+        if sys.version_info >= (3, 13):
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            shm = shared_memory.SharedMemory(name=name)
+        return cls(shm, owner=False)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def published(self) -> int:
+        return COUNTER.unpack_from(self.buf, PUBLISHED_AT)[0]
+
+    def backlog(self) -> int:
+        """Ticks written but not yet polled by the reader."""
+        return self.published() - COUNTER.unpack_from(self.buf, CONSUMED_AT)[0]
+
+    # ------------------------------------------------------------------ writer
+
+    def write(self, sim) -> bool:
+        """Publish sim's current state (an ArenaSimulation); False if it doesn't fit in a slot."""
+        buf = self.buf
+        players = [(cid.encode("utf-8")[:MAX_ID_BYTES], ap, sim.inputs.get(cid, {}).get("seq", -1))
+                   for cid, ap in sim.players.items()]
+        mobs = sim.mobs
+        projectiles = sim.projectiles
+        size = (SLOT_HEADER.size + sum(1 + len(cid) for cid, _, _ in players) + len(players) * PLAYER.size
+                + len(mobs) * MOB.size + len(projectiles) * PROJECTILE.size)
+        if size > self.slot_size:
+            self.overflows += 1
+            return False
+        index = self.published()
+        base = HEADER.size + (index % self.slots) * self.slot_size
+        seq = COUNTER.unpack_from(buf, base)[0] + 1
+        COUNTER.pack_into(buf, base, seq)
+        SLOT_HEADER.pack_into(buf, base, seq, index, sim.tick, sim.current_wave, sim.waves_total, sim.coins,
+                              len(players), len(mobs), len(projectiles))
+        pos = base + SLOT_HEADER.size
+        for cid, ap, input_seq in players:
+            buf[pos] = len(cid)
+            buf[pos + 1:pos + 1 + len(cid)] = cid
+            pos += 1 + len(cid)
+            PLAYER.pack_into(buf, pos, ap.x, ap.y, ap.player.hp, input_seq)
+            pos += PLAYER.size
+        pack = MOB.pack_into
+        for mid, m in mobs.items():
+            pack(buf, pos, mid, m.x, m.y, m.mob.hp)
+            pos += MOB.size
+        pack = PROJECTILE.pack_into
+        for pid, p in projectiles.items():
+            pack(buf, pos, pid, p.x, p.y)
+            pos += PROJECTILE.size
+        COUNTER.pack_into(buf, base, seq + 1)
+        COUNTER.pack_into(buf, PUBLISHED_AT, index + 1)
+        return True
+
+    # ------------------------------------------------------------------ reader
+
+    def _unpack(self, index: int) -> Optional[Tuple]:
+        """(tick, wave, waves_total, coins, players, mobs, projectiles) as tuples, or None if overwritten."""
+        buf = self.buf
+        base = HEADER.size + (index % self.slots) * self.slot_size
+        seq, stored, tick, wave, waves_total, coins, n_players, n_mobs, n_projectiles = \
+            SLOT_HEADER.unpack_from(buf, base)
+        if seq & 1 or stored != index or seq == 0:
+            return None
+        pos = base + SLOT_HEADER.size
+        try:
+            players = []
+            for _ in range(n_players):
+                n = buf[pos]
+                cid = str(buf[pos + 1:pos + 1 + n], "utf-8")
+                pos += 1 + n
+                players.append((cid,) + PLAYER.unpack_from(buf, pos))
+                pos += PLAYER.size
+            end = pos + n_mobs * MOB.size
+            mobs = list(MOB.iter_unpack(buf[pos:end]))
+            pos = end
+            end = pos + n_projectiles * PROJECTILE.size
+            projectiles = list(PROJECTILE.iter_unpack(buf[pos:end]))
+        except (struct.error, IndexError, UnicodeDecodeError):
+            # counts from a header torn by a concurrent write; the seq check would reject it anyway
+            return None
+        if COUNTER.unpack_from(buf, base)[0] != seq:
+            # the writer lapped us mid-read
+            return None
+        return tick, wave, waves_total, coins, players, mobs, projectiles
+
+    def read(self, index: int) -> Optional[Dict]:
+        """State published as write number `index`, or None if it has been overwritten (or isn't written yet)."""
+        slot = self._unpack(index)
+        if slot is None:
+            return None
+        tick, wave, waves_total, coins, players, mobs, projectiles = slot
+        return {"type": "state", "tick": tick, "wave": wave, "waves_total": waves_total, "coins": coins,
+                "players": [_player(cid, x, y, hp, seq) for cid, x, y, hp, seq in players],
+                "mobs": [{"id": mid, "x": round(x, 1), "y": round(y, 1), "hp": hp} for mid, x, y, hp in mobs],
+                "projectiles": [{"id": pid, "x": round(x, 1), "y": round(y, 1)} for pid, x, y in projectiles]}
+
+    def encode_keyframe(self, index: int) -> Optional[bytes]:
+        """
+        The JSON keyframe line for write number `index`, byte for byte what
+        encode_message(dict(read(index), keyframe=True)) returns, formatted from the
+        unpacked records without building the state dict.
+        """
+        slot = self._unpack(index)
+        if slot is None:
+            return None
+        tick, wave, waves_total, coins, players, mobs, projectiles = slot
+        # "%.1f" renders the same digits as json.dumps(round(v, 1)) for coordinates
+        return ('{"type":"state","tick":%d,"wave":%d,"waves_total":%d,"coins":%d,"players":[%s],"mobs":[%s],'
+                '"projectiles":[%s],"keyframe":true}\n' % (
+                    tick, wave, waves_total, coins,
+                    ",".join(['{"id":%s,"x":%.1f,"y":%.1f,"hp":%d%s}' % (json.dumps(cid), x, y, hp,
+                                                                           ',"seq":%d' % seq if seq >= 0 else "")
+                              for cid, x, y, hp, seq in players]),
+                    ",".join(['{"id":%d,"x":%.1f,"y":%.1f,"hp":%d}' % m for m in mobs]),
+                    ",".join(['{"id":%d,"x":%.1f,"y":%.1f}' % p for p in projectiles]))).encode("utf-8")
+
+    def poll(self, keyframes: bool = False) -> List:
+        """
+        States published since the last poll, oldest first -- as dicts, or with
+        keyframes=True as encoded keyframe lines. Overwritten ones are counted in `skipped`.
+        """
+        published = self.published()
+        if published == self.next:
+            return []
+        # the slot after the newest is the next to be overwritten, so it may be mid-write
+        start = max(self.next, published - self.slots + 1)
+        self.skipped += start - self.next
+        get = self.encode_keyframe if keyframes else self.read
+        out = []
+        for index in range(start, published):
+            state = get(index)
+            if state is None:
+                self.skipped += 1
+            else:
+                out.append(state)
+        self.next = published
+        COUNTER.pack_into(self.buf, CONSUMED_AT, published)
+        return out
+
+    def latest(self) -> Optional[Dict]:
+        published = self.published()
+        return self.read(published - 1) if published else None
+
+    def close(self):
+        """Detach; the creating side also frees the block."""
+        self.buf = None
+        self.shm.close()
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def _player(cid: str, x: float, y: float, hp: int, seq: int) -> Dict:
+    rec = {"id": cid, "x": round(x, 1), "y": round(y, 1), "hp": hp}
+    if seq >= 0:
+        rec["seq"] = seq
+    return rec
@@ -0,0 +1,509 @@
+"""
+Unreliable UDP channel for per-tick state, next to a client's TCP connection.
+
+Everything that must arrive (join, start_level, purchases, lobby updates...)
+stays on TCP. Snapshots don't need to: each one supersedes the last, and a
+delta is always against a tick the client acknowledged, so a lost snapshot
+only means the next one is a bit bigger. Over TCP, though, a lost segment
+holds back every snapshot behind it until it is retransmitted. The channel:
+
+  1. the client joins (or resumes) with "udp": true;
+  2. a server started with --udp adds {"type": "udp_offer", "token": T};
+  3. the client sends HELLO datagrams with T from its UDP socket to the
+     server's host and TCP port number, every HELLO_INTERVAL, until the
+     server echoes one;
+  4. from then on the server sends "state" / "delta" frames as STATE
+     datagrams and the client sends its snapshot acks as ACK datagrams (an
+     empty ACK every KEEPALIVE_INTERVAL while it has nothing else to send).
+
+A datagram is a HEADER followed by one frame in the connection's codec (the
+token for HELLO):
+
+    UMAGIC | kind | seq | ack | ack_bits      (network order, 14 bytes)
+
+seq numbers each side's datagrams; ack is the newest seq received from the
+peer and bit i of ack_bits stands for ack - 1 - i, so every datagram
+acknowledges the last 33 and the sender learns which ones arrived, their
+round trip and the loss rate without anything being resent. A datagram that
+is older than the newest one already received is dropped on arrival: its
+state has been superseded. Sequence numbers wrap at 2**32 and are compared
+within half of that; one more than MAX_SEQ_JUMP ahead of the newest is not a
+burst of loss but garbage, and is dropped too.
+
+A new level restarts the tick count, and datagrams of the old one may still
+be on their way when the TCP level_started arrives. So right after it the
+server sends {"type": "udp_level", "seq": N}, N being the seq of its next
+datagram; the client drops snapshot datagrams from level_started until then,
+and below N after.
+
+The server falls back to TCP for frames over MAX_PAYLOAD bytes (full
+keyframes of busy levels) and while the client hasn't acknowledged anything
+for IDLE_TIMEOUT (UDP blocked, or a NAT mapping gone); it probes with HELLO
+every PROBE_INTERVAL and switches back once one is acknowledged. Clients
+that never get the offer, or never get an echo, simply stay on TCP.
+"""
+import secrets
+import select
+import socket
+import struct
+import threading
+import time
+from array import array
+from typing import Callable, Dict, Optional, Tuple
+
+from .latency import LatencyEstimator
+
+UMAGIC = 0xB7
+# datagram kinds
+HELLO = 1   # client -> server: token; server -> client: echo of it (also the fallback probe)
+STATE = 2   # server -> client: one snapshot frame
+ACK = 3     # client -> server: one "ack" frame, or nothing (keepalive)
+HEADER = struct.Struct("!BBIII")
+# "nothing received yet" in the ack field
+NO_ACK = 0xFFFFFFFF
+ACK_BITS = 32
+# seq / ack are 32 bits on the wire
+SEQ_MOD = 1 << 32
+# a peer at 60 datagrams/s would have to lose everything for ~18 minutes to jump further than this
+MAX_SEQ_JUMP = 1 << 16
+# larger frames go over TCP; with the header and IP/UDP headers this stays under IPv6's 1280-byte minimum MTU
+MAX_PAYLOAD = 1200
+# send times kept per channel, to match acks against
+SEND_RING = 1024
+HELLO_INTERVAL = 0.25
+KEEPALIVE_INTERVAL = 0.5
+# unacknowledged datagrams this old: the server goes back to TCP
+IDLE_TIMEOUT = 2.0
+PROBE_INTERVAL = 1.0
+RECV_SIZE = 65535
+
+
+def parse(data: bytes) -> Optional[Tuple[int, int, int, int, bytes]]:
+    """(kind, seq, ack, ack_bits, payload) of one datagram, or None if it isn't one of ours."""
+    if len(data) < HEADER.size or data[0] != UMAGIC:
+        return None
+    _, kind, seq, ack, bits = HEADER.unpack_from(data)
+    return kind, seq, ack, bits, data[HEADER.size:]
+
+
+class ChannelState:
+    """Sequence numbers and acks for one end of one channel; shared by its sending and receiving threads."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.next_seq = 0
+        # newest seq received from the peer, and which of the ACK_BITS before it arrived too
+        self.remote_seq = -1
+        self.recv_bits = 0
+        # send time by seq % SEND_RING; 0 once acked or counted lost
+        self.sent_at = array("d", [0.0]) * SEND_RING
+        # sent seqs below this have been counted as acked or lost
+        self.checked = 0
+        self.newest_acked = -1
+        # when the oldest datagram sent since the last ack progress went out (0: none outstanding)
+        self.waiting_since = 0.0
+        self.rtt = LatencyEstimator()
+        # counters
+        self.sent = 0
+        self.received = 0
+        self.stale = 0
+        self.rejected = 0
+        self.acked = 0
+        self.lost = 0
+
+    def header(self, kind: int) -> bytes:
+        """The header for the next datagram this end sends."""
+        now = time.monotonic()
+        with self.lock:
+            seq = self.next_seq
+            self.next_seq += 1
+            self.sent_at[seq % SEND_RING] = now
+            self.sent += 1
+            if not self.waiting_since:
+                self.waiting_since = now
+            ack = self.remote_seq if self.remote_seq >= 0 else NO_ACK
+            return HEADER.pack(UMAGIC, kind, seq & 0xFFFFFFFF, ack, self.recv_bits)
+
+    def receive(self, seq: int, ack: int, bits: int) -> bool:
+        """
+        Take a received header; False if the datagram is a duplicate or older than the newest one,
+        or implausibly far ahead of it (drop it).
+        """
+        now = time.monotonic()
+        with self.lock:
+            ahead = (seq - self.remote_seq) % SEQ_MOD if self.remote_seq >= 0 else 1
+            if MAX_SEQ_JUMP < ahead < SEQ_MOD // 2:
+                # nothing in it is trusted, its ack included
+                self.rejected += 1
+                return False
+            if ack != NO_ACK:
+                self._acked(ack, bits, now)
+            if 0 < ahead < SEQ_MOD // 2:
+                if self.remote_seq >= 0:
+                    # the previous newest is bit ahead - 1; past the window nothing older is tracked
+                    if ahead <= ACK_BITS:
+                        self.recv_bits = ((self.recv_bits << ahead) | (1 << (ahead - 1))) & 0xFFFFFFFF
+                    else:
+                        self.recv_bits = 0
+                self.remote_seq = seq
+                self.received += 1
+                return True
+            # late or duplicated; still worth acknowledging, but its contents are old
+            behind = (self.remote_seq - seq) % SEQ_MOD
+            if 1 <= behind <= ACK_BITS:
+                self.recv_bits |= 1 << (behind - 1)
+            self.stale += 1
+            return False
+
+    def _acked(self, ack: int, bits: int, now: float):
+        # ack is our seq mod 2**32: take it as the newest one we sent that it can be
+        behind = (self.next_seq - 1 - ack) % SEQ_MOD
+        if not self.next_seq or behind >= SEND_RING:
+            # never sent, or too old to have a send time left
+            return
+        ack = self.next_seq - 1 - behind
+        oldest = self.next_seq - SEND_RING
+        for i in range(ACK_BITS + 1):
+            seq = ack - i
+            if seq < 0 or seq < oldest:
+                break
+            if i and not (bits >> (i - 1)) & 1:
+                continue
+            slot = seq % SEND_RING
+            sent = self.sent_at[slot]
+            if sent:
+                self.sent_at[slot] = 0.0
+                self.acked += 1
+                if i == 0:
+                    self.rtt.add_sample(now - sent)
+        if ack > self.newest_acked:
+            self.newest_acked = ack
+            self.waiting_since = now if ack + 1 < self.next_seq else 0.0
+        # anything sent before the ack window and never acknowledged is lost
+        low = ack - ACK_BITS
+        for seq in range(max(self.checked, oldest), low):
+            slot = seq % SEND_RING
+            if self.sent_at[slot]:
+                self.sent_at[slot] = 0.0
+                self.lost += 1
+        if low > self.checked:
+            self.checked = low
+
+    def unanswered(self, now: float) -> float:
+        """Seconds the oldest datagram sent since the newest ack has gone unacknowledged."""
+        waiting = self.waiting_since
+        return now - waiting if waiting else 0.0
+
+    def stats(self) -> Dict:
+        settled = self.acked + self.lost
+        return {"sent": self.sent, "received": self.received, "stale": self.stale, "rejected": self.rejected,
+                "acked": self.acked, "lost": self.lost, "loss": round(self.lost / settled, 4) if settled else None,
+                "rtt_ms": None if self.rtt.srtt is None else round(self.rtt.srtt * 1000, 2)}
+
+
+# ------------------------------------------------------------------ server side
+
+class UdpPeer:
+    """Server side of one connection's channel, as conn.udp; inactive until the client's HELLO."""
+    __slots__ = ("channel", "token", "addr", "state", "probed")
+
+    def __init__(self, channel: "UdpChannel", token: str):
+        self.channel = channel
+        self.token = token
+        self.addr = None
+        self.state = ChannelState()
+        self.probed = 0.0
+
+    def send_state(self, frame: bytes) -> bool:
+        """Send one snapshot frame as a datagram; False if it has to go over TCP instead."""
+        if self.addr is None:
+            return False
+        channel = self.channel
+        if len(frame) > MAX_PAYLOAD:
+            channel.too_large += 1
+            return False
+        now = time.monotonic()
+        if self.state.unanswered(now) > IDLE_TIMEOUT:
+            if now - self.probed >= PROBE_INTERVAL:
+                self.probed = now
+                channel.send(self, HELLO, self.token.encode("ascii"))
+            channel.fallbacks += 1
+            return False
+        channel.send(self, STATE, frame)
+        return True
+
+    def level_message(self) -> Dict:
+        """The udp_level message for a level starting now: its snapshots go out from this seq on."""
+        return {"type": "udp_level", "seq": self.state.next_seq % SEQ_MOD}
+
+
+class UdpChannel:
+    """
+    Server side: one UDP socket bound to the TCP listener's address. on_message(conn, frame)
+    gets the frames of ACK datagrams; offer() / release() are called as connections join and close.
+    """
+    def __init__(self, host: str, port: int, on_message: Callable[[object, bytes], None]):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.sock.setblocking(False)
+        self.on_message = on_message
+        self.lock = threading.Lock()
+        # token -> (conn, peer) for HELLO; client address -> (conn, peer) once it is known
+        self.tokens: Dict[str, Tuple[object, UdpPeer]] = {}
+        self.peers: Dict[Tuple, Tuple[object, UdpPeer]] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        # counters; acked / lost / stale of released peers are kept in retired
+        self.datagrams_in = 0
+        self.bytes_in = 0
+        self.datagrams_out = 0
+        self.bytes_out = 0
+        self.hellos = 0
+        self.invalid = 0
+        self.send_errors = 0
+        self.too_large = 0
+        self.fallbacks = 0
+        self.retired = [0, 0, 0]
+
+    def offer(self, conn) -> Dict:
+        """The udp_offer message for conn, setting up conn.udp on first use."""
+        peer = getattr(conn, "udp", None)
+        if peer is None:
+            peer = UdpPeer(self, secrets.token_urlsafe(12))
+            with self.lock:
+                self.tokens[peer.token] = (conn, peer)
+            conn.udp = peer
+        return {"type": "udp_offer", "token": peer.token}
+
+    def release(self, conn):
+        """Forget conn's channel (its connection closed)."""
+        peer = getattr(conn, "udp", None)
+        if peer is None:
+            return
+        conn.udp = None
+        with self.lock:
+            self.tokens.pop(peer.token, None)
+            if peer.addr is not None and self.peers.get(peer.addr, (None, None))[1] is peer:
+                del self.peers[peer.addr]
+            s = peer.state
+            self.retired[0] += s.acked
+            self.retired[1] += s.lost
+            self.retired[2] += s.stale
+
+    def send(self, peer: UdpPeer, kind: int, payload: bytes = b""):
+        data = peer.state.header(kind) + payload
+        try:
+            self.sock.sendto(data, peer.addr)
+        except OSError:
+            # a full socket buffer is just another lost datagram
+            self.send_errors += 1
+            return
+        self.datagrams_out += 1
+        self.bytes_out += len(data)
+
+    def datagram_received(self, data: bytes, addr):
+        self.datagrams_in += 1
+        self.bytes_in += len(data)
+        parsed = parse(data)
+        if parsed is None:
+            self.invalid += 1
+            return
+        kind, seq, ack, bits, payload = parsed
+        if kind == HELLO:
+            entry = self.tokens.get(payload.decode("ascii", "replace"))
+            if entry is None:
+                self.invalid += 1
+                return
+            conn, peer = entry
+            if peer.addr != addr:
+                with self.lock:
+                    if peer.addr is not None and self.peers.get(peer.addr, (None, None))[1] is peer:
+                        del self.peers[peer.addr]
+                    # a resumed connection's peer takes the address over from the old one
+                    self.peers[addr] = entry
+                peer.addr = addr
+            self.hellos += 1
+            peer.state.receive(seq, ack, bits)
+            self.send(peer, HELLO, peer.token.encode("ascii"))
+            return
+        entry = self.peers.get(addr)
+        if entry is None:
+            self.invalid += 1
+            return
+        conn, peer = entry
+        if not peer.state.receive(seq, ack, bits):
+            return
+        if kind == ACK and payload:
+            try:
+                self.on_message(conn, payload)
+            except Exception:
+                pass
+
+    def _drain(self):
+        while True:
+            try:
+                data, addr = self.sock.recvfrom(RECV_SIZE)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                # e.g. ICMP port unreachable from a client that went away
+                continue
+            self.datagram_received(data, addr)
+
+    def attach(self, loop):
+        """Read datagrams on an asyncio loop (the asyncio and sharded servers)."""
+        loop.add_reader(self.sock.fileno(), self._drain)
+
+    def start_thread(self):
+        """Read datagrams on a daemon thread (the threaded server)."""
+        self._running = True
+
+        def _run():
+            while self._running:
+                try:
+                    readable, _, _ = select.select([self.sock], [], [], 1.0)
+                except (OSError, ValueError):
+                    break
+                if readable:
+                    self._drain()
+        self._thread = threading.Thread(target=_run, name="udp-channel", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._running = False
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+    def stats(self) -> Dict:
+        with self.lock:
+            peers = [peer for _, peer in self.tokens.values()]
+            acked, lost, stale = self.retired
+        now = time.monotonic()
+        rtts = []
+        for peer in peers:
+            s = peer.state
+            acked += s.acked
+            lost += s.lost
+            stale += s.stale
+            if s.rtt.srtt is not None:
+                rtts.append(s.rtt.srtt)
+        return {"offered": len(peers), "active": sum(1 for p in peers if p.addr is not None
+                                                    and p.state.unanswered(now) <= IDLE_TIMEOUT),
+                "datagrams_in": self.datagrams_in, "bytes_in": self.bytes_in,
+                "datagrams_out": self.datagrams_out, "bytes_out": self.bytes_out, "hellos": self.hellos,
+                "invalid": self.invalid, "send_errors": self.send_errors, "acked": acked, "lost": lost,
+                "loss": round(lost / (acked + lost), 4) if acked + lost else None, "stale_in": stale,
+                "too_large_for_udp": self.too_large, "idle_fallbacks": self.fallbacks,
+                "rtt_ms_mean": round(sum(rtts) / len(rtts) * 1000, 2) if rtts else None}
+
+
+# ------------------------------------------------------------------ client side
+
+class UdpClient:
+    """
+    Client side, owned by network.GameClient: one UDP socket kept across reconnects;
+    each udp_offer restarts the handshake. deliver(frame, seq) gets every fresh STATE
+    frame, on this channel's receive thread.
+    """
+    def __init__(self, host: str, port: int, deliver: Callable[[bytes, int], None]):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.connect((host, port))
+        self.sock.settimeout(HELLO_INTERVAL / 2)
+        self.deliver = deliver
+        self.token: Optional[str] = None
+        self.state = ChannelState()
+        # the server echoed our HELLO: acks may go this way
+        self.ready = False
+        self.offers = 0
+        # fresh STATE frames passed to deliver
+        self.delivered = 0
+        self.datagrams_in = 0
+        self.bytes_in = 0
+        self.datagrams_out = 0
+        self.invalid = 0
+        self.send_errors = 0
+        self._last_sent = 0.0
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, name="udp-client", daemon=True)
+        self._thread.start()
+
+    def offer(self, token: str):
+        """A udp_offer for a (new) connection: its server side starts from scratch, so do we."""
+        self.state = ChannelState()
+        self.ready = False
+        self.token = token
+        self.offers += 1
+        self._last_sent = 0.0
+
+    def send_frame(self, frame: bytes) -> bool:
+        """Send an ack frame as a datagram; False while the channel isn't up (send it over TCP)."""
+        if not self.ready:
+            return False
+        self._send(ACK, frame)
+        return True
+
+    def _send(self, kind: int, payload: bytes = b""):
+        data = self.state.header(kind) + payload
+        self._last_sent = time.monotonic()
+        try:
+            self.sock.send(data)
+        except OSError:
+            self.send_errors += 1
+            return
+        self.datagrams_out += 1
+
+    def _loop(self):
+        while self._running:
+            token = self.token
+            if token is not None:
+                since = time.monotonic() - self._last_sent
+                if not self.ready and since >= HELLO_INTERVAL:
+                    self._send(HELLO, token.encode("ascii"))
+                elif self.ready and since >= KEEPALIVE_INTERVAL:
+                    # keeps the server's acks (and any NAT mapping) fresh while no snapshots come
+                    self._send(ACK)
+            try:
+                data = self.sock.recv(RECV_SIZE)
+            except socket.timeout:
+                continue
+            except OSError:
+                # nothing listening there (yet), or closed
+                if self._running:
+                    time.sleep(HELLO_INTERVAL)
+                continue
+            self._received(data)
+
+    def _received(self, data: bytes):
+        self.datagrams_in += 1
+        self.bytes_in += len(data)
+        parsed = parse(data)
+        if parsed is None:
+            self.invalid += 1
+            return
+        kind, seq, ack, bits, payload = parsed
+        if kind == HELLO:
+            if self.token is not None and payload == self.token.encode("ascii"):
+                self.state.receive(seq, ack, bits)
+                self.ready = True
+            return
+        if not self.ready:
+            # left over from an earlier connection's channel
+            return
+        if self.state.receive(seq, ack, bits) and kind == STATE and payload:
+            self.delivered += 1
+            self.deliver(payload, seq)
+
+    def close(self):
+        self._running = False
+        self.ready = False
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+    def stats(self) -> Dict:
+        return {"ready": self.ready, "offers": self.offers, "delivered": self.delivered,
+                "datagrams_in": self.datagrams_in,
+                "bytes_in": self.bytes_in, "datagrams_out": self.datagrams_out, "invalid": self.invalid,
+                "send_errors": self.send_errors, **self.state.stats()}
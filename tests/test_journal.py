@@ -0,0 +1,86 @@
+import json
+import threading
+
+from dungeon_game.journal import RoomJournal, replay, read_journal
+from dungeon_game.simulation import ArenaSimulation, RoomSimulation
+
+
+class Conn:
+    codec = "json"
+
+    def __init__(self, player_class):
+        self.player_class = player_class
+
+    def send_frame(self, frame):
+        pass
+
+
+class Room:
+    room_id = "r1"
+    closed = False
+
+    def __init__(self, clients):
+        self.lock = threading.Lock()
+        self.clients = clients
+        self.sim = None
+
+    def broadcast(self, msg):
+        pass
+
+
+def record_level(directory, ticks=350):
+    """Run a level tick by tick the way the server does, journaled; returns the journal path."""
+    room = Room({"a": Conn("warrior"), "b": Conn("mage")})
+    players = {cid: conn.player_class for cid, conn in room.clients.items()}
+    sim = ArenaSimulation(2, players, seed=11)
+    journal = RoomJournal.open(str(directory), room.room_id, sim, players, 20)
+    room_sim = RoomSimulation(room, sim, 20, journal)
+    room.sim = room_sim
+    room_sim.running = True
+    for t in range(ticks):
+        room_sim.submit("a", {"type": "input", "dx": (t // 40) % 3 - 1, "dy": 1 if t % 70 < 35 else -1,
+                              "melee": t % 9 == 0})
+        room_sim.submit("b", {"type": "input", "seq": t, "dx": 0.5, "fire": [400 + t % 50, 300]})
+        room_sim.submit("b", {"type": "ack", "tick": sim.tick})
+        if t == 200:
+            room.clients["c"] = Conn("archer")
+        if t == 300:
+            del room.clients["a"]
+        room_sim.tick_once()
+    room_sim.end_journal()
+    return journal.path
+
+
+def test_replay_matches_recording(tmp_path):
+    path = record_level(tmp_path)
+    header, records = read_journal(path)
+    kinds = [rec[1] for rec in records]
+    assert kinds.count("check") == 3 and kinds[-1] == "end"
+    assert "add" in kinds and "remove" in kinds
+    out = replay(path)
+    assert out["match"] and out["complete"]
+    assert out["checkpoints"] == 3
+    assert out["ticks"] == 350
+    # publishing snapshots alongside leaves the run unchanged
+    again = replay(path, snapshots=True)
+    assert again["match"]
+    assert {k: again[k] for k in ("ticks", "messages", "result")} == {k: out[k] for k in ("ticks", "messages", "result")}
+
+
+def test_replay_detects_a_changed_input(tmp_path):
+    path = record_level(tmp_path)
+    with open(path, "rb") as f:
+        lines = f.readlines()
+    for i, line in enumerate(lines[1:], 1):
+        rec = json.loads(line)
+        if rec[1] == "msg" and rec[2] == "a" and rec[0] == 50:
+            rec[3]["dx"] = -rec[3]["dx"] or 1
+            lines[i] = json.dumps(rec).encode() + b"\n"
+            break
+    else:
+        raise AssertionError("no input recorded at tick 50")
+    with open(path, "wb") as f:
+        f.writelines(lines)
+    out = replay(path)
+    assert not out["match"]
+    assert out["first_mismatch_tick"] is not None
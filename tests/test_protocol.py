@@ -0,0 +1,105 @@
+import asyncio
+import io
+
+import pytest
+
+from dungeon_game.compression import FrameCompressor
+from dungeon_game.protocol import (encode_frame, decode_frame, read_frame, read_frame_async, FrameDecoder,
+                                   FrameTooLarge, BINARY_CODEC, JSON_CODEC)
+from dungeon_game.simulation import ArenaSimulation
+from dungeon_game.snapshots import state_from_snapshot, diff_states
+
+
+def sample_messages():
+    sim = ArenaSimulation(3, {"a": "warrior", "b": "mage"}, seed=1)
+    for _ in range(30):
+        sim.step(0.05)
+    before = sim.snapshot()
+    for _ in range(5):
+        sim.step(0.05)
+    after = sim.snapshot()
+    return [
+        before,
+        dict(after, keyframe=True),
+        diff_states(state_from_snapshot(before), state_from_snapshot(after)),
+        {"type": "input", "seq": 5, "dx": 1, "dy": -1, "fire": [3.5, 4.0]},
+        {"type": "ack", "tick": 77},
+        {"type": "lobby_update", "room": "lobby", "clients": ["a", "b"]},
+        {"type": "joined", "client_id": "a", "nested": {"x": [1, 2]}, "text": "café"},
+    ]
+
+
+@pytest.mark.parametrize("codec", [JSON_CODEC, BINARY_CODEC])
+def test_codec_round_trip(codec):
+    for msg in sample_messages():
+        assert decode_frame(encode_frame(msg, codec)) == msg
+
+
+def test_binary_snapshots_are_smaller():
+    state = sample_messages()[0]
+    assert len(encode_frame(state, BINARY_CODEC)) < len(encode_frame(state, JSON_CODEC)) / 2
+
+
+def mixed_wire(msgs, compressor):
+    """msgs alternately JSON and binary, each through compressor (small ones stay as they are)."""
+    return b"".join(compressor.compress(encode_frame(m, BINARY_CODEC if i % 2 else JSON_CODEC))
+                    for i, m in enumerate(msgs))
+
+
+def test_compressed_frames_round_trip_through_decoder():
+    compressor = FrameCompressor(min_size=64)
+    msgs = sample_messages() * 3
+    wire = mixed_wire(msgs, compressor)
+    assert 0 < compressor.compressed < compressor.frames
+    assert FrameDecoder().feed(wire) == msgs
+    assert compressor.bytes_out < compressor.bytes_in
+
+
+def test_decoder_reassembles_frames_split_anywhere():
+    msgs = sample_messages()
+    wire = mixed_wire(msgs, FrameCompressor(min_size=64))
+    decoder = FrameDecoder(size=16)
+    out = []
+    for i in range(len(wire)):
+        out += decoder.feed(wire[i:i + 1])
+    assert out == msgs
+    assert decoder.start == decoder.end == 0
+
+
+def test_decoder_skips_bad_lines():
+    decoder = FrameDecoder()
+    assert decoder.feed(b'not json\n\n[1,2]\n{"type":"ack","tick":3}\n') == [{"type": "ack", "tick": 3}]
+
+
+def test_decoder_rejects_oversized_frames():
+    with pytest.raises(FrameTooLarge):
+        FrameDecoder(size=16, max_frame=64).feed(b"x" * 100)
+    big = encode_frame({"type": "state", "pad": "x" * 200}, BINARY_CODEC)
+    with pytest.raises(FrameTooLarge):
+        FrameDecoder(size=16, max_frame=64).feed(big[:8])
+    # the same frames fit once the cap allows them
+    assert FrameDecoder(size=16, max_frame=512).feed(big) == [{"type": "state", "pad": "x" * 200}]
+
+
+def test_read_frame_caps_lines():
+    line = encode_frame({"type": "ping", "pad": "x" * 100})
+    assert read_frame(io.BytesIO(line), max_size=200) == line
+    with pytest.raises(FrameTooLarge):
+        read_frame(io.BytesIO(line), max_size=50)
+
+
+def test_read_frame_async_refuses_long_lines_before_the_newline():
+    async def read(data, limit, eof=True):
+        reader = asyncio.StreamReader(limit=limit)
+        reader.feed_data(data)
+        if eof:
+            reader.feed_eof()
+        return await read_frame_async(reader, max_size=limit)
+
+    line = encode_frame({"type": "ping", "pad": "x" * 100})
+    assert asyncio.run(read(line, 200)) == line
+    binary = encode_frame({"type": "ack", "tick": 9}, BINARY_CODEC)
+    assert asyncio.run(read(binary, 200)) == binary
+    # no newline yet and no EOF: refused from what is buffered, without waiting for the rest
+    with pytest.raises(FrameTooLarge):
+        asyncio.run(read(line[:-1] * 2, 100, eof=False))
@@ -0,0 +1,65 @@
+from dungeon_game.ratelimit import TokenBucket, RateLimiter, OTHER
+
+
+class Metrics:
+    def __init__(self):
+        self.rejected = []
+
+    def frame_rejected(self, reason):
+        self.rejected.append(reason)
+
+
+class Conn:
+    def __init__(self):
+        self.metrics = Metrics()
+        self.sent = []
+
+    def send_message(self, msg):
+        self.sent.append(msg)
+
+
+def test_bucket_allows_burst_then_refills_at_rate():
+    bucket = TokenBucket(rate=10.0, burst=3, now=0.0)
+    assert [bucket.take(0.0) for _ in range(4)] == [True, True, True, False]
+    assert bucket.retry_after() == 0.1
+    assert not bucket.take(0.05)
+    assert bucket.take(0.1)
+    assert not bucket.take(0.1)
+
+
+def test_bucket_never_holds_more_than_burst():
+    bucket = TokenBucket(rate=10.0, burst=2, now=0.0)
+    assert bucket.take(0.0)
+    taken = sum(bucket.take(100.0) for _ in range(5))
+    assert taken == 2
+
+
+def test_limiter_buckets_per_type_and_other():
+    limiter = RateLimiter({"input": (1.0, 2), OTHER: (1.0, 1)})
+    assert limiter.allow("input", 0.0) and limiter.allow("input", 0.0)
+    assert not limiter.allow("input", 0.0)
+    # unknown types share one bucket
+    assert limiter.allow("chat", 0.0)
+    assert not limiter.allow("emote", 0.0)
+    assert limiter.key("emote") == OTHER
+
+
+def test_admit_tells_the_client_once_per_run():
+    limiter = RateLimiter({"input": (1.0, 1), OTHER: (1.0, 1)})
+    conn = Conn()
+    assert limiter.admit(conn, "input", 0.0)
+    assert not limiter.admit(conn, "input", 0.0)
+    assert not limiter.admit(conn, "input", 0.5)
+    assert [m["message"] for m in conn.sent] == ["rate_limited"]
+    assert conn.sent[0]["for"] == "input"
+    assert conn.metrics.rejected == ["rate:input", "rate:input"]
+    assert limiter.admit(conn, "input", 2.0)
+    assert not limiter.admit(conn, "input", 2.0)
+    assert len(conn.sent) == 2
+
+
+def test_admit_frame_types_the_raw_frame():
+    limiter = RateLimiter({"ack": (1.0, 1), OTHER: (1.0, 1)})
+    conn = Conn()
+    assert limiter.admit_frame(conn, b'{"type":"ack","tick":1}\n', 0.0) == (True, None)
+    assert limiter.admit_frame(conn, b'{"type":"ack","tick":2}\n', 0.0)[0] is False
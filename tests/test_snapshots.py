@@ -0,0 +1,65 @@
+from dungeon_game.protocol import decode_frame
+from dungeon_game.simulation import ArenaSimulation
+from dungeon_game.snapshots import SnapshotStream, SnapshotReceiver
+
+
+class Recorder:
+    def __init__(self):
+        self.messages = []
+
+    def send_frame(self, frame):
+        self.messages.append(decode_frame(frame))
+
+
+def run_level(stream, level_no, ticks, conn, receiver, ack=True):
+    sim = ArenaSimulation(level_no, {"a": "warrior"}, seed=7)
+    for _ in range(ticks):
+        sim.step(0.05)
+        stream.publish(sim.snapshot(), {"a": conn})
+        state = receiver.receive(conn.messages[-1])
+        assert state is not None
+        assert state == receiver.latest
+        if ack:
+            stream.ack("a", receiver.ack_message()["tick"])
+    return sim
+
+
+def test_delta_applies_to_acked_state():
+    stream, conn, receiver = SnapshotStream(), Recorder(), SnapshotReceiver()
+    sim = run_level(stream, 1, 20, conn, receiver)
+    assert conn.messages[0].get("keyframe")
+    assert conn.messages[-1]["type"] == "delta"
+    assert receiver.latest["tick"] == sim.tick
+    assert receiver.latest["mobs"] == {m["id"]: {"x": m["x"], "y": m["y"], "hp": m["hp"]}
+                                       for m in sim.snapshot()["mobs"]}
+
+
+def test_stale_ack_from_last_level_is_ignored():
+    # the server starts each level with a new stream; an ack in flight from the last one lands on it
+    old_stream, conn = SnapshotStream(), Recorder()
+    run_level(old_stream, 1, 40, conn, SnapshotReceiver())
+    stream, receiver = SnapshotStream(), SnapshotReceiver()
+    stream.ack("a", 40)
+    assert stream.acks == {}
+    conn.messages.clear()
+    run_level(stream, 2, 10, conn, receiver)
+    assert conn.messages[0].get("keyframe")
+    assert [m["type"] for m in conn.messages[1:]] == ["delta"] * 9
+
+
+def test_reused_stream_forgets_acks_at_new_level():
+    stream, conn = SnapshotStream(), Recorder()
+    run_level(stream, 1, 40, conn, SnapshotReceiver())
+    assert stream.acks["a"] == 40
+    conn.messages.clear()
+    receiver = SnapshotReceiver()
+    run_level(stream, 2, 10, conn, receiver)
+    assert conn.messages[0].get("keyframe")
+    assert [m["type"] for m in conn.messages[1:]] == ["delta"] * 9
+    assert stream.acks["a"] == 10
+
+
+def test_unacked_client_keeps_getting_keyframes():
+    stream, conn = SnapshotStream(), Recorder()
+    run_level(stream, 1, 5, conn, SnapshotReceiver(), ack=False)
+    assert all(m.get("keyframe") for m in conn.messages)
@@ -0,0 +1,80 @@
+from dungeon_game.udp_channel import ChannelState, parse, STATE, ACK, NO_ACK, SEQ_MOD, MAX_SEQ_JUMP, ACK_BITS
+
+
+def deliver(src, dst, kind=STATE):
+    """Send one header from src to dst; whether dst took it as new."""
+    _, seq, ack, bits, _ = parse(src.header(kind))
+    return dst.receive(seq, ack, bits)
+
+
+def test_in_order_delivery_acks_everything():
+    server, client = ChannelState(), ChannelState()
+    for _ in range(10):
+        assert deliver(server, client)
+        deliver(client, server, ACK)
+    assert client.remote_seq == 9
+    # seqs 0..8 behind the newest
+    assert client.recv_bits == 0x1FF
+    assert server.acked == 10
+    assert server.lost == 0
+
+
+def test_gap_shows_in_ack_bits_and_counts_as_lost():
+    server, client = ChannelState(), ChannelState()
+    for i in range(3 * ACK_BITS):
+        if i == 5:
+            server.header(STATE)
+            continue
+        deliver(server, client)
+        deliver(client, server, ACK)
+    assert server.lost == 1
+    assert server.acked == 3 * ACK_BITS - 1
+
+
+def test_late_datagram_is_stale_but_acknowledged():
+    client = ChannelState()
+    assert client.receive(0, NO_ACK, 0)
+    assert client.receive(3, NO_ACK, 0)
+    assert client.recv_bits == 0b100
+    assert not client.receive(1, NO_ACK, 0)
+    assert client.recv_bits == 0b110
+    assert not client.receive(1, NO_ACK, 0)
+    assert client.stale == 2
+    assert client.remote_seq == 3
+
+
+def test_jump_past_the_window_clears_the_bits():
+    client = ChannelState()
+    client.receive(0, NO_ACK, 0)
+    client.receive(1, NO_ACK, 0)
+    assert client.receive(1 + ACK_BITS + 5, NO_ACK, 0)
+    assert client.recv_bits == 0
+
+
+def test_huge_seq_is_rejected_with_its_ack():
+    server, client = ChannelState(), ChannelState()
+    for _ in range(3):
+        deliver(server, client)
+    assert not client.receive(2 + MAX_SEQ_JUMP + 1, 0, 0xFFFFFFFF)
+    assert not client.receive(0x7FFFFFFF, NO_ACK, 0)
+    assert client.rejected == 2
+    assert client.remote_seq == 2
+    assert client.recv_bits < 1 << ACK_BITS
+    # the window still works afterwards
+    assert deliver(server, client)
+    assert client.remote_seq == 3
+
+
+def test_sequence_wraps_around():
+    server, client = ChannelState(), ChannelState()
+    server.next_seq = SEQ_MOD - 3
+    for _ in range(6):
+        assert deliver(server, client)
+        deliver(client, server, ACK)
+    assert client.remote_seq == 2
+    assert client.recv_bits & 0x1F == 0x1F
+    # a datagram from before the wrap is old, not 2**32 - 1 ahead
+    assert not client.receive(SEQ_MOD - 1, NO_ACK, 0)
+    assert client.stale == 1
+    assert server.acked == 6
+    assert server.lost == 0